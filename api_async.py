@@ -0,0 +1,454 @@
+"""Async (ASGI) variant of the /api/v1 endpoints.
+
+Serves the same endpoints, parameters and responses as api_v1.py, described by
+the same openapi.yaml, on Starlette with SQLAlchemy's asyncpg driver. Statements
+and response formatting are shared with api_v1.py; the difference is that
+queries which do not depend on each other run concurrently with asyncio.gather,
+each on its own pooled connection, instead of one after another. The citations
+of an article, for example, take three rounds of queries rather than seven.
+
+The in-process lookup caches (cache.py) and ETag handling (http_cache.py) belong
+to the Flask app and are not used here.
+
+Usage:
+    uvicorn api_async:app --host 0.0.0.0 --port 12122 --workers 4
+"""
+
+import asyncio
+import contextlib
+import json
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.applications import Starlette
+from starlette.responses import HTMLResponse, JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+from web_engine import BACKEND, PREPARED_STATEMENTS, configure_engine, database_url, engine_options, pool_stats
+from models import NormalizedCitation, WebResource, WikiTemplate
+from api_v1 import (
+    STREAM_BATCH_SIZE, DOCS_HTML, _load_openapi_spec, _int_arg, _pagination_args, _paginate, _page,
+    _wants_ndjson, _include_total, _check_batch_keys, _group,
+    _revisions_stmt, _revision_list_stmt, _revision_list_after, _revision_list_key, _revision_count_stmt,
+    _latest_revision_stmt, _revision_timestamp_stmt, _next_revision_stmt, _present_ci_ids_stmt,
+    _citations_stmt, _citations_after, _citations_key, _other_articles_stmt, _links_stmt, _templates_stmt,
+    _history_stmt, _template_report_stmt, _template_report_count_stmt, _template_report_after,
+    _template_stats_stmt, _template_stats_json, _web_resources_stmt, _referenced_by_stmt,
+    _citations_by_sha1_stmt, _page_documents_stmt, _page_revisions_stmt,
+    _revision_json, _history_json, _other_article_json, _link_json, _templates_json, _raw_citation_json,
+    _citation_json, _template_report_json, _web_resource_json, _batch_citations_json, _batch_articles_json,
+)
+
+load_dotenv()
+
+if BACKEND != 'postgres':
+    # DuckDB has no async driver; serve API_BACKEND=duckdb with app.py
+    raise RuntimeError(f"api_async.py only supports API_BACKEND=postgres, not {BACKEND!r}")
+
+# asyncpg prepares every statement and keeps them in a per-connection cache
+engine = create_async_engine(
+    database_url('postgresql+asyncpg')
+    + ('' if PREPARED_STATEMENTS else '?prepared_statement_cache_size=0'),
+    **engine_options(),
+)
+configure_engine(engine.sync_engine, prepare=False)
+
+
+def _error(msg, code):
+    return JSONResponse({"error": msg, "code": code}, status_code=code)
+
+
+async def _fetch(stmt):
+    """Run one statement on its own connection and return all rows."""
+    async with engine.connect() as conn:
+        return (await conn.execute(stmt)).all()
+
+
+async def _gather(*stmts):
+    """Run independent statements concurrently. Returns their rows in order;
+    None in place of a statement is passed through as an empty list."""
+    async def run(stmt):
+        return [] if stmt is None else await _fetch(stmt)
+    return await asyncio.gather(*(run(s) for s in stmts))
+
+
+def _scalar(rows):
+    return rows[0][0] if rows else None
+
+
+def _ndjson_response(stmt, row_to_dict=None):
+    """Stream the rows of `stmt` as newline-delimited JSON, like api_v1._ndjson_response."""
+    row_to_dict = row_to_dict or (lambda r: dict(r._mapping))
+
+    async def generate():
+        async with engine.connect() as conn:
+            result = await conn.stream(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+            async for rows in result.partitions():
+                yield "".join(json.dumps(row_to_dict(r)) + "\n" for r in rows)
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+async def _json_body(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+async def _find_citation(normalized_sha1):
+    rows = await _fetch(
+        select(NormalizedCitation.id, NormalizedCitation.normalized_sha1,
+               NormalizedCitation.reference_normalized)
+        .where(NormalizedCitation.normalized_sha1 == normalized_sha1)
+        .limit(1)
+    )
+    return rows[0] if rows else None
+
+
+# ---------------------------------------------------------------------------
+# Endpoints
+# ---------------------------------------------------------------------------
+
+async def metrics(request):
+    return JSONResponse({"pool": pool_stats(engine.sync_engine)})
+
+
+async def openapi_spec(request):
+    return JSONResponse(_load_openapi_spec())
+
+
+async def openapi_docs(request):
+    return HTMLResponse(DOCS_HTML)
+
+
+async def get_article(request):
+    url = request.query_params.get("url")
+    if not url:
+        return _error("url parameter is required", 400)
+
+    resolved = await _fetch(
+        select(WebResource.numeric_page_id, WebResource.instance_of_document)
+        .where(WebResource.url_matches(url))
+        .limit(1)
+    )
+    if not resolved:
+        return _error("Article not found", 404)
+
+    page_id, document_id = resolved[0]
+    if page_id is None:
+        return _error("Article has no page ID", 404)
+
+    stmt = _revisions_stmt(page_id)
+    if _wants_ndjson(request.query_params):
+        return _ndjson_response(stmt)
+    revisions = await _fetch(stmt)
+
+    return JSONResponse({
+        "page_id": page_id,
+        "url": url,
+        "document_id": document_id,
+        "revisions": [_revision_json(r) for r in revisions],
+        "revision_count": len(revisions),
+        "latest_revision_id": revisions[-1].revision_id if revisions else None,
+    })
+
+
+async def get_article_revisions(request):
+    page_id = request.path_params["page_id"]
+    args = request.query_params
+    try:
+        limit, offset, after = _pagination_args((str, int), args)
+    except ValueError:
+        return _error("Invalid cursor", 400)
+
+    stmt = _revision_list_stmt(page_id)
+    if _wants_ndjson(args):
+        if after is not None:
+            stmt = stmt.where(_revision_list_after(after))
+        return _ndjson_response(stmt)
+
+    count_rows, rows = await _gather(
+        _revision_count_stmt(page_id) if _include_total(after, args) else None,
+        _paginate(stmt, limit, offset, after, _revision_list_after),
+    )
+    rows, next_cursor = _page(rows, limit, _revision_list_key)
+
+    return JSONResponse({
+        "page_id": page_id,
+        "revisions": [
+            {**_revision_json(r), "citation_count": r.citation_count}
+            for r in rows
+        ],
+        "total": _scalar(count_rows),
+        "next_cursor": next_cursor,
+    })
+
+
+async def get_article_citations(request):
+    page_id = request.path_params["page_id"]
+    args = request.query_params
+    raw = args.get("raw", "false").lower() == "true"
+    try:
+        limit, offset, after = _pagination_args((str, int), args)
+    except ValueError:
+        return _error("Invalid cursor", 400)
+
+    # Latest revision for currently_visible check, and the default revision
+    revision_id = _int_arg(args, "revision_id")
+    latest_rows, rev_ts_rows = await _gather(
+        _latest_revision_stmt(page_id),
+        _revision_timestamp_stmt(revision_id) if revision_id is not None else None,
+    )
+    latest_rev_id = _scalar(latest_rows)
+    if revision_id is None:
+        revision_id = latest_rev_id
+        if revision_id is None:
+            return _error("No revisions found for this article", 404)
+        rev_ts_rows = await _fetch(_revision_timestamp_stmt(revision_id))
+    rev_ts = _scalar(rev_ts_rows)
+    if rev_ts is None:
+        return _error("Revision not found", 404)
+
+    stmt = _paginate(_citations_stmt(revision_id, raw), limit, offset, after, _citations_after)
+    if raw:
+        rows, next_cursor = _page(await _fetch(stmt), limit, _citations_key)
+        citations = [_raw_citation_json(r, latest_rev_id) for r in rows]
+    else:
+        rows, next_rev_rows = await _gather(stmt, _next_revision_stmt(page_id, revision_id))
+        rows, next_cursor = _page(rows, limit, _citations_key)
+        next_rev = next_rev_rows[0] if next_rev_rows else None
+
+        # Citations still present at the next revision (for removed_at) and
+        # the related data of this page's citations, all at once
+        nc_ids = list(set(r.nc_id for r in rows))
+        next_ci_rows, other_articles, links, templates = await _gather(
+            _present_ci_ids_stmt(next_rev.revision_id) if next_rev else None,
+            _other_articles_stmt(nc_ids, page_id) if nc_ids else None,
+            _links_stmt(nc_ids) if nc_ids else None,
+            _templates_stmt(nc_ids) if nc_ids else None,
+        )
+        next_rev_ci_ids = {r.citation_instance_id for r in next_ci_rows}
+        other_articles = _group(other_articles, 'nc_id')
+        links = _group(links, 'normalized_id')
+        templates = _group(templates, 'normalized_id')
+
+        citations = [
+            _citation_json(r, latest_rev_id, next_rev, next_rev_ci_ids, other_articles, links, templates)
+            for r in rows
+        ]
+
+    return JSONResponse({
+        "page_id": page_id,
+        "revision_id": revision_id,
+        "revision_timestamp": rev_ts,
+        "citation_count": len(citations),
+        "citations": citations,
+        "next_cursor": next_cursor,
+    })
+
+
+async def get_citation(request):
+    """Look up a citation by its normalized_sha1 (content-addressed hash)."""
+    nc = await _find_citation(request.path_params["normalized_sha1"])
+    if not nc:
+        return _error("Citation not found", 404)
+
+    history_stmt = _history_stmt(nc.id)
+    if _wants_ndjson(request.query_params):
+        return _ndjson_response(history_stmt)
+
+    articles, links, templates, history = await _gather(
+        _other_articles_stmt([nc.id]), _links_stmt([nc.id]), _templates_stmt([nc.id]), history_stmt,
+    )
+
+    return JSONResponse({
+        "normalized_sha1": nc.normalized_sha1,
+        "reference_normalized": nc.reference_normalized,
+        "appears_on_articles": [_other_article_json(a) for a in articles],
+        "extracted_links": [_link_json(lk) for lk in links],
+        "templates": _templates_json(templates),
+        "history": [_history_json(h) for h in history],
+    })
+
+
+async def get_citation_history(request):
+    """Get revision history for a citation identified by normalized_sha1."""
+    normalized_sha1 = request.path_params["normalized_sha1"]
+    nc = await _find_citation(normalized_sha1)
+    if not nc:
+        return _error("Citation not found", 404)
+
+    stmt = _history_stmt(nc.id, _int_arg(request.query_params, "page_id"))
+    if _wants_ndjson(request.query_params):
+        return _ndjson_response(stmt)
+
+    return JSONResponse({
+        "normalized_sha1": normalized_sha1,
+        "revisions": [_history_json(r) for r in await _fetch(stmt)],
+    })
+
+
+async def get_template_report(request):
+    wiki_template_id = request.path_params["wiki_template_id"]
+    args = request.query_params
+    parameter_key = args.get("parameter_key")
+    parameter_value = args.get("parameter_value")
+    if not parameter_key or parameter_value is None:
+        return _error("parameter_key and parameter_value are required", 400)
+
+    try:
+        limit, offset, after = _pagination_args((int,), args)
+    except ValueError:
+        return _error("Invalid cursor", 400)
+
+    stmt = _template_report_stmt(wiki_template_id, parameter_key, parameter_value)
+    template_stmt = select(WikiTemplate.name).where(WikiTemplate.id == wiki_template_id)
+
+    if _wants_ndjson(args):
+        if not await _fetch(template_stmt):
+            return _error("Template not found", 404)
+        if after is not None:
+            stmt = stmt.where(_template_report_after(after))
+        return _ndjson_response(stmt, _template_report_json)
+
+    # The template lookup, the total and the page do not depend on each other
+    template_rows, count_rows, rows = await _gather(
+        template_stmt,
+        (_template_report_count_stmt(wiki_template_id, parameter_key, parameter_value, stmt)
+         if _include_total(after, args) else None),
+        _paginate(stmt, limit, offset, after, _template_report_after),
+    )
+    if not template_rows:
+        return _error("Template not found", 404)
+    rows, next_cursor = _page(rows, limit, lambda r: (r.id,))
+
+    return JSONResponse({
+        "wiki_template_id": wiki_template_id,
+        "template_name": _scalar(template_rows),
+        "parameter_key": parameter_key,
+        "parameter_value": parameter_value,
+        "citations": [_template_report_json(r) for r in rows],
+        "total": _scalar(count_rows),
+        "next_cursor": next_cursor,
+    })
+
+
+async def get_template_stats(request):
+    wiki_template_id = request.path_params["wiki_template_id"]
+    args = request.query_params
+    limit = max(_int_arg(args, "limit", 20), 1)
+    template_rows, rows = await _gather(
+        select(WikiTemplate.name).where(WikiTemplate.id == wiki_template_id),
+        _template_stats_stmt(wiki_template_id, args.get("parameter_key"), limit),
+    )
+    if not template_rows:
+        return _error("Template not found", 404)
+    return JSONResponse(_template_stats_json(wiki_template_id, _scalar(template_rows), rows))
+
+
+async def get_web_resource(request):
+    url = request.query_params.get("url")
+    if not url:
+        return _error("url parameter is required", 400)
+
+    resources = await _fetch(_web_resources_stmt([url]))
+    if not resources:
+        return _error("Web resource not found", 404)
+    wr = resources[0]
+    return JSONResponse(_web_resource_json(wr, await _fetch(_referenced_by_stmt([wr.id]))))
+
+
+# ---------------------------------------------------------------------------
+# Batch lookups
+# ---------------------------------------------------------------------------
+
+async def _batch_keys(request, field, item_type):
+    keys, error = _check_batch_keys(await _json_body(request), field, item_type)
+    if error:
+        return None, _error(error, 400)
+    return keys, None
+
+
+async def batch_citations(request):
+    keys, error = await _batch_keys(request, "normalized_sha1", str)
+    if error:
+        return error
+
+    citations = await _fetch(_citations_by_sha1_stmt(keys))
+    nc_ids = [c.id for c in citations]
+    articles, links, templates = await _gather(
+        _other_articles_stmt(nc_ids), _links_stmt(nc_ids), _templates_stmt(nc_ids))
+
+    results = dict.fromkeys(keys)
+    results.update(_batch_citations_json(
+        citations, _group(articles, 'nc_id'), _group(links, 'normalized_id'), _group(templates, 'normalized_id')))
+    return JSONResponse({"results": results})
+
+
+async def batch_web_resources(request):
+    keys, error = await _batch_keys(request, "urls", str)
+    if error:
+        return error
+
+    resources = await _fetch(_web_resources_stmt(keys))
+    refs = _group(await _fetch(_referenced_by_stmt([wr.id for wr in resources])), 'web_resource_id')
+
+    results = dict.fromkeys(keys)
+    results.update({wr.url: _web_resource_json(wr, refs.get(wr.id, [])) for wr in resources})
+    return JSONResponse({"results": results})
+
+
+async def batch_articles(request):
+    keys, error = await _batch_keys(request, "page_ids", int)
+    if error:
+        return error
+
+    documents, revisions = await _gather(_page_documents_stmt(keys), _page_revisions_stmt(keys))
+
+    results = dict.fromkeys(str(k) for k in keys)
+    results.update(_batch_articles_json(documents, revisions))
+    return JSONResponse({"results": results})
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    await engine.dispose()
+
+
+routes = [
+    Route("/openapi.json", openapi_spec),
+    Route("/docs", openapi_docs),
+    Route("/article", get_article),
+    Route("/article/{page_id:int}/revisions", get_article_revisions),
+    Route("/article/{page_id:int}/citations", get_article_citations),
+    Route("/citation/{normalized_sha1}", get_citation),
+    Route("/citation/{normalized_sha1}/history", get_citation_history),
+    Route("/template/{wiki_template_id:int}/report", get_template_report),
+    Route("/template/{wiki_template_id:int}/stats", get_template_stats),
+    Route("/web_resource", get_web_resource),
+    Route("/batch/citations", batch_citations, methods=["POST"]),
+    Route("/batch/web_resources", batch_web_resources, methods=["POST"]),
+    Route("/batch/articles", batch_articles, methods=["POST"]),
+]
+
+async def _unavailable(request, exc):
+    """Pool timeouts and lost connections, like the Flask app's error handlers."""
+    if isinstance(exc, PoolTimeoutError):
+        engine.sync_engine.pool_counters.add('timeouts')
+        msg = "No database connection available"
+    elif exc.connection_invalidated:
+        msg = "Database connection lost"
+    else:
+        raise exc
+    return JSONResponse({"error": msg, "code": 503}, status_code=503, headers={"Retry-After": "1"})
+
+
+app = Starlette(
+    routes=[Route("/metrics", metrics), Mount("/api/v1", routes=routes)],
+    exception_handlers={PoolTimeoutError: _unavailable, DBAPIError: _unavailable},
+    lifespan=lifespan,
+)
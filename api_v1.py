@@ -1,16 +1,28 @@
+import base64
+import json
+import os
 from pathlib import Path
 
 import yaml
 from flask import Blueprint, request, jsonify, Response
-from sqlalchemy import func, select
+from sqlalchemy import CHAR, BigInteger, Integer, String, any_, func, literal, select, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import Session
 from models import (
-    WebResource, Document, CitationInstance, CitationHistory, NormalizedCitation,
-    Revision, NormalizedCitationWebResource, WikiTemplate, TemplateData, Domain,
+    WebResource, CitationInstance, CitationHistory, CitationInstanceStats, NormalizedCitation,
+    Revision, NormalizedCitationWebResource, WikiTemplate, TemplateData, Domain, WikiPage,
+    NormalizedCitationPage, TemplateValueCount, TemplateParameterStat,
 )
+from cache import cached, resolve_url
+from web_engine import execute_prepared
 
 api_v1 = Blueprint('api_v1', __name__, url_prefix='/api/v1')
 
+# Rows fetched per round trip from the server-side cursor when streaming NDJSON
+STREAM_BATCH_SIZE = 1000
+# Most keys accepted by one request to the /batch endpoints
+BATCH_MAX_KEYS = int(os.getenv('API_BATCH_MAX_KEYS', '1000'))
+
 TYPE_LABELS = {0: "other", 1: "inline", 2: "endnote"}
 
 
@@ -23,8 +35,97 @@ def _error(msg, code):
     return jsonify({"error": msg, "code": code}), code
 
 
-def _paginate(q, limit, offset):
-    return q.limit(limit).offset(offset)
+def _encode_cursor(*values):
+    """Encode the sort key of the last row on a page as an opaque cursor token."""
+    data = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def _decode_cursor(token, types):
+    """Decode a token from _encode_cursor into a tuple whose items have the given types.
+
+    Raises ValueError if the token is malformed.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError("malformed cursor") from e
+    if (not isinstance(values, list) or len(values) != len(types)
+            or not all(isinstance(v, t) and not isinstance(v, bool) for v, t in zip(values, types))):
+        raise ValueError("malformed cursor")
+    return tuple(values)
+
+
+def _int_arg(args, name, default=None):
+    """Read an integer query parameter, falling back to `default` if it is
+    missing or not an integer (like Flask's args.get(type=int))."""
+    try:
+        return int(args[name])
+    except (KeyError, ValueError):
+        return default
+
+
+def _pagination_args(key_types, args=None):
+    """Read limit, offset and cursor from the query string (`args`, by default
+    the current Flask request's).
+
+    Returns (limit, offset, after) where `after` is the decoded cursor, or None
+    for the first page (or an offset page). Raises ValueError for a bad cursor.
+    """
+    args = request.args if args is None else args
+    limit = min(_int_arg(args, "limit", 100), 1000)
+    offset = _int_arg(args, "offset", 0)
+    cursor = args.get("cursor")
+    after = _decode_cursor(cursor, key_types) if cursor else None
+    return limit, offset, after
+
+
+def _paginate(stmt, limit, offset, after, after_clause):
+    """Apply keyset pagination (rows after the cursor) or, without a cursor, the
+    offset. Fetches one extra row so _page can tell whether there is a next page."""
+    if after is not None:
+        stmt = stmt.where(after_clause(after))
+    elif offset:
+        stmt = stmt.offset(offset)
+    return stmt.limit(limit + 1)
+
+
+def _page(rows, limit, key):
+    """Trim the extra row fetched by _paginate. Returns (rows, next_cursor)."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, _encode_cursor(*key(rows[-1]))
+
+
+def _wants_ndjson(args=None):
+    args = request.args if args is None else args
+    return args.get("format", "json").lower() == "ndjson"
+
+
+def _ndjson_response(stmt, row_to_dict=None):
+    """Stream the rows of `stmt` as newline-delimited JSON, one object per row.
+
+    Rows are read from a server-side cursor STREAM_BATCH_SIZE at a time on a
+    connection held by the generator, so memory use does not grow with the
+    result and the first rows are sent before the query finishes.
+    """
+    row_to_dict = row_to_dict or (lambda r: dict(r._mapping))
+    engine = _get_engine()
+
+    def generate():
+        with engine.connect() as conn:
+            result = conn.execution_options(yield_per=STREAM_BATCH_SIZE).execute(stmt)
+            for rows in result.partitions():
+                yield "".join(json.dumps(row_to_dict(r)) + "\n" for r in rows)
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+
+def _include_total(after, args=None):
+    """Totals are only computed for the first page, and can be turned off with include_total=false."""
+    args = request.args if args is None else args
+    return after is None and args.get("include_total", "true").lower() != "false"
 
 
 def _load_openapi_spec() -> dict:
@@ -38,9 +139,7 @@ def openapi_spec():
     return jsonify(_load_openapi_spec())
 
 
-@api_v1.route("/docs", methods=["GET"])
-def openapi_docs():
-    html = """<!doctype html>
+DOCS_HTML = """<!doctype html>
 <html lang=\"en\">
 <head>
   <meta charset=\"UTF-8\" />
@@ -62,9 +161,425 @@ def openapi_docs():
 </body>
 </html>
 """
-    return Response(html, mimetype="text/html")
 
 
+@api_v1.route("/docs", methods=["GET"])
+def openapi_docs():
+    return Response(DOCS_HTML, mimetype="text/html")
+
+
+# ---------------------------------------------------------------------------
+# Statements and row formatting shared with api_async.py
+# ---------------------------------------------------------------------------
+
+def _any(column, values, item_type):
+    """column = ANY(:array): one bound array parameter however many values there are."""
+    return column == any_(literal(values, ARRAY(item_type)))
+
+
+def _revisions_stmt(page_id):
+    return (
+        select(Revision.revision_id, Revision.revision_timestamp, Revision.parent_revision_id)
+        .where(Revision.page_id == page_id)
+        .order_by(Revision.revision_timestamp)
+    )
+
+
+def _revision_list_stmt(page_id):
+    """Revisions of a page with their citation counts, in keyset order."""
+    # Correlated, so citations are only counted for the revisions on the returned page
+    citation_count = (
+        select(func.count())
+        .where(CitationHistory.revision_id == Revision.revision_id)
+        .scalar_subquery()
+    )
+    return (
+        select(
+            Revision.revision_id,
+            Revision.revision_timestamp,
+            Revision.parent_revision_id,
+            citation_count.label("citation_count"),
+        )
+        .where(Revision.page_id == page_id)
+        .order_by(Revision.revision_timestamp, Revision.revision_id)
+    )
+
+
+def _revision_list_after(after):
+    return tuple_(Revision.revision_timestamp, Revision.revision_id) > after
+
+
+def _revision_list_key(r):
+    return r.revision_timestamp, r.revision_id
+
+
+def _revision_count_stmt(page_id):
+    return select(func.count()).select_from(Revision).where(Revision.page_id == page_id)
+
+
+def _latest_revision_stmt(page_id):
+    return select(func.max(Revision.revision_id)).where(Revision.page_id == page_id)
+
+
+def _revision_timestamp_stmt(revision_id):
+    return select(Revision.revision_timestamp).where(Revision.revision_id == revision_id)
+
+
+def _next_revision_stmt(page_id, revision_id):
+    return (
+        select(Revision.revision_id, Revision.revision_timestamp)
+        .where(Revision.page_id == page_id)
+        .where(Revision.revision_id > revision_id)
+        .order_by(Revision.revision_id)
+        .limit(1)
+    )
+
+
+def _present_ci_ids_stmt(revision_id):
+    return select(CitationHistory.citation_instance_id).where(CitationHistory.revision_id == revision_id)
+
+
+# Most recently seen first; '' sorts citations without stats last
+_citation_sort_ts = func.coalesce(CitationInstanceStats.last_seen_ts, "")
+
+
+def _citations_stmt(revision_id, raw):
+    """Citations present at a revision, with their precomputed history stats, in keyset order."""
+    if raw:
+        # Raw mode: return per-instance data
+        stmt = select(
+            CitationInstance.id.label('ci_id'),
+            CitationInstance.raw_sha1,
+            CitationInstance.reference_type,
+            CitationInstance.reference_name,
+        )
+    else:
+        # Normalized mode: group by normalized citation
+        stmt = (
+            select(
+                CitationInstance.id.label('ci_id'),
+                NormalizedCitation.id.label('nc_id'),
+                NormalizedCitation.normalized_sha1,
+                NormalizedCitation.reference_normalized,
+                CitationInstance.reference_type,
+                CitationInstance.reference_name,
+            )
+            .join(NormalizedCitation, NormalizedCitation.id == CitationInstance.normalized_id)
+        )
+    present_ci_ids = _present_ci_ids_stmt(revision_id).subquery()
+    return (
+        stmt.add_columns(
+            CitationInstanceStats.first_seen_ts,
+            CitationInstanceStats.last_seen_ts,
+            CitationInstanceStats.first_seen_id,
+            CitationInstanceStats.last_seen_id,
+            CitationInstanceStats.appearance_count,
+            _citation_sort_ts.label("sort_ts"),
+        )
+        # Precomputed by load_all.py; outer join so citations still list if stats lag a load
+        .outerjoin(CitationInstanceStats, CitationInstanceStats.citation_instance_id == CitationInstance.id)
+        .where(CitationInstance.id.in_(select(present_ci_ids.c.citation_instance_id)))
+        .order_by(_citation_sort_ts.desc(), CitationInstance.id.desc())
+    )
+
+
+def _citations_after(after):
+    return tuple_(_citation_sort_ts, CitationInstance.id) < after
+
+
+def _citations_key(r):
+    return r.sort_ts, r.ci_id
+
+
+def _other_articles_stmt(nc_ids, exclude_page_id=None):
+    """Pages the normalized citations have appeared on, from normalized_citation_pages."""
+    stmt = (
+        select(NormalizedCitationPage.normalized_id.label('nc_id'),
+               NormalizedCitationPage.page_id,
+               WikiPage.document_id_of(NormalizedCitationPage.page_id).label('doc_id'),
+               NormalizedCitationPage.first_seen_rev,
+               NormalizedCitationPage.last_seen_rev,
+               NormalizedCitationPage.currently_present)
+        .where(_any(NormalizedCitationPage.normalized_id, nc_ids, Integer))
+        .order_by(NormalizedCitationPage.normalized_id, NormalizedCitationPage.page_id)
+    )
+    if exclude_page_id is not None:
+        stmt = stmt.where(NormalizedCitationPage.page_id != exclude_page_id)
+    return stmt
+
+
+def _links_stmt(nc_ids):
+    return (
+        select(NormalizedCitationWebResource.normalized_id,
+               WebResource.id.label('wr_id'), WebResource.url)
+        .join(WebResource, WebResource.id == NormalizedCitationWebResource.web_resource_id)
+        .where(_any(NormalizedCitationWebResource.normalized_id, nc_ids, Integer))
+    )
+
+
+def _templates_stmt(nc_ids):
+    return (
+        select(TemplateData.normalized_id,
+               WikiTemplate.id.label('wt_id'), WikiTemplate.name,
+               TemplateData.parameter_key, TemplateData.parameter_value,
+               TemplateData.offset_start)
+        .join(WikiTemplate, WikiTemplate.id == TemplateData.wiki_template_id)
+        .where(_any(TemplateData.normalized_id, nc_ids, Integer))
+        .order_by(TemplateData.offset_start, TemplateData.parameter_key)
+    )
+
+
+def _history_stmt(nc_id, page_id=None):
+    stmt = (
+        select(CitationHistory.revision_id, Revision.revision_timestamp, Revision.page_id)
+        .join(Revision, Revision.revision_id == CitationHistory.revision_id)
+        .join(CitationInstance, CitationInstance.id == CitationHistory.citation_instance_id)
+        .where(CitationInstance.normalized_id == nc_id)
+    )
+    if page_id is not None:
+        stmt = stmt.where(Revision.page_id == page_id)
+    return stmt.order_by(Revision.revision_timestamp)
+
+
+def _group(rows, attr):
+    """Group rows into lists by one of their attributes."""
+    groups = {}
+    for r in rows:
+        groups.setdefault(getattr(r, attr), []).append(r)
+    return groups
+
+
+def _revision_json(r):
+    return {
+        "revision_id": r.revision_id,
+        "revision_timestamp": r.revision_timestamp,
+        "parent_revision_id": r.parent_revision_id,
+    }
+
+
+def _history_json(r):
+    return {
+        "revision_id": r.revision_id,
+        "revision_timestamp": r.revision_timestamp,
+        "page_id": r.page_id,
+    }
+
+
+def _other_article_json(a):
+    return {
+        "page_id": a.page_id,
+        "document_id": a.doc_id,
+        "first_seen_revision_id": a.first_seen_rev,
+        "last_seen_revision_id": a.last_seen_rev,
+        "currently_present": a.currently_present,
+    }
+
+
+def _link_json(lk):
+    return {"web_resource_id": lk.wr_id, "url": lk.url}
+
+
+def _templates_json(rows):
+    """Group template parameter rows by template occurrence."""
+    tmpl_map = {}
+    for t in rows:
+        key = (t.wt_id, t.name, t.offset_start)
+        if key not in tmpl_map:
+            tmpl_map[key] = {}
+        tmpl_map[key][t.parameter_key] = t.parameter_value
+    return [
+        {"wiki_template_id": k[0], "template_name": k[1], "parameters": v}
+        for k, v in tmpl_map.items()
+    ]
+
+
+def _raw_citation_json(r, latest_rev_id):
+    return {
+        "citation_instance_id": r.ci_id,
+        "raw_sha1": r.raw_sha1,
+        "reference_type": TYPE_LABELS.get(r.reference_type, str(r.reference_type)),
+        "reference_name": r.reference_name,
+        "first_seen": {"revision_id": r.first_seen_id, "revision_timestamp": r.first_seen_ts},
+        "last_seen": {"revision_id": r.last_seen_id, "revision_timestamp": r.last_seen_ts},
+        "currently_visible": r.last_seen_id == latest_rev_id,
+        "appearance_count": r.appearance_count,
+    }
+
+
+def _citation_json(r, latest_rev_id, next_rev, next_rev_ci_ids, other_articles, links, templates):
+    """Format a normalized-mode citation row. The last three arguments map
+    normalized citation ids to rows of _other_articles_stmt, _links_stmt and
+    _templates_stmt."""
+    removed_at = None
+    if next_rev and r.ci_id not in next_rev_ci_ids:
+        removed_at = {
+            "revision_id": next_rev.revision_id,
+            "revision_timestamp": next_rev.revision_timestamp,
+        }
+    return {
+        "citation_instance_id": r.ci_id,
+        "normalized_sha1": r.normalized_sha1,
+        "reference_normalized": r.reference_normalized,
+        "reference_type": TYPE_LABELS.get(r.reference_type, str(r.reference_type)),
+        "reference_name": r.reference_name,
+        "first_seen": {"revision_id": r.first_seen_id, "revision_timestamp": r.first_seen_ts},
+        "last_seen": {"revision_id": r.last_seen_id, "revision_timestamp": r.last_seen_ts},
+        "removed_at": removed_at,
+        "currently_visible": r.last_seen_id == latest_rev_id,
+        "appearance_count": r.appearance_count,
+        "other_articles": [_other_article_json(a) for a in other_articles.get(r.nc_id, [])],
+        "extracted_links": [_link_json(lk) for lk in links.get(r.nc_id, [])],
+        "templates": _templates_json(templates.get(r.nc_id, [])),
+    }
+
+
+def _template_report_stmt(wiki_template_id, parameter_key, parameter_value):
+    """Citations using a template parameter value, in keyset (normalized citation id) order."""
+    return (
+        select(
+            NormalizedCitation.id,
+            NormalizedCitation.normalized_sha1,
+            NormalizedCitation.reference_normalized,
+            NormalizedCitation.appears_on_article,
+        )
+        .join(TemplateData,
+              TemplateData.normalized_id == NormalizedCitation.id)
+        .where(TemplateData.value_matches(wiki_template_id, parameter_key, parameter_value))
+        .distinct()
+        .order_by(NormalizedCitation.id)
+    )
+
+
+def _template_report_count_stmt(wiki_template_id, parameter_key, parameter_value, stmt):
+    """The number of rows of `stmt`: the precomputed count for frequent values,
+    otherwise counted through the index. COALESCE stops at the first non-null
+    argument, so the count query only runs when there is no precomputed count."""
+    return select(func.coalesce(
+        TemplateValueCount.count_stmt(wiki_template_id, parameter_key, parameter_value).scalar_subquery(),
+        select(func.count()).select_from(stmt.subquery()).scalar_subquery(),
+    ))
+
+
+def _template_report_after(after):
+    return NormalizedCitation.id > after[0]
+
+
+def _template_report_json(r):
+    return {
+        "normalized_sha1": r.normalized_sha1,
+        "reference_normalized": r.reference_normalized,
+        "appears_on_article": r.appears_on_article,
+    }
+
+
+def _template_stats_stmt(wiki_template_id, parameter_key=None, limit=None):
+    """Precomputed most common values of a template's parameters, most used parameter first."""
+    stmt = (
+        select(TemplateParameterStat.parameter_key, TemplateParameterStat.key_count,
+               TemplateParameterStat.parameter_value, TemplateParameterStat.value_count,
+               TemplateParameterStat.count_error)
+        .where(TemplateParameterStat.wiki_template_id == wiki_template_id)
+        .order_by(TemplateParameterStat.key_count.desc(), TemplateParameterStat.parameter_key,
+                  TemplateParameterStat.rank)
+    )
+    if parameter_key is not None:
+        stmt = stmt.where(TemplateParameterStat.parameter_key_md5 == TemplateData.compute_md5(parameter_key),
+                          TemplateParameterStat.parameter_key == parameter_key)
+    if limit is not None:
+        stmt = stmt.where(TemplateParameterStat.rank <= limit)
+    return stmt
+
+
+def _template_stats_json(wiki_template_id, template_name, rows):
+    return {
+        "wiki_template_id": wiki_template_id,
+        "template_name": template_name,
+        "parameters": [
+            {
+                "parameter_key": key,
+                "count": values[0].key_count,
+                "top_values": [
+                    {
+                        "parameter_value": v.parameter_value,
+                        "count": v.value_count,
+                        "max_error": v.count_error,
+                    }
+                    for v in values
+                ],
+            }
+            for key, values in _group(rows, "parameter_key").items()
+        ],
+    }
+
+
+def _web_resources_stmt(urls):
+    return (
+        select(WebResource.id, WebResource.url, WebResource.numeric_page_id,
+               Domain.value.label("domain"))
+        .outerjoin(Domain, Domain.id == WebResource.domain_id)
+        # Through the url_hash index; the url comparison guards against hash collisions
+        .where(_any(WebResource.url_hash, [WebResource.compute_url_hash(u) for u in urls], CHAR(32)))
+        .where(_any(WebResource.url, urls, String))
+    )
+
+
+def _referenced_by_stmt(wr_ids):
+    return (
+        select(NormalizedCitationWebResource.web_resource_id,
+               NormalizedCitation.normalized_sha1, NormalizedCitation.appears_on_article)
+        .join(NormalizedCitation, NormalizedCitation.id == NormalizedCitationWebResource.normalized_id)
+        .where(_any(NormalizedCitationWebResource.web_resource_id, wr_ids, BigInteger))
+    )
+
+
+def _web_resource_json(wr, refs):
+    return {
+        "web_resource_id": wr.id,
+        "url": wr.url,
+        "domain": wr.domain,
+        "numeric_page_id": wr.numeric_page_id,
+        "referenced_by": [
+            {
+                "normalized_sha1": r.normalized_sha1,
+                "appears_on_article": r.appears_on_article,
+            }
+            for r in refs
+        ],
+    }
+
+
+def _citations_by_sha1_stmt(shas):
+    return (
+        select(NormalizedCitation.id, NormalizedCitation.normalized_sha1,
+               NormalizedCitation.reference_normalized)
+        .where(_any(NormalizedCitation.normalized_sha1, shas, CHAR(40)))
+    )
+
+
+def _page_documents_stmt(page_ids):
+    # Page IDs on more than one domain are ambiguous and get no document (see WikiPage.document_id_of)
+    return (
+        select(WikiPage.page_id, func.min(WikiPage.document_id))
+        .where(_any(WikiPage.page_id, page_ids, Integer))
+        .group_by(WikiPage.page_id)
+        .having(func.count() == 1)
+    )
+
+
+def _page_revisions_stmt(page_ids):
+    return (
+        select(Revision.page_id,
+               func.count().label("revision_count"),
+               func.max(Revision.revision_id).label("latest_revision_id"))
+        .where(_any(Revision.page_id, page_ids, Integer))
+        .group_by(Revision.page_id)
+    )
+
+
+# ---------------------------------------------------------------------------
+# Endpoints
+# ---------------------------------------------------------------------------
+
 @api_v1.route("/article", methods=["GET"])
 def get_article():
     url = request.args.get("url")
@@ -72,32 +587,23 @@ def get_article():
         return _error("url parameter is required", 400)
 
     with Session(_get_engine()) as session:
-        wr = session.query(WebResource).filter(WebResource.url == url).first()
-        if not wr:
+        resolved = resolve_url(session, url)
+        if resolved is None:
             return _error("Article not found", 404)
 
-        page_id = wr.numeric_page_id
+        page_id, document_id = resolved
         if page_id is None:
             return _error("Article has no page ID", 404)
 
-        revisions = session.execute(
-            select(Revision.revision_id, Revision.revision_timestamp, Revision.parent_revision_id)
-            .where(Revision.page_id == page_id)
-            .order_by(Revision.revision_timestamp)
-        ).all()
+        if _wants_ndjson():
+            return _ndjson_response(_revisions_stmt(page_id))
+        revisions = execute_prepared(session, 'page_revisions', page_id).all()
 
         return jsonify({
             "page_id": page_id,
-            "url": wr.url,
-            "document_id": wr.instance_of_document,
-            "revisions": [
-                {
-                    "revision_id": r.revision_id,
-                    "revision_timestamp": r.revision_timestamp,
-                    "parent_revision_id": r.parent_revision_id,
-                }
-                for r in revisions
-            ],
+            "url": url,
+            "document_id": document_id,
+            "revisions": [_revision_json(r) for r in revisions],
             "revision_count": len(revisions),
             "latest_revision_id": revisions[-1].revision_id if revisions else None,
         })
@@ -105,255 +611,86 @@ def get_article():
 
 @api_v1.route("/article/<int:page_id>/revisions", methods=["GET"])
 def get_article_revisions(page_id):
-    limit = min(request.args.get("limit", 100, type=int), 1000)
-    offset = request.args.get("offset", 0, type=int)
-
-    with Session(_get_engine()) as session:
-        total = session.execute(
-            select(func.count()).select_from(Revision).where(Revision.page_id == page_id)
-        ).scalar()
-
-        rows = session.execute(
-            select(
-                Revision.revision_id,
-                Revision.revision_timestamp,
-                Revision.parent_revision_id,
-                func.count(CitationHistory.citation_instance_id).label("citation_count"),
-            )
-            .outerjoin(CitationHistory, CitationHistory.revision_id == Revision.revision_id)
-            .where(Revision.page_id == page_id)
-            .group_by(Revision.revision_id, Revision.revision_timestamp, Revision.parent_revision_id)
-            .order_by(Revision.revision_timestamp)
-            .limit(limit).offset(offset)
-        ).all()
+    try:
+        limit, offset, after = _pagination_args((str, int))
+    except ValueError:
+        return _error("Invalid cursor", 400)
+
+    engine = _get_engine()
+    with Session(engine) as session:
+        stmt = _revision_list_stmt(page_id)
+        if _wants_ndjson():
+            # Every revision from the cursor (or the start) on; limit and offset do not apply
+            if after is not None:
+                stmt = stmt.where(_revision_list_after(after))
+            return _ndjson_response(stmt)
+
+        total = None
+        if _include_total(after):
+            total = cached(engine, "revision_count", page_id,
+                           lambda: session.execute(_revision_count_stmt(page_id)).scalar())
+
+        stmt = _paginate(stmt, limit, offset, after, _revision_list_after)
+        rows, next_cursor = _page(session.execute(stmt).all(), limit, _revision_list_key)
 
         return jsonify({
             "page_id": page_id,
             "revisions": [
-                {
-                    "revision_id": r.revision_id,
-                    "revision_timestamp": r.revision_timestamp,
-                    "parent_revision_id": r.parent_revision_id,
-                    "citation_count": r.citation_count,
-                }
+                {**_revision_json(r), "citation_count": r.citation_count}
                 for r in rows
             ],
             "total": total,
+            "next_cursor": next_cursor,
         })
 
 
 @api_v1.route("/article/<int:page_id>/citations", methods=["GET"])
 def get_article_citations(page_id):
     raw = request.args.get("raw", "false").lower() == "true"
-    limit = min(request.args.get("limit", 100, type=int), 1000)
-    offset = request.args.get("offset", 0, type=int)
+    try:
+        limit, offset, after = _pagination_args((str, int))
+    except ValueError:
+        return _error("Invalid cursor", 400)
 
     with Session(_get_engine()) as session:
-        # Resolve revision_id
+        # Latest revision for currently_visible check, and the default revision
+        latest_rev_id = execute_prepared(session, 'latest_revision', page_id).scalar()
         revision_id = request.args.get("revision_id", type=int)
         if revision_id is None:
-            revision_id = session.execute(
-                select(func.max(Revision.revision_id)).where(Revision.page_id == page_id)
-            ).scalar()
+            revision_id = latest_rev_id
         if revision_id is None:
             return _error("No revisions found for this article", 404)
 
-        rev_ts = session.execute(
-            select(Revision.revision_timestamp).where(Revision.revision_id == revision_id)
-        ).scalar()
+        rev_ts = execute_prepared(session, 'revision_timestamp', revision_id).scalar()
         if rev_ts is None:
             return _error("Revision not found", 404)
 
-        # Latest revision for currently_visible check
-        latest_rev_id = session.execute(
-            select(func.max(Revision.revision_id)).where(Revision.page_id == page_id)
-        ).scalar()
-
-        # Citation instance IDs present at this revision
-        present_ci_ids = (
-            select(CitationHistory.citation_instance_id)
-            .where(CitationHistory.revision_id == revision_id)
-            .subquery()
-        )
+        stmt = _paginate(_citations_stmt(revision_id, raw), limit, offset, after, _citations_after)
+        rows, next_cursor = _page(session.execute(stmt).all(), limit, _citations_key)
 
         if raw:
-            # Raw mode: return per-instance data
-            stmt = (
-                select(
-                    CitationInstance.id.label('ci_id'),
-                    CitationInstance.raw_sha1,
-                    CitationInstance.reference_type,
-                    CitationInstance.reference_name,
-                    func.min(Revision.revision_timestamp).label("first_seen_ts"),
-                    func.max(Revision.revision_timestamp).label("last_seen_ts"),
-                    func.min(Revision.revision_id).label("first_seen_id"),
-                    func.max(Revision.revision_id).label("last_seen_id"),
-                    func.count(Revision.revision_id).label("appearance_count"),
-                )
-                .join(CitationHistory, CitationHistory.citation_instance_id == CitationInstance.id)
-                .join(Revision, Revision.revision_id == CitationHistory.revision_id)
-                .where(CitationInstance.id.in_(select(present_ci_ids.c.citation_instance_id)))
-                .group_by(
-                    CitationInstance.id, CitationInstance.raw_sha1,
-                    CitationInstance.reference_type, CitationInstance.reference_name,
-                )
-                .order_by(func.max(Revision.revision_timestamp).desc())
-                .limit(limit).offset(offset)
-            )
-            rows = session.execute(stmt).all()
-            citations = []
-            for r in rows:
-                citations.append({
-                    "citation_instance_id": r.ci_id,
-                    "raw_sha1": r.raw_sha1,
-                    "reference_type": TYPE_LABELS.get(r.reference_type, str(r.reference_type)),
-                    "reference_name": r.reference_name,
-                    "first_seen": {"revision_id": r.first_seen_id, "revision_timestamp": r.first_seen_ts},
-                    "last_seen": {"revision_id": r.last_seen_id, "revision_timestamp": r.last_seen_ts},
-                    "currently_visible": r.last_seen_id == latest_rev_id,
-                    "appearance_count": r.appearance_count,
-                })
+            citations = [_raw_citation_json(r, latest_rev_id) for r in rows]
         else:
-            # Normalized mode: group by normalized citation
-            stmt = (
-                select(
-                    CitationInstance.id.label('ci_id'),
-                    NormalizedCitation.id.label('nc_id'),
-                    NormalizedCitation.normalized_sha1,
-                    NormalizedCitation.reference_normalized,
-                    CitationInstance.reference_type,
-                    CitationInstance.reference_name,
-                    func.min(Revision.revision_timestamp).label("first_seen_ts"),
-                    func.max(Revision.revision_timestamp).label("last_seen_ts"),
-                    func.min(Revision.revision_id).label("first_seen_id"),
-                    func.max(Revision.revision_id).label("last_seen_id"),
-                    func.count(Revision.revision_id).label("appearance_count"),
-                )
-                .join(NormalizedCitation, NormalizedCitation.id == CitationInstance.normalized_id)
-                .join(CitationHistory, CitationHistory.citation_instance_id == CitationInstance.id)
-                .join(Revision, Revision.revision_id == CitationHistory.revision_id)
-                .where(CitationInstance.id.in_(select(present_ci_ids.c.citation_instance_id)))
-                .group_by(
-                    CitationInstance.id,
-                    NormalizedCitation.id,
-                    NormalizedCitation.normalized_sha1,
-                    NormalizedCitation.reference_normalized,
-                    CitationInstance.reference_type,
-                    CitationInstance.reference_name,
-                )
-                .order_by(func.max(Revision.revision_timestamp).desc())
-                .limit(limit).offset(offset)
-            )
-            rows = session.execute(stmt).all()
-
             # Check next revision for removed_at
-            next_rev = session.execute(
-                select(Revision.revision_id, Revision.revision_timestamp)
-                .where(Revision.page_id == page_id)
-                .where(Revision.revision_id > revision_id)
-                .order_by(Revision.revision_id)
-                .limit(1)
-            ).first()
-
+            next_rev = execute_prepared(session, 'next_revision', page_id, revision_id).first()
             next_rev_ci_ids = set()
             if next_rev:
-                next_rev_ci_ids = set(session.execute(
-                    select(CitationHistory.citation_instance_id)
-                    .where(CitationHistory.revision_id == next_rev.revision_id)
+                next_rev_ci_ids = set(execute_prepared(
+                    session, 'present_citation_instances', next_rev.revision_id
                 ).scalars().all())
 
             # Batch-fetch related data
             nc_ids = list(set(r.nc_id for r in rows))
-            ci_ids = [r.ci_id for r in rows]
-
-            # Other articles
-            other_articles_map = {}
+            other_articles, links, templates = {}, {}, {}
             if nc_ids:
-                oa_rows = session.execute(
-                    select(NormalizedCitation.id.label('nc_id'),
-                           NormalizedCitation.appears_on_article, Document.id.label('doc_id'))
-                    .outerjoin(Document, Document.id == NormalizedCitation.appears_on_article)
-                    .where(NormalizedCitation.id.in_(nc_ids))
-                ).all()
-                for oa in oa_rows:
-                    other_articles_map.setdefault(oa.nc_id, []).append(oa)
-
-            # Links
-            links_map = {}
-            if nc_ids:
-                lk_rows = session.execute(
-                    select(NormalizedCitationWebResource.normalized_id,
-                           WebResource.id.label('wr_id'), WebResource.url)
-                    .join(WebResource, WebResource.id == NormalizedCitationWebResource.web_resource_id)
-                    .where(NormalizedCitationWebResource.normalized_id.in_(nc_ids))
-                ).all()
-                for lk in lk_rows:
-                    links_map.setdefault(lk.normalized_id, []).append(lk)
-
-            # Templates
-            templates_map = {}
-            if nc_ids:
-                tpl_rows = session.execute(
-                    select(TemplateData.normalized_id,
-                           WikiTemplate.id.label('wt_id'), WikiTemplate.name,
-                           TemplateData.parameter_key, TemplateData.parameter_value,
-                           TemplateData.offset_start)
-                    .join(WikiTemplate, WikiTemplate.id == TemplateData.wiki_template_id)
-                    .where(TemplateData.normalized_id.in_(nc_ids))
-                    .order_by(TemplateData.offset_start, TemplateData.parameter_key)
-                ).all()
-                for t in tpl_rows:
-                    templates_map.setdefault(t.normalized_id, []).append(t)
-
-            citations = []
-            for r in rows:
-                # Other articles
-                other_articles = [
-                    {"page_id": a.appears_on_article, "document_id": a.doc_id}
-                    for a in other_articles_map.get(r.nc_id, [])
-                ]
-
-                # Links
-                links = [
-                    {"web_resource_id": lk.wr_id, "url": lk.url}
-                    for lk in links_map.get(r.nc_id, [])
-                ]
-
-                # Templates
-                tmpl_raw = templates_map.get(r.nc_id, [])
-                tmpl_map = {}
-                for t in tmpl_raw:
-                    key = (t.wt_id, t.name, t.offset_start)
-                    if key not in tmpl_map:
-                        tmpl_map[key] = {}
-                    tmpl_map[key][t.parameter_key] = t.parameter_value
-                templates = [
-                    {"wiki_template_id": k[0], "template_name": k[1], "parameters": v}
-                    for k, v in tmpl_map.items()
-                ]
-
-                removed_at = None
-                if next_rev and r.ci_id not in next_rev_ci_ids:
-                    removed_at = {
-                        "revision_id": next_rev.revision_id,
-                        "revision_timestamp": next_rev.revision_timestamp,
-                    }
+                other_articles = _group(session.execute(_other_articles_stmt(nc_ids, page_id)).all(), 'nc_id')
+                links = _group(session.execute(_links_stmt(nc_ids)).all(), 'normalized_id')
+                templates = _group(session.execute(_templates_stmt(nc_ids)).all(), 'normalized_id')
 
-                citations.append({
-                    "citation_instance_id": r.ci_id,
-                    "normalized_sha1": r.normalized_sha1,
-                    "reference_normalized": r.reference_normalized,
-                    "reference_type": TYPE_LABELS.get(r.reference_type, str(r.reference_type)),
-                    "reference_name": r.reference_name,
-                    "first_seen": {"revision_id": r.first_seen_id, "revision_timestamp": r.first_seen_ts},
-                    "last_seen": {"revision_id": r.last_seen_id, "revision_timestamp": r.last_seen_ts},
-                    "removed_at": removed_at,
-                    "currently_visible": r.last_seen_id == latest_rev_id,
-                    "appearance_count": r.appearance_count,
-                    "other_articles": other_articles,
-                    "extracted_links": links,
-                    "templates": templates,
-                })
+            citations = [
+                _citation_json(r, latest_rev_id, next_rev, next_rev_ci_ids, other_articles, links, templates)
+                for r in rows
+            ]
 
         return jsonify({
             "page_id": page_id,
@@ -361,6 +698,7 @@ def get_article_citations(page_id):
             "revision_timestamp": rev_ts,
             "citation_count": len(citations),
             "citations": citations,
+            "next_cursor": next_cursor,
         })
 
 
@@ -368,76 +706,27 @@ def get_article_citations(page_id):
 def get_citation(normalized_sha1):
     """Look up a citation by its normalized_sha1 (content-addressed hash)."""
     with Session(_get_engine()) as session:
-        nc = session.query(NormalizedCitation).filter(
-            NormalizedCitation.normalized_sha1 == normalized_sha1
-        ).first()
+        nc = execute_prepared(session, 'citation_by_sha1', normalized_sha1).first()
         if not nc:
             return _error("Citation not found", 404)
 
-        # Articles
-        articles = session.execute(
-            select(NormalizedCitation.appears_on_article, Document.id.label('doc_id'))
-            .outerjoin(Document, Document.id == NormalizedCitation.appears_on_article)
-            .where(NormalizedCitation.id == nc.id)
-        ).all()
-
-        # Links
-        links = session.execute(
-            select(WebResource.id, WebResource.url)
-            .join(NormalizedCitationWebResource,
-                  NormalizedCitationWebResource.web_resource_id == WebResource.id)
-            .where(NormalizedCitationWebResource.normalized_id == nc.id)
-        ).all()
-
-        # Templates
-        templates_raw = session.execute(
-            select(WikiTemplate.id, WikiTemplate.name,
-                   TemplateData.parameter_key, TemplateData.parameter_value,
-                   TemplateData.offset_start)
-            .join(TemplateData, TemplateData.wiki_template_id == WikiTemplate.id)
-            .where(TemplateData.normalized_id == nc.id)
-            .order_by(TemplateData.offset_start, TemplateData.parameter_key)
-        ).all()
-        tmpl_map = {}
-        for t in templates_raw:
-            key = (t.id, t.name, t.offset_start)
-            if key not in tmpl_map:
-                tmpl_map[key] = {}
-            tmpl_map[key][t.parameter_key] = t.parameter_value
-        templates = [
-            {"wiki_template_id": k[0], "template_name": k[1], "parameters": v}
-            for k, v in tmpl_map.items()
-        ]
-
         # History via citation instances
-        history = session.execute(
-            select(CitationHistory.revision_id, Revision.revision_timestamp, Revision.page_id)
-            .join(Revision, Revision.revision_id == CitationHistory.revision_id)
-            .join(CitationInstance, CitationInstance.id == CitationHistory.citation_instance_id)
-            .where(CitationInstance.normalized_id == nc.id)
-            .order_by(Revision.revision_timestamp)
-        ).all()
+        history_stmt = _history_stmt(nc.id)
+        if _wants_ndjson():
+            return _ndjson_response(history_stmt)
+
+        articles = session.execute(_other_articles_stmt([nc.id])).all()
+        links = session.execute(_links_stmt([nc.id])).all()
+        templates = session.execute(_templates_stmt([nc.id])).all()
+        history = session.execute(history_stmt).all()
 
         return jsonify({
             "normalized_sha1": nc.normalized_sha1,
             "reference_normalized": nc.reference_normalized,
-            "appears_on_articles": [
-                {"page_id": a.appears_on_article, "document_id": a.doc_id}
-                for a in articles
-            ],
-            "extracted_links": [
-                {"web_resource_id": l.id, "url": l.url}
-                for l in links
-            ],
-            "templates": templates,
-            "history": [
-                {
-                    "revision_id": h.revision_id,
-                    "revision_timestamp": h.revision_timestamp,
-                    "page_id": h.page_id,
-                }
-                for h in history
-            ],
+            "appears_on_articles": [_other_article_json(a) for a in articles],
+            "extracted_links": [_link_json(lk) for lk in links],
+            "templates": _templates_json(templates),
+            "history": [_history_json(h) for h in history],
         })
 
 
@@ -445,34 +734,18 @@ def get_citation(normalized_sha1):
 def get_citation_history(normalized_sha1):
     """Get revision history for a citation identified by normalized_sha1."""
     with Session(_get_engine()) as session:
-        nc = session.query(NormalizedCitation).filter(
-            NormalizedCitation.normalized_sha1 == normalized_sha1
-        ).first()
+        nc = execute_prepared(session, 'citation_by_sha1', normalized_sha1).first()
         if not nc:
             return _error("Citation not found", 404)
 
-        page_id = request.args.get("page_id", type=int)
-        stmt = (
-            select(CitationHistory.revision_id, Revision.revision_timestamp, Revision.page_id)
-            .join(Revision, Revision.revision_id == CitationHistory.revision_id)
-            .join(CitationInstance, CitationInstance.id == CitationHistory.citation_instance_id)
-            .where(CitationInstance.normalized_id == nc.id)
-        )
-        if page_id is not None:
-            stmt = stmt.where(Revision.page_id == page_id)
-        stmt = stmt.order_by(Revision.revision_timestamp)
+        stmt = _history_stmt(nc.id, request.args.get("page_id", type=int))
+        if _wants_ndjson():
+            return _ndjson_response(stmt)
 
         rows = session.execute(stmt).all()
         return jsonify({
             "normalized_sha1": normalized_sha1,
-            "revisions": [
-                {
-                    "revision_id": r.revision_id,
-                    "revision_timestamp": r.revision_timestamp,
-                    "page_id": r.page_id,
-                }
-                for r in rows
-            ],
+            "revisions": [_history_json(r) for r in rows],
         })
 
 
@@ -483,51 +756,59 @@ def get_template_report(wiki_template_id):
     if not parameter_key or parameter_value is None:
         return _error("parameter_key and parameter_value are required", 400)
 
-    limit = min(request.args.get("limit", 100, type=int), 1000)
-    offset = request.args.get("offset", 0, type=int)
+    try:
+        limit, offset, after = _pagination_args((int,))
+    except ValueError:
+        return _error("Invalid cursor", 400)
 
-    with Session(_get_engine()) as session:
+    engine = _get_engine()
+    with Session(engine) as session:
         tmpl = session.query(WikiTemplate).filter(WikiTemplate.id == wiki_template_id).first()
         if not tmpl:
             return _error("Template not found", 404)
 
-        stmt = (
-            select(
-                NormalizedCitation.normalized_sha1,
-                NormalizedCitation.reference_normalized,
-                NormalizedCitation.appears_on_article,
-            )
-            .join(TemplateData,
-                  TemplateData.normalized_id == NormalizedCitation.id)
-            .where(TemplateData.wiki_template_id == wiki_template_id)
-            .where(TemplateData.parameter_key == parameter_key)
-            .where(TemplateData.parameter_value == parameter_value)
-            .distinct()
-        )
+        stmt = _template_report_stmt(wiki_template_id, parameter_key, parameter_value)
+
+        if _wants_ndjson():
+            if after is not None:
+                stmt = stmt.where(_template_report_after(after))
+            return _ndjson_response(stmt, _template_report_json)
 
-        total = session.execute(
-            select(func.count()).select_from(stmt.subquery())
-        ).scalar()
+        total = None
+        if _include_total(after):
+            count_key = json.dumps([wiki_template_id, parameter_key, parameter_value])
+            total = cached(engine, "template_report_count", count_key, lambda: session.execute(
+                _template_report_count_stmt(wiki_template_id, parameter_key, parameter_value, stmt)
+            ).scalar())
 
-        rows = session.execute(stmt.limit(limit).offset(offset)).all()
+        page_stmt = _paginate(stmt, limit, offset, after, _template_report_after)
+        rows, next_cursor = _page(session.execute(page_stmt).all(), limit, lambda r: (r.id,))
 
         return jsonify({
             "wiki_template_id": wiki_template_id,
             "template_name": tmpl.name,
             "parameter_key": parameter_key,
             "parameter_value": parameter_value,
-            "citations": [
-                {
-                    "normalized_sha1": r.normalized_sha1,
-                    "reference_normalized": r.reference_normalized,
-                    "appears_on_article": r.appears_on_article,
-                }
-                for r in rows
-            ],
+            "citations": [_template_report_json(r) for r in rows],
             "total": total,
+            "next_cursor": next_cursor,
         })
 
 
+@api_v1.route("/template/<int:wiki_template_id>/stats", methods=["GET"])
+def get_template_stats(wiki_template_id):
+    """Most common values of each parameter of a template, computed by load_all.py."""
+    limit = max(_int_arg(request.args, "limit", 20), 1)
+    with Session(_get_engine()) as session:
+        tmpl = session.query(WikiTemplate).filter(WikiTemplate.id == wiki_template_id).first()
+        if not tmpl:
+            return _error("Template not found", 404)
+        rows = session.execute(
+            _template_stats_stmt(wiki_template_id, request.args.get("parameter_key"), limit)
+        ).all()
+        return jsonify(_template_stats_json(wiki_template_id, tmpl.name, rows))
+
+
 @api_v1.route("/web_resource", methods=["GET"])
 def get_web_resource():
     url = request.args.get("url")
@@ -535,36 +816,124 @@ def get_web_resource():
         return _error("url parameter is required", 400)
 
     with Session(_get_engine()) as session:
-        wr = session.query(WebResource).filter(WebResource.url == url).first()
+        wr = session.execute(_web_resources_stmt([url])).first()
         if not wr:
             return _error("Web resource not found", 404)
+        refs = session.execute(_referenced_by_stmt([wr.id])).all()
+        return jsonify(_web_resource_json(wr, refs))
+
+
+# ---------------------------------------------------------------------------
+# Batch lookups
+# ---------------------------------------------------------------------------
+
+def _batch_keys(field, item_type):
+    """Read the list of keys in `field` of the JSON request body, without duplicates.
+
+    Returns (keys, None) or (None, error response).
+    """
+    keys, error = _check_batch_keys(request.get_json(silent=True), field, item_type)
+    if error:
+        return None, _error(error, 400)
+    return keys, None
+
+
+def _check_batch_keys(body, field, item_type):
+    """Validate a batch request body. Returns (keys, None) or (None, error message)."""
+    keys = body.get(field) if isinstance(body, dict) else None
+    if not isinstance(keys, list) or not all(isinstance(k, item_type) and not isinstance(k, bool) for k in keys):
+        return None, f"Request body must be a JSON object with a list of {item_type.__name__} in '{field}'"
+    if len(keys) > BATCH_MAX_KEYS:
+        return None, f"At most {BATCH_MAX_KEYS} keys per request"
+    return list(dict.fromkeys(keys)), None
+
+
+def _batch_citations_json(citations, articles, links, templates):
+    """Results of /batch/citations, from rows of _citations_by_sha1_stmt and
+    the rows of _other_articles_stmt, _links_stmt and _templates_stmt grouped
+    by normalized id."""
+    return {
+        c.normalized_sha1: {
+            "normalized_sha1": c.normalized_sha1,
+            "reference_normalized": c.reference_normalized,
+            "appears_on_articles": [_other_article_json(a) for a in articles.get(c.id, [])],
+            "extracted_links": [_link_json(lk) for lk in links.get(c.id, [])],
+            "templates": _templates_json(templates.get(c.id, [])),
+        }
+        for c in citations
+    }
+
+
+def _batch_articles_json(documents, revisions):
+    """Results of /batch/articles, keyed by page ID as a string, from rows of
+    _page_documents_stmt and _page_revisions_stmt."""
+    documents = dict(documents)
+    results = {
+        str(page_id): {
+            "page_id": page_id,
+            "document_id": document_id,
+            "revision_count": 0,
+            "latest_revision_id": None,
+        }
+        for page_id, document_id in documents.items()
+    }
+    for r in revisions:
+        results[str(r.page_id)] = {
+            "page_id": r.page_id,
+            "document_id": documents.get(r.page_id),
+            "revision_count": r.revision_count,
+            "latest_revision_id": r.latest_revision_id,
+        }
+    return results
+
+
+@api_v1.route("/batch/citations", methods=["POST"])
+def batch_citations():
+    """Look up many citations by normalized_sha1. Like /citation/<sha1> without history."""
+    keys, error = _batch_keys("normalized_sha1", str)
+    if error:
+        return error
+
+    with Session(_get_engine()) as session:
+        citations = session.execute(_citations_by_sha1_stmt(keys)).all()
+        nc_ids = [c.id for c in citations]
+        articles = _group(session.execute(_other_articles_stmt(nc_ids)).all(), 'nc_id')
+        links = _group(session.execute(_links_stmt(nc_ids)).all(), 'normalized_id')
+        templates = _group(session.execute(_templates_stmt(nc_ids)).all(), 'normalized_id')
 
-        domain_val = None
-        if wr.domain_id:
-            domain_val = session.execute(
-                select(Domain.value).where(Domain.id == wr.domain_id)
-            ).scalar()
+    results = dict.fromkeys(keys)
+    results.update(_batch_citations_json(citations, articles, links, templates))
+    return jsonify({"results": results})
 
-        refs = session.execute(
-            select(
-                NormalizedCitation.normalized_sha1,
-                NormalizedCitation.appears_on_article,
-            )
-            .join(NormalizedCitationWebResource,
-                  NormalizedCitationWebResource.normalized_id == NormalizedCitation.id)
-            .where(NormalizedCitationWebResource.web_resource_id == wr.id)
-        ).all()
 
-        return jsonify({
-            "web_resource_id": wr.id,
-            "url": wr.url,
-            "domain": domain_val,
-            "numeric_page_id": wr.numeric_page_id,
-            "referenced_by": [
-                {
-                    "normalized_sha1": r.normalized_sha1,
-                    "appears_on_article": r.appears_on_article,
-                }
-                for r in refs
-            ],
-        })
+@api_v1.route("/batch/web_resources", methods=["POST"])
+def batch_web_resources():
+    """Look up many web resources by URL. Like /web_resource?url= for each URL."""
+    keys, error = _batch_keys("urls", str)
+    if error:
+        return error
+
+    with Session(_get_engine()) as session:
+        resources = session.execute(_web_resources_stmt(keys)).all()
+        refs = _group(session.execute(_referenced_by_stmt([wr.id for wr in resources])).all(), 'web_resource_id')
+
+    results = dict.fromkeys(keys)
+    results.update({wr.url: _web_resource_json(wr, refs.get(wr.id, [])) for wr in resources})
+    return jsonify({"results": results})
+
+
+@api_v1.route("/batch/articles", methods=["POST"])
+def batch_articles():
+    """Summarize many articles by page ID: document, revision count and latest revision.
+    Results are keyed by the page ID as a string."""
+    keys, error = _batch_keys("page_ids", int)
+    if error:
+        return error
+
+    with Session(_get_engine()) as session:
+        documents = session.execute(_page_documents_stmt(keys)).all()
+        revisions = session.execute(_page_revisions_stmt(keys)).all()
+
+    results = dict.fromkeys(str(k) for k in keys)
+    results.update(_batch_articles_json(documents, revisions))
+    return jsonify({"results": results})
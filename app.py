@@ -1,28 +1,12 @@
-from flask import Flask, redirect
-from sqlalchemy import create_engine
+from flask import Flask, jsonify, redirect
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
 from dotenv import load_dotenv
-import os
 
 app = Flask(__name__)
 load_dotenv()
 
-_required_db_vars = ['DB_HOST', 'DB_PORT', 'DB_NAME', 'DB_USER', 'DB_PASS']
-_missing = [v for v in _required_db_vars if not os.getenv(v)]
-if _missing:
-    raise RuntimeError(
-        f"Missing required environment variable(s): {', '.join(_missing)}. "
-        f"Check your .env file (see example.env)."
-    )
-
-engine = create_engine(
-    f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASS')}@"
-    f"{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
-    ,
-    pool_pre_ping=True,
-    pool_recycle=int(os.getenv('DB_POOL_RECYCLE', '1800')),
-    # Avoid dumping huge bound-parameter payloads in exception text when a statement fails.
-    hide_parameters=True,
-)
+from web_engine import create_web_engine, pool_stats
+engine = create_web_engine()
 
 from api_v1 import api_v1
 app.register_blueprint(api_v1)
@@ -30,9 +14,39 @@ app.register_blueprint(api_v1)
 from explorer import explorer
 app.register_blueprint(explorer)
 
+from http_cache import init_http_caching
+init_http_caching(app, engine, [api_v1, explorer])
+
 @app.route("/")
 def index():
     return redirect("/explorer/")
 
+
+@app.route("/metrics")
+def metrics():
+    return jsonify({"pool": pool_stats(engine)})
+
+
+def _unavailable(msg):
+    response = jsonify({"error": msg, "code": 503})
+    response.status_code = 503
+    response.headers["Retry-After"] = "1"
+    return response
+
+
+@app.errorhandler(PoolTimeoutError)
+def pool_timeout(e):
+    engine.pool_counters.add('timeouts')
+    return _unavailable("No database connection available")
+
+
+@app.errorhandler(DBAPIError)
+def database_error(e):
+    # The connection dropped (e.g. the database restarted) and the pool was
+    # invalidated; the next request reconnects
+    if e.connection_invalidated:
+        return _unavailable("Database connection lost")
+    raise e
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=12121, debug=True)
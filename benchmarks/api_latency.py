@@ -0,0 +1,538 @@
+"""Latency benchmark for the /api/v1 and explorer endpoints of app.py.
+
+Seeds a database with a synthetic dataset shaped like production, replays a
+request mix against app:app at a fixed concurrency, and reports p50/p95/p99
+latency and the number of SQL queries per request for each endpoint. A rise
+in queries per request is how an N+1 query shows up; a rise in p95 with the
+same query count points at a plan change such as a lost index.
+
+The dataset is written as deduped Parquet files (the layout dedup_parquet.py
+produces) and loaded with load_all.py into the Postgres database named by
+--database, whose tables are dropped first, or with --backend duckdb into the
+read-only DuckDB store (duckdb_store.py). Its shape follows the cases that
+are slow in production:
+
+- a few long-history articles (--long-pages, --long-revisions) among many
+  short ones, and the traffic favours them;
+- citations reused on a large share of all pages (--hot-citations, --hot-share);
+- one big template (Cite web) used by most citations, whose `website` and
+  `publisher` values repeat across thousands of citations.
+
+Requests run in process through Flask's test client, one client per worker
+thread (--concurrency), so each request's queries can be counted with an
+SQLAlchemy event on app.engine. The mix is drawn from the seeded data
+(--requests, --seed); --record saves it as JSON lines, {"method", "path",
+"json"}, and --replay runs a saved or hand-made mix instead. --cold-caches
+sizes the app's lookup and partials caches to 0, so every request runs all of
+its queries.
+
+Each run is appended as a JSON line to --history and compared with the last
+run there with the same options; --fail-on-regression exits with status 1 if
+an endpoint's mean queries per request went up or its p95 grew by more than
+--p95-tolerance. Query counts are steadiest with --cold-caches.
+
+Usage:
+    python3 benchmarks/api_latency.py --backend duckdb --workdir /tmp/api-bench
+    python3 benchmarks/api_latency.py --database wrdb_bench --requests 5000 --concurrency 16
+    python3 benchmarks/api_latency.py --database wrdb_bench --skip-seed --replay mix.jsonl --fail-on-regression
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+from sqlalchemy import event, text
+
+from benchmarks.pipeline import git_commit, previous_run, run_stage
+import duckdb_store
+from duckdb_store import PARQUET_COLUMNS
+
+
+DEFAULT_HISTORY = os.path.join(ROOT, 'benchmarks', 'results', 'api_latency.jsonl')
+WIKI = 'en.wikipedia.org'
+ARROW_TYPES = {'VARCHAR': pa.string(), 'INTEGER': pa.int32(), 'BIGINT': pa.int64(), 'SMALLINT': pa.int16()}
+
+WORDS = ("river city history council report survey election museum railway bridge census festival "
+         "school harbour archive season league album bishop castle station mayor parish village").split()
+PUBLISHERS = [f"The {k} {w}" for w in ("Times", "Herald", "Gazette", "Press") for k in ("Daily", "Weekly", "Evening")]
+
+
+def log(msg):
+    ts = time.strftime('%Y-%m-%d %H:%M:%S')
+    print(f"{ts} [api_latency] {msg}", flush=True)
+
+
+def sha1(value):
+    return hashlib.sha1(value.encode('utf-8')).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Dataset
+# ---------------------------------------------------------------------------
+
+class DedupedTables:
+    """Rows of the deduped Parquet files, unique on the keys dedup_parquet.py dedups on."""
+
+    # table -> positions, in PARQUET_COLUMNS order, of the columns of its key
+    KEYS = {
+        'containers': (0,), 'domains': (0,), 'documents': (1, 2), 'web_resources': (0,),
+        'citation_instances': (0, 1), 'normalized_citations': (0,), 'citation_histories': (0, 1, 2),
+        'revisions': (0,), 'ncwr': (0, 1), 'wiki_templates': (0, 1), 'template_data': (0, 1, 2, 3, 4),
+    }
+
+    def __init__(self):
+        self.rows = {name: {} for name in PARQUET_COLUMNS}
+
+    def add(self, table, *values):
+        self.rows[table].setdefault(tuple(values[i] for i in self.KEYS[table]), values)
+
+    def write(self, dataset_dir):
+        os.makedirs(dataset_dir, exist_ok=True)
+        for table, columns in PARQUET_COLUMNS.items():
+            values = list(self.rows[table].values())
+            schema = pa.schema([(c, ARROW_TYPES[t]) for c, t in columns.items()])
+            arrays = [pa.array([row[i] for row in values], type=schema.field(i).type) for i in range(len(columns))]
+            pq.write_table(pa.Table.from_arrays(arrays, schema=schema),
+                           os.path.join(dataset_dir, f'{table}.parquet'), compression='zstd')
+        return {table: len(rows) for table, rows in self.rows.items()}
+
+
+def write_dataset(dataset_dir, pages=300, revisions=30, long_pages=3, long_revisions=2000, refs=20,
+                  hot_citations=20, hot_share=0.3, seed=0):
+    """Write the synthetic dataset to `dataset_dir`; returns rows per table.
+
+    Pages 1..long_pages have long_revisions revisions each, the others about
+    `revisions`. Each page cites about `refs` citations; every hot citation is
+    also cited by a share `hot_share` of all pages. A citation is present from
+    the revision it is added in to the revision it is removed in, or the last.
+    """
+    rng = random.Random(seed)
+    tables = DedupedTables()
+    tables.add('containers', WIKI)
+    tables.add('domains', WIKI, WIKI)
+    hosts = [f"{rng.choice(WORDS)}{k}.example.org" for k in range(100)]
+
+    def citation(kind):
+        host = rng.choice(hosts)
+        url = f"https://{host}/{rng.choice(WORDS)}/{rng.randrange(10**9)}"
+        params = [('url', url), ('title', ' '.join(rng.choice(WORDS) for _ in range(4)).capitalize())]
+        if kind == 'Cite web':
+            params += [('website', host), ('publisher', rng.choice(PUBLISHERS)),
+                       ('access-date', f"20{rng.randint(10, 24)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}")]
+        elif kind == 'Cite news':
+            params += [('work', rng.choice(PUBLISHERS)), ('date', f"20{rng.randint(10, 24)}-05-01")]
+        else:
+            params += [('doi', f"10.{rng.randint(1000, 9999)}/{rng.randrange(10**7)}"),
+                       ('journal', f"Journal of {rng.choice(WORDS).title()}")]
+        text_ = '{{' + kind + ' ' + ' '.join(f"|{k}={v}" for k, v in params) + '}}'
+        return kind, text_, host, url, params
+
+    def template_kind():
+        return rng.choices(['Cite web', 'Cite news', 'Cite journal'], [8, 3, 1])[0]
+
+    hot = [citation(template_kind()) for _ in range(hot_citations)]
+    revision_id = 1_000_000
+    for page_id in range(1, pages + 1):
+        tables.add('documents', 'en', WIKI, page_id)
+        tables.add('web_resources', f"https://{WIKI}/w/index.php?curid={page_id}", WIKI, page_id, 0)
+        count = long_revisions if page_id <= long_pages else max(1, int(rng.gauss(revisions, revisions / 3)))
+        revision_ids = []
+        timestamp = 1_262_304_000 + rng.randrange(10**7)
+        parent = None
+        for _ in range(count):
+            revision_id += 1
+            timestamp += rng.randrange(60, 10**5)
+            tables.add('revisions', revision_id, page_id, parent,
+                       time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(timestamp)))
+            revision_ids.append(revision_id)
+            parent = revision_id
+
+        cited = [citation(template_kind()) for _ in range(max(1, int(rng.gauss(refs, refs / 4))))]
+        cited += [c for c in hot if rng.random() < hot_share]
+        for kind, text_, host, url, params in cited:
+            normalized_sha1 = sha1(text_)
+            raw_sha1 = sha1(f"<ref>{text_}</ref>")
+            tables.add('citation_instances', page_id, raw_sha1, normalized_sha1, 0, None)
+            tables.add('normalized_citations', normalized_sha1, text_, page_id, WIKI)
+            tables.add('domains', host, None)
+            tables.add('web_resources', url, host, None, None)
+            tables.add('ncwr', normalized_sha1, url)
+            tables.add('wiki_templates', WIKI, kind)
+            for key, value in params:
+                tables.add('template_data', WIKI, kind, normalized_sha1, 2, key, value)
+            # most citations stay once added; some are removed again
+            start = rng.randrange(len(revision_ids)) if rng.random() < 0.5 else 0
+            end = len(revision_ids) if rng.random() < 0.8 else rng.randint(start + 1, len(revision_ids))
+            for rid in revision_ids[start:end]:
+                tables.add('citation_histories', page_id, raw_sha1, rid)
+    return tables.write(dataset_dir)
+
+
+def seed(args, dataset_dir):
+    t0 = time.perf_counter()
+    counts = write_dataset(dataset_dir, pages=args.pages, revisions=args.revisions, long_pages=args.long_pages,
+                           long_revisions=args.long_revisions, refs=args.refs, hot_citations=args.hot_citations,
+                           hot_share=args.hot_share, seed=args.seed)
+    log(f"wrote {counts['revisions']} revisions, {counts['citation_histories']} citation history rows, "
+        f"{counts['normalized_citations']} citations in {time.perf_counter() - t0:.1f}s")
+    if args.backend == 'postgres':
+        env = dict(os.environ, DB_NAME=args.database)
+        run_stage('purge', [sys.executable, 'purge.py'], env=env)
+        run_stage('init_db', [sys.executable, 'init_db.py'], env=env)
+        seconds, _, _ = run_stage('load', [sys.executable, 'load_all.py', '-d', os.path.dirname(dataset_dir),
+                                           '-j', str(args.load_jobs), '--restart'], env=env)
+        log(f"loaded {args.database} in {seconds:.1f}s")
+    # the DuckDB store is (re)built from dataset_dir when app.py opens it
+
+
+# ---------------------------------------------------------------------------
+# Request mix
+# ---------------------------------------------------------------------------
+
+def sample_data(engine, limit=2000):
+    """Keys to build requests from, most cited citations first."""
+    with engine.connect() as conn:
+        def rows(sql):
+            return conn.execute(text(sql), {'n': limit}).all()
+        data = {
+            'pages': [r[0] for r in rows("SELECT DISTINCT page_id FROM revisions ORDER BY page_id LIMIT :n")],
+            'revisions': rows("SELECT page_id, revision_id FROM revisions ORDER BY random() LIMIT :n"),
+            'article_urls': [r[0] for r in rows(
+                "SELECT url FROM web_resources WHERE numeric_page_id IS NOT NULL ORDER BY numeric_page_id LIMIT :n")],
+            'urls': [r[0] for r in rows(
+                "SELECT url FROM web_resources WHERE numeric_page_id IS NULL ORDER BY random() LIMIT :n")],
+            'citations': [r[0] for r in rows(
+                "SELECT nc.normalized_sha1 FROM normalized_citations nc JOIN "
+                "(SELECT normalized_id, count(*) AS n FROM citation_instances GROUP BY normalized_id "
+                " ORDER BY n DESC LIMIT :n) ci ON ci.normalized_id = nc.id ORDER BY ci.n DESC")],
+            'template_values': rows(
+                "SELECT wiki_template_id, parameter_key, parameter_value FROM template_parameter_stats "
+                "ORDER BY value_count DESC LIMIT :n"),
+        }
+    if not data['pages'] or not data['citations']:
+        raise SystemExit("The database has no revisions or citations; seed it first")
+    return data
+
+
+def pick(rng, items, skew=2.0):
+    """An item of `items`, favouring the first ones (popular pages, much-cited citations)."""
+    return items[min(len(items) - 1, int(len(items) * rng.random() ** skew))]
+
+
+def _citations_params(rng, data):
+    page_id, revision_id = pick(rng, data['revisions'], 1.0)
+    if rng.random() < 0.5:
+        page_id = pick(rng, data['pages'])
+        return f"/api/v1/article/{page_id}/citations?raw={'true' if rng.random() < 0.2 else 'false'}"
+    return f"/api/v1/article/{page_id}/citations?revision_id={revision_id}"
+
+
+def _template_report(prefix):
+    def build(rng, data):
+        if not data['template_values']:
+            return None
+        template_id, key, value = pick(rng, data['template_values'])
+        query = {'parameter_key': key, 'parameter_value': value}
+        return {'path': f"{prefix}/template/{template_id}/report", 'query': query}
+    return build
+
+
+# (name, weight, builder) -> a path, or a dict with path, query, method and json
+MIX = [
+    ('article', 10, lambda rng, data: {'path': '/api/v1/article',
+                                       'query': {'url': pick(rng, data['article_urls'])}}),
+    ('article_revisions', 5, lambda rng, data: f"/api/v1/article/{pick(rng, data['pages'])}/revisions"),
+    ('article_citations', 15, _citations_params),
+    ('citation', 10, lambda rng, data: f"/api/v1/citation/{pick(rng, data['citations'])}"),
+    ('citation_history', 5, lambda rng, data: f"/api/v1/citation/{pick(rng, data['citations'])}/history"),
+    ('template_report', 3, _template_report('/api/v1')),
+    ('template_stats', 2, lambda rng, data: data['template_values'] and
+        f"/api/v1/template/{pick(rng, data['template_values'])[0]}/stats"),
+    ('web_resource', 5, lambda rng, data: data['urls'] and {'path': '/api/v1/web_resource',
+                                                            'query': {'url': rng.choice(data['urls'])}}),
+    ('batch_citations', 2, lambda rng, data: {
+        'method': 'POST', 'path': '/api/v1/batch/citations',
+        'json': {'normalized_sha1': [pick(rng, data['citations'], 1.0) for _ in range(50)]}}),
+    ('batch_articles', 2, lambda rng, data: {
+        'method': 'POST', 'path': '/api/v1/batch/articles',
+        'json': {'page_ids': [pick(rng, data['pages'], 1.0) for _ in range(50)]}}),
+    ('explorer_article', 5, lambda rng, data: {'path': '/explorer/article',
+                                               'query': {'url': pick(rng, data['article_urls'])}}),
+    ('explorer_citations', 15, lambda rng, data: "/explorer/partials/citations?page_id={}&revision_id={}".format(
+        *pick(rng, data['revisions'], 1.0))),
+    ('explorer_citation_report', 4, lambda rng, data: f"/explorer/citation/{pick(rng, data['citations'])}/report"),
+    ('explorer_other_articles', 4, lambda rng, data: "/explorer/citation/{}/other-articles?page_id={}".format(
+        pick(rng, data['citations']), pick(rng, data['pages']))),
+    ('explorer_template_report', 2, _template_report('/explorer')),
+]
+
+
+def build_mix(data, requests, seed):
+    rng = random.Random(seed)
+    names = [name for name, _, _ in MIX]
+    weights = [weight for _, weight, _ in MIX]
+    builders = {name: build for name, _, build in MIX}
+    mix = []
+    while len(mix) < requests:
+        request = builders[rng.choices(names, weights)[0]](rng, data)
+        if not request:
+            continue  # e.g. no template stats in this database
+        if isinstance(request, str):
+            request = {'path': request}
+        if 'query' in request:
+            request['path'] += '?' + urlencode(request.pop('query'))
+        mix.append({'method': request.get('method', 'GET'), 'path': request['path'], 'json': request.get('json')})
+    return mix
+
+
+def read_mix(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_mix(path, mix):
+    with open(path, 'w') as f:
+        for request in mix:
+            f.write(json.dumps(request) + '\n')
+
+
+# ---------------------------------------------------------------------------
+# Replay
+# ---------------------------------------------------------------------------
+
+class QueryCounter:
+    """Counts the SQL statements each thread runs on an engine."""
+
+    def __init__(self, engine):
+        self._local = threading.local()
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self._local.count = getattr(self._local, 'count', 0) + 1
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+
+def replay(app, engine, mix, concurrency):
+    """Run `mix` with `concurrency` worker threads; returns (results, seconds).
+
+    Each result is (endpoint, status, milliseconds, queries).
+    """
+    counter = QueryCounter(engine)
+    adapter = app.url_map.bind('localhost')
+    results = []
+    lock = threading.Lock()
+    position = iter(range(len(mix)))
+
+    def endpoint(request):
+        try:
+            return adapter.match(request['path'].split('?', 1)[0], method=request['method'])[0]
+        except Exception:
+            return 'unmatched'
+
+    def worker():
+        client = app.test_client()
+        while True:
+            with lock:
+                i = next(position, None)
+            if i is None:
+                return
+            request = mix[i]
+            counter.reset()
+            t0 = time.perf_counter()
+            response = client.open(request['path'], method=request['method'], json=request.get('json'))
+            elapsed = (time.perf_counter() - t0) * 1000
+            response.close()
+            with lock:
+                results.append((endpoint(request), response.status_code, elapsed, counter.count))
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - t0
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(results):
+    by_endpoint = defaultdict(list)
+    for name, status, ms, queries in results:
+        by_endpoint[name].append((status, ms, queries))
+    summary = {}
+    for name, rows in sorted(by_endpoint.items()):
+        timings = [ms for _, ms, _ in rows]
+        queries = [q for _, _, q in rows]
+        summary[name] = {
+            'requests': len(rows),
+            'errors': sum(1 for status, _, _ in rows if status >= 400),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'max_ms': round(max(timings), 2),
+            'queries_mean': round(sum(queries) / len(queries), 2),
+            'queries_max': max(queries),
+        }
+    return summary
+
+
+def regressions(summary, previous, p95_tolerance, min_requests=20):
+    """Endpoints whose mean queries per request rose, or whose p95 grew past the tolerance.
+
+    The mean may move by a fraction of a query between runs (the data
+    generation check runs on some requests only), so only a rise of more than
+    half a query counts. p95 is compared for endpoints with at least
+    `min_requests` requests in both runs.
+    """
+    found = []
+    for name, now in summary.items():
+        before = (previous or {}).get('endpoints', {}).get(name)
+        if not before:
+            continue
+        if now['queries_mean'] > before['queries_mean'] + 0.5:
+            found.append(f"{name}: queries per request {before['queries_mean']} -> {now['queries_mean']}")
+        if (min(now['requests'], before['requests']) >= min_requests and before['p95_ms']
+                and now['p95_ms'] > before['p95_ms'] * (1 + p95_tolerance)):
+            found.append(f"{name}: p95 {before['p95_ms']} ms -> {now['p95_ms']} ms")
+    return found
+
+
+def print_summary(summary, previous):
+    print(f"\n{'endpoint':<42} {'n':>6} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'queries':>8} {'max q':>6}  p95 vs previous")
+    for name, s in summary.items():
+        before = (previous or {}).get('endpoints', {}).get(name)
+        change = f"{100 * (s['p95_ms'] / before['p95_ms'] - 1):+.0f}%" if before and before['p95_ms'] else ''
+        print(f"{name:<42} {s['requests']:>6} {s['errors']:>4} {s['p50_ms']:>8.2f} {s['p95_ms']:>8.2f} "
+              f"{s['p99_ms']:>8.2f} {s['queries_mean']:>8.2f} {s['queries_max']:>6}  {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed a synthetic dataset and measure API and explorer latency')
+    parser.add_argument('--backend', choices=['postgres', 'duckdb'], default='postgres',
+                        help='Serve from Postgres (needs --database) or from the DuckDB store (default: postgres)')
+    parser.add_argument('--database', help='Postgres database to seed and query; all its tables are dropped '
+                                           'when seeding. Other DB_* settings from .env')
+    parser.add_argument('--workdir', help='Directory for the dataset (default: a temporary directory, removed '
+                                          'afterwards; with --backend duckdb, reused by --skip-seed)')
+    parser.add_argument('--skip-seed', action='store_true', help='Use the data seeded by an earlier run')
+    parser.add_argument('--pages', type=int, default=300, help='Pages in the dataset (default: 300)')
+    parser.add_argument('--revisions', type=int, default=30, help='Mean revisions per page (default: 30)')
+    parser.add_argument('--long-pages', type=int, default=3, help='Pages with a long history (default: 3)')
+    parser.add_argument('--long-revisions', type=int, default=2000,
+                        help='Revisions of each long-history page (default: 2000)')
+    parser.add_argument('--refs', type=int, default=20, help='Mean citations per page (default: 20)')
+    parser.add_argument('--hot-citations', type=int, default=20,
+                        help='Citations reused across many pages (default: 20)')
+    parser.add_argument('--hot-share', type=float, default=0.3,
+                        help='Share of pages citing each hot citation (default: 0.3)')
+    parser.add_argument('--load-jobs', type=int, default=4, help='load_all.py connections when seeding (default: 4)')
+    parser.add_argument('--requests', type=int, default=2000, help='Requests in the generated mix (default: 2000)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent worker threads (default: 8)')
+    parser.add_argument('--warmup', type=int, default=100,
+                        help='Requests from the mix run once before measuring (default: 100)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the dataset and mix (default: 0)')
+    parser.add_argument('--record', help='Write the request mix to this JSON lines file')
+    parser.add_argument('--replay', help='Run the requests in this JSON lines file instead of a generated mix')
+    parser.add_argument('--cold-caches', action='store_true',
+                        help="Disable the app's lookup and partials caches")
+    parser.add_argument('--history', default=DEFAULT_HISTORY,
+                        help='JSON lines file the run is appended to (default: benchmarks/results/api_latency.jsonl)')
+    parser.add_argument('--label', default='', help='Free-form note stored with the run')
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help='Exit with status 1 if queries per request or p95 regressed against the previous run')
+    parser.add_argument('--p95-tolerance', type=float, default=0.5,
+                        help='p95 growth counted as a regression, as a fraction (default: 0.5)')
+    args = parser.parse_args()
+
+    if args.backend == 'postgres' and not args.database:
+        parser.error("--backend postgres needs --database; seeding drops all of its tables")
+    if args.backend == 'duckdb' and args.skip_seed and not args.workdir:
+        parser.error("--skip-seed with --backend duckdb needs the --workdir of an earlier run")
+
+    load_dotenv()
+    workdir = args.workdir or tempfile.mkdtemp(prefix='api-bench-')
+    dataset_dir = os.path.join(workdir, 'staging', 'deduped')
+    try:
+        if not args.skip_seed:
+            seed(args, dataset_dir)
+
+        # app.py reads its backend and cache settings when it is imported
+        os.environ['API_BACKEND'] = args.backend
+        if args.backend == 'postgres':
+            os.environ['DB_NAME'] = args.database
+        else:
+            # duckdb_store, imported above, has read DUCKDB_DATASET_DIR already
+            duckdb_store.DATASET_DIR = dataset_dir
+        if args.cold_caches:
+            os.environ['RESOLVER_CACHE_MAX_ENTRIES'] = '0'
+            os.environ['PARTIALS_CACHE_MAX_ENTRIES'] = '0'
+        os.environ['DB_POOL_SIZE'] = os.getenv('DB_POOL_SIZE', str(args.concurrency))
+        from app import app, engine
+
+        mix = read_mix(args.replay) if args.replay else build_mix(sample_data(engine), args.requests, args.seed)
+        if args.record:
+            write_mix(args.record, mix)
+            log(f"recorded {len(mix)} requests to {args.record}")
+        if args.warmup:
+            replay(app, engine, mix[:args.warmup], args.concurrency)
+        results, seconds = replay(app, engine, mix, args.concurrency)
+        summary = summarize(results)
+        log(f"{len(results)} requests in {seconds:.1f}s ({len(results) / seconds:.0f} req/s) "
+            f"at concurrency {args.concurrency}")
+
+        options = {k: getattr(args, k) for k in (
+            'backend', 'pages', 'revisions', 'long_pages', 'long_revisions', 'refs', 'hot_citations', 'hot_share',
+            'requests', 'concurrency', 'warmup', 'seed', 'replay', 'cold_caches')}
+        previous = previous_run(args.history, options)
+        record = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'commit': git_commit(),
+            'label': args.label,
+            'options': options,
+            'requests_per_sec': round(len(results) / seconds, 1),
+            'endpoints': summary,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+        with open(args.history, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        print_summary(summary, previous)
+        log(f"appended to {args.history}")
+
+        found = regressions(summary, previous, args.p95_tolerance)
+        for line in found:
+            log(f"regression: {line}")
+        if found and args.fail_on_regression:
+            sys.exit(1)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,286 @@
+"""Benchmark the staging pipeline end to end on synthetic revision bundles.
+
+Generates .mwrev.zst bundles with benchmarks/synth_mwrev.py (or uses existing
+ones with --bundles), then runs and times each stage as the README describes
+it:
+
+    build   build_all.py     bundles -> staged Parquet
+    dedup   dedup_parquet.py staged Parquet -> deduped/
+    load    load_all.py      deduped/ -> Postgres
+
+For every stage it records wall time, revisions/sec, input bytes/sec and the
+peak resident memory of the stage's process tree (sampled with psutil, so
+build_all's concurrent workers count together), and appends the run as one
+JSON line to --history. Each run is compared with the last run in the history
+that used the same options.
+
+The load stage drops and recreates every table of the database named by
+--database (purge.py, init_db.py) before loading, so it only runs when one is
+given; the other DB_* settings come from .env as usual. Point it at a
+throwaway database, e.g. a local Postgres started for the benchmark.
+
+Without the build stage, the staging directory of an earlier run kept in
+--workdir is reused, and revisions are counted from its staged revisions.
+
+Usage:
+    python3 benchmarks/pipeline.py
+    python3 benchmarks/pipeline.py --pages 5000 --files 8 -j 8 --database wrdb_bench
+    python3 benchmarks/pipeline.py --bundles ./bundles --workdir /tmp/bench --database wrdb_bench
+    python3 benchmarks/pipeline.py --workdir /tmp/bench --stages dedup load --sort --database wrdb_bench
+"""
+
+import argparse
+import glob
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import psutil
+import pyarrow.parquet as pq
+import zstandard as zstd
+from dotenv import load_dotenv
+
+from benchmarks.synth_mwrev import add_generator_arguments, generator_options, write_bundles
+
+
+STAGES = ['build', 'dedup', 'load']
+DEFAULT_HISTORY = os.path.join(ROOT, 'benchmarks', 'results', 'pipeline.jsonl')
+
+
+def log(msg):
+    ts = time.strftime('%Y-%m-%d %H:%M:%S')
+    print(f"{ts} [pipeline] {msg}", flush=True)
+
+
+def count_revisions(paths):
+    """Number of revisions in .mwrev.zst bundles: one '#' metadata line each."""
+    count = 0
+    for path in paths:
+        with open(path, 'rb') as fh, zstd.ZstdDecompressor().stream_reader(fh) as reader:
+            count += sum(1 for line in io.TextIOWrapper(reader, encoding='utf-8') if line.startswith('#'))
+    return count
+
+
+def total_size(paths):
+    return sum(os.path.getsize(p) for p in paths)
+
+
+def staged_files(staging_dir):
+    return [p for p in glob.glob(os.path.join(staging_dir, '*', '*.parquet'))
+            if os.path.basename(os.path.dirname(p)) != 'deduped']
+
+
+def deduped_files(staging_dir):
+    return glob.glob(os.path.join(staging_dir, 'deduped', '*.parquet'))
+
+
+def parquet_rows(paths):
+    return sum(pq.ParquetFile(p).metadata.num_rows for p in paths)
+
+
+class PeakRSS:
+    """Samples the summed RSS of a process and its descendants in a thread."""
+
+    def __init__(self, pid, interval=0.05):
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                processes = [self.process] + self.process.children(recursive=True)
+            except psutil.NoSuchProcess:
+                return
+            rss = 0
+            for p in processes:
+                try:
+                    rss += p.memory_info().rss
+                except psutil.Error:
+                    pass
+            self.peak = max(self.peak, rss)
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.peak
+
+
+def run_stage(name, command, env=None):
+    """Run one stage's command from the repository root; return (seconds, peak RSS bytes, output)."""
+    log(f"{name}: {' '.join(command)}")
+    t0 = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, text=True)
+    sampler = PeakRSS(process.pid)
+    output = process.communicate()[0]
+    peak = sampler.stop()
+    seconds = time.perf_counter() - t0
+    if process.returncode != 0:
+        sys.stdout.write(output)
+        raise SystemExit(f"{name} failed with exit code {process.returncode}")
+    return seconds, peak, output
+
+
+def stage_result(seconds, peak_rss, revisions, input_bytes, output_bytes):
+    return {
+        'seconds': round(seconds, 3),
+        'revisions_per_sec': round(revisions / seconds, 1) if seconds else None,
+        'input_bytes': input_bytes,
+        'bytes_per_sec': round(input_bytes / seconds) if seconds else None,
+        'output_bytes': output_bytes,
+        'peak_rss_bytes': peak_rss,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_run(history, options):
+    """The last run in the history file with the same options, or None."""
+    if not os.path.exists(history):
+        return None
+    previous = None
+    with open(history) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('options') == options:
+                previous = record
+    return previous
+
+
+def print_summary(record, previous):
+    print(f"\n{record['revisions']} revisions, commit {record['commit']}")
+    print(f"{'stage':<7} {'seconds':>9} {'rev/s':>10} {'MB/s':>8} {'peak RSS MB':>12}  vs previous")
+    for name, result in record['stages'].items():
+        change = ''
+        before = (previous or {}).get('stages', {}).get(name)
+        if before and before.get('seconds'):
+            change = f"{100 * (result['seconds'] / before['seconds'] - 1):+.1f}% time"
+        print(f"{name:<7} {result['seconds']:>9.2f} {result['revisions_per_sec'] or 0:>10.0f} "
+              f"{(result['bytes_per_sec'] or 0) / 1e6:>8.2f} {result['peak_rss_bytes'] / 1e6:>12.0f}  {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark build_all, dedup_parquet and load_all on synthetic bundles')
+    add_generator_arguments(parser)
+    parser.add_argument('--bundles', help='Use the .mwrev.zst files in this directory instead of generating them')
+    parser.add_argument('--workdir', help='Directory for bundles and staging (default: a temporary directory)')
+    parser.add_argument('--keep', action='store_true',
+                        help='Keep the temporary working directory afterwards (always kept with --workdir)')
+    parser.add_argument('--stages', nargs='+', choices=STAGES,
+                        help='Stages to run, in pipeline order (default: all with --database, else build and dedup)')
+    parser.add_argument('-j', '--jobs', type=int, default=4,
+                        help='Concurrent build_db workers and load_all connections (default: 4)')
+    parser.add_argument('--sort', action='store_true', help='Run dedup_parquet with --sort')
+    parser.add_argument('--database',
+                        help='Database to load into; all its tables are dropped first. Other DB_* settings from .env')
+    parser.add_argument('--history', default=DEFAULT_HISTORY,
+                        help='JSON lines file the run is appended to (default: benchmarks/results/pipeline.jsonl)')
+    parser.add_argument('--label', default='', help='Free-form note stored with the run')
+    args = parser.parse_args()
+
+    stages = [s for s in STAGES if s in (args.stages or (STAGES if args.database else ['build', 'dedup']))]
+    if 'load' in stages and not args.database:
+        parser.error("the load stage drops all tables of the target database; name it with --database")
+
+    load_dotenv()
+    workdir = args.workdir or tempfile.mkdtemp(prefix='pipeline-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    staging_dir = os.path.join(workdir, 'staging')
+    try:
+        if 'build' not in stages:
+            # Reuse the staging directory of an earlier run kept with --workdir
+            if not staged_files(staging_dir):
+                raise SystemExit(f"No staged Parquet files in {staging_dir}; run the build stage first")
+            revisions = parquet_rows([p for p in staged_files(staging_dir) if '-revisions-' in os.path.basename(p)])
+            options = {'staging': os.path.abspath(staging_dir)}
+        elif args.bundles:
+            bundles = sorted(glob.glob(os.path.join(args.bundles, '*.mwrev.zst')))
+            if not bundles:
+                raise SystemExit(f"No .mwrev.zst files in {args.bundles}")
+            bundle_dir = args.bundles
+            revisions = count_revisions(bundles)
+            options = {'bundles': os.path.abspath(args.bundles)}
+        else:
+            bundle_dir = os.path.join(workdir, 'bundles')
+            t0 = time.perf_counter()
+            summary = write_bundles(bundle_dir, **generator_options(args))
+            bundles, revisions = summary['files'], summary['revisions']
+            log(f"generated {summary['pages']} pages, {revisions} revisions "
+                f"({summary['compressed_bytes'] / 1e6:.1f} MB) in {time.perf_counter() - t0:.1f}s")
+            options = generator_options(args)
+        options.update({'jobs': args.jobs, 'sort': args.sort})
+
+        results = {}
+        if 'build' in stages:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            seconds, peak, output = run_stage('build', [sys.executable, 'build_all.py', '-d', bundle_dir,
+                                                '-o', staging_dir, '-j', str(args.jobs)])
+            staged = staged_files(staging_dir)
+            if not staged:
+                # build_all marks a shard done even when its worker fails
+                sys.stdout.write(output)
+                raise SystemExit("build: no Parquet files were staged")
+            results['build'] = stage_result(seconds, peak, revisions, total_size(bundles), total_size(staged))
+        if 'dedup' in stages:
+            shutil.rmtree(os.path.join(staging_dir, 'deduped'), ignore_errors=True)
+            command = [sys.executable, 'dedup_parquet.py', '-d', staging_dir] + (['--sort'] if args.sort else [])
+            seconds, peak, _ = run_stage('dedup', command)
+            results['dedup'] = stage_result(seconds, peak, revisions, total_size(staged_files(staging_dir)),
+                                            total_size(deduped_files(staging_dir)))
+        if 'load' in stages:
+            env = dict(os.environ, DB_NAME=args.database)
+            run_stage('purge', [sys.executable, 'purge.py'], env=env)
+            run_stage('init_db', [sys.executable, 'init_db.py'], env=env)
+            seconds, peak, _ = run_stage('load', [sys.executable, 'load_all.py', '-d', staging_dir,
+                                               '-j', str(args.jobs), '--restart'], env=env)
+            results['load'] = stage_result(seconds, peak, revisions, total_size(deduped_files(staging_dir)), None)
+
+        record = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'commit': git_commit(),
+            'label': args.label,
+            'host': {'cpus': os.cpu_count(), 'python': platform.python_version(), 'platform': platform.platform()},
+            'options': options,
+            'revisions': revisions,
+            'deduped_rows': parquet_rows(deduped_files(staging_dir)) if 'dedup' in stages else None,
+            'stages': results,
+        }
+        previous = previous_run(args.history, options)
+        os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+        with open(args.history, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        print_summary(record, previous)
+        log(f"appended to {args.history}")
+    finally:
+        if args.keep or args.workdir:
+            log(f"working directory kept: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
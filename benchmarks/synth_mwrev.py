@@ -0,0 +1,253 @@
+"""Generate synthetic .mwrev.zst revision bundles for benchmarks and fixtures.
+
+Each bundle holds the full revision history of a set of pages in the format
+build_db.get_revisions_from_mwrev_zst reads: a '#' line of metadata
+(page_id= ns= rev_id= parent_rev_id= timestamp=) per revision, followed by the
+revision's wikitext with every line prefixed by a space.
+
+Pages carry <ref> citations, most of them citation templates chosen by
+--template-mix; the others are bare external links. Between two revisions of a
+page each citation is edited, removed or left alone with --churn as the
+probability of a change, and about as many citations are added as removed,
+so histories resemble real edit churn: most citations persist across many
+revisions, some come and go. A share of citations (--shared-refs) is drawn
+from a pool common to all pages, so normalized citations and URLs appear on
+several pages as they do on a wiki. The output is a function of the options
+and --seed alone.
+
+Usage:
+    python3 benchmarks/synth_mwrev.py -o ./bundles
+    python3 benchmarks/synth_mwrev.py -o ./bundles --pages 5000 --revisions 40 --refs 25 --files 8
+    python3 benchmarks/synth_mwrev.py -o ./bundles --template-mix "cite web=6,cite news=3,none=1" --churn 0.1
+"""
+
+import argparse
+import os
+import random
+from datetime import datetime, timedelta, timezone
+
+import zstandard as zstd
+
+
+DEFAULT_TEMPLATE_MIX = 'cite web=5,cite news=3,cite book=1,cite journal=1,none=1'
+
+WORDS = (
+    "river city history council report survey election museum railway bridge "
+    "census festival school harbour archive season league album bishop castle "
+    "station mayor parish village county dam tower treaty expedition"
+).split()
+PUBLISHERS = [f"The {k} {w}" for w in ("Times", "Herald", "Gazette", "Press", "Review") for k in
+              ("Daily", "Weekly", "Evening", "Morning")]
+
+START = datetime(2010, 1, 1, tzinfo=timezone.utc)
+
+
+def parse_template_mix(spec):
+    """'cite web=5,none=1' -> [('cite web', 5.0), ('none', 1.0)]. `none` is a bare link."""
+    mix = []
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip().lower()
+        if not name:
+            continue
+        try:
+            weight = float(weight) if weight.strip() else 1.0
+        except ValueError:
+            raise ValueError(f"bad weight in template mix: {part!r}")
+        if weight < 0:
+            raise ValueError(f"negative weight in template mix: {part!r}")
+        mix.append((name, weight))
+    if not mix or sum(w for _, w in mix) <= 0:
+        raise ValueError(f"empty template mix: {spec!r}")
+    return mix
+
+
+class Generator:
+    """Deterministic source of pages, citations and revision histories."""
+
+    def __init__(self, seed=0, template_mix=DEFAULT_TEMPLATE_MIX, revisions=20, refs=15, churn=0.05,
+                 shared_refs=0.2, domains=200):
+        self.rng = random.Random(seed)
+        mix = parse_template_mix(template_mix)
+        self.templates = [name for name, _ in mix]
+        self.template_weights = [weight for _, weight in mix]
+        self.revisions = revisions
+        self.refs = refs
+        self.churn = churn
+        self.shared_refs = shared_refs
+        self.domains = [f"{self.rng.choice(WORDS)}{k}.example.org" for k in range(domains)]
+        self.shared = [self.new_citation() for _ in range(max(1, refs * 10))]
+        self.serial = 0
+
+    def words(self, n, rng=None):
+        rng = rng or self.rng
+        return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+    def date(self):
+        return (START + timedelta(days=self.rng.randrange(5000))).strftime('%Y-%m-%d')
+
+    def new_citation(self):
+        """A citation as (template, params); params keep their order in the wikitext."""
+        template = self.rng.choices(self.templates, self.template_weights)[0]
+        url = f"https://{self.rng.choice(self.domains)}/{self.rng.choice(WORDS)}/{self.rng.randrange(10**9)}"
+        title = self.words(self.rng.randint(2, 7)).capitalize()
+        if template == 'none':
+            return template, [('url', url), ('title', title)]
+        if template == 'cite book':
+            params = [('last', self.rng.choice(WORDS).title()), ('first', self.rng.choice(WORDS).title()),
+                      ('title', title), ('publisher', self.rng.choice(PUBLISHERS)),
+                      ('year', str(self.rng.randint(1900, 2024))),
+                      ('isbn', f"978-{self.rng.randrange(10**9):09d}-{self.rng.randrange(10)}")]
+        elif template == 'cite journal':
+            params = [('last', self.rng.choice(WORDS).title()), ('title', title),
+                      ('journal', f"Journal of {self.rng.choice(WORDS).title()}"),
+                      ('volume', str(self.rng.randint(1, 90))),
+                      ('doi', f"10.{self.rng.randint(1000, 9999)}/{self.rng.randrange(10**7)}")]
+        elif template == 'cite news':
+            params = [('url', url), ('title', title), ('work', self.rng.choice(PUBLISHERS)),
+                      ('date', self.date())]
+        else:
+            params = [('url', url), ('title', title), ('website', url.split('/')[2]),
+                      ('access-date', self.date())]
+        return template, params
+
+    def edit_citation(self, citation):
+        """The citation with one parameter changed, as an editor fixing a title or date would."""
+        template, params = citation
+        params = list(params)
+        i = self.rng.randrange(len(params))
+        key, value = params[i]
+        params[i] = (key, self.date() if 'date' in key else f"{value} {self.rng.choice(WORDS)}")
+        return template, params
+
+    def citation_for_page(self):
+        if self.rng.random() < self.shared_refs:
+            return self.rng.choice(self.shared)
+        return self.new_citation()
+
+    def ref_markup(self, citation, name):
+        template, params = citation
+        if template == 'none':
+            body = f"[{params[0][1]} {params[1][1]}]"
+        else:
+            body = '{{' + template + ' ' + ' '.join(f"|{k}={v}" for k, v in params) + '}}'
+        return f'<ref name="{name}">{body}</ref>'
+
+    def page_text(self, title, refs):
+        """Wikitext of a page: a lead and sections, with one sentence per citation.
+
+        `refs` is a list of (name, citation); every fifth citation is cited a
+        second time by name, as <ref name=... />. The prose around a citation
+        is seeded by its name, so it does not change from one revision to the next.
+        """
+        lines = [f"'''{title}''' is a {self.words(3, random.Random(title))}."]
+        for i, (name, citation) in enumerate(refs):
+            prose = random.Random(name)
+            if i % 8 == 0:
+                lines += ['', f"== {self.words(2, prose).title()} =="]
+            sentence = f"The {self.words(7, prose)}.{self.ref_markup(citation, name)}"
+            if i % 5 == 4:
+                sentence += f" It {self.words(3, prose)}.<ref name=\"{name}\" />"
+            lines.append(sentence)
+        lines += ['', '== References ==', '{{reflist}}']
+        return lines
+
+    def page_history(self, page_id):
+        """Yield (revision index, wikitext lines) for each revision of a page."""
+        title = self.words(2).title()
+        refs = []
+        for _ in range(max(0, int(self.rng.gauss(self.refs, self.refs / 4)))):
+            self.serial += 1
+            refs.append((f"r{self.serial}", self.citation_for_page()))
+        for index in range(max(1, int(self.rng.gauss(self.revisions, self.revisions / 4)))):
+            if index:
+                kept = []
+                for name, citation in refs:
+                    r = self.rng.random()
+                    if r < self.churn / 2:
+                        continue  # removed
+                    if r < self.churn:
+                        citation = self.edit_citation(citation)
+                    kept.append((name, citation))
+                for _ in range(len(refs) - len(kept) + (self.rng.random() < self.churn)):
+                    self.serial += 1
+                    kept.insert(self.rng.randint(0, len(kept)), (f"r{self.serial}", self.citation_for_page()))
+                refs = kept
+            yield index, self.page_text(title, refs)
+
+
+def write_bundles(output_dir, pages=1000, files=1, page_id_start=1, revision_id_start=1_000_000,
+                  compression_level=3, **options):
+    """Write `pages` page histories into `files` bundles in `output_dir`.
+
+    Returns a summary: pages, revisions, uncompressed and compressed bytes, and
+    the paths written. Keyword `options` go to Generator.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    generator = Generator(**options)
+    cctx = zstd.ZstdCompressor(level=compression_level)
+    paths = [os.path.join(output_dir, f"synthetic-{i:02d}.mwrev.zst") for i in range(files)]
+    revisions = raw_bytes = 0
+    rev_id = revision_id_start
+    per_file = -(-pages // files)
+    for i, path in enumerate(paths):
+        with open(path, 'wb') as fh, cctx.stream_writer(fh) as out:
+            for page_id in range(page_id_start + i * per_file, min(page_id_start + pages, page_id_start + (i + 1) * per_file)):
+                parent = None
+                timestamp = START + timedelta(seconds=generator.rng.randrange(10**7))
+                for _, lines in generator.page_history(page_id):
+                    rev_id += 1
+                    timestamp += timedelta(seconds=generator.rng.randrange(60, 10**6))
+                    meta = (f"# page_id={page_id} ns=0 rev_id={rev_id} parent_rev_id={parent or ''} "
+                            f"timestamp={timestamp.strftime('%Y-%m-%dT%H:%M:%SZ')}\n")
+                    chunk = (meta + ''.join(f" {line}\n" for line in lines)).encode('utf-8')
+                    out.write(chunk)
+                    raw_bytes += len(chunk)
+                    revisions += 1
+                    parent = rev_id
+    return {
+        'pages': pages,
+        'revisions': revisions,
+        'bytes': raw_bytes,
+        'compressed_bytes': sum(os.path.getsize(p) for p in paths),
+        'files': paths,
+    }
+
+
+def add_generator_arguments(parser):
+    """The generator's options, shared with benchmarks/pipeline.py."""
+    parser.add_argument('--pages', type=int, default=1000, help='Number of pages (default: 1000)')
+    parser.add_argument('--revisions', type=int, default=20, help='Mean revisions per page (default: 20)')
+    parser.add_argument('--refs', type=int, default=15, help='Mean citations per page (default: 15)')
+    parser.add_argument('--template-mix', default=DEFAULT_TEMPLATE_MIX,
+                        help='Weighted citation templates; "none" is a bare link '
+                             f'(default: "{DEFAULT_TEMPLATE_MIX}")')
+    parser.add_argument('--churn', type=float, default=0.05,
+                        help='Probability that a citation changes between two revisions (default: 0.05)')
+    parser.add_argument('--shared-refs', type=float, default=0.2,
+                        help='Share of citations drawn from a pool common to all pages (default: 0.2)')
+    parser.add_argument('--files', type=int, default=1, help='Number of bundles to split the pages over (default: 1)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+
+
+def generator_options(args):
+    return {
+        'pages': args.pages, 'files': args.files, 'seed': args.seed, 'template_mix': args.template_mix,
+        'revisions': args.revisions, 'refs': args.refs, 'churn': args.churn, 'shared_refs': args.shared_refs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic .mwrev.zst revision bundles')
+    parser.add_argument('-o', '--output-dir', required=True, help='Directory to write the bundles to')
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+
+    summary = write_bundles(args.output_dir, **generator_options(args))
+    print(f"{summary['pages']} pages, {summary['revisions']} revisions, "
+          f"{summary['bytes'] / 1e6:.1f} MB ({summary['compressed_bytes'] / 1e6:.1f} MB compressed) "
+          f"in {len(summary['files'])} file(s) under {args.output_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Benchmark web_resources lookups by url against lookups through url_hash.
+
+The API and explorer resolve an article URL to a web_resources row on every
+request. web_resources.url is not indexed; url_hash has a unique index. This
+script samples URLs from the database and times both lookups, in the shape
+used by get_article, get_web_resource and explorer.article_view.
+
+Usage:
+    python3 benchmarks/url_lookup.py
+    python3 benchmarks/url_lookup.py --samples 500 --statement-timeout 60
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session
+
+from models import WebResource
+from web_engine import database_url
+
+
+def sample_urls(session, samples):
+    """Pick roughly `samples` URLs spread over the table without scanning all of it."""
+    reltuples = session.execute(
+        text("SELECT reltuples FROM pg_class WHERE oid = 'web_resources'::regclass")
+    ).scalar() or 0
+    if reltuples <= samples * 10:
+        stmt = text("SELECT url FROM web_resources ORDER BY random() LIMIT :n")
+    else:
+        percent = min(100.0, 100.0 * samples * 2 / reltuples)
+        stmt = text(f"SELECT url FROM web_resources TABLESAMPLE BERNOULLI ({percent}) LIMIT :n")
+    return session.execute(stmt, {'n': samples}).scalars().all()
+
+
+def time_lookups(session, urls, make_filter):
+    timings = []
+    for url in urls:
+        t0 = time.perf_counter()
+        session.execute(select(WebResource.id).where(make_filter(url))).first()
+        timings.append((time.perf_counter() - t0) * 1000)
+    return timings
+
+
+def explain(session, url, make_filter):
+    stmt = select(WebResource.id).where(make_filter(url))
+    compiled = stmt.compile(session.bind, compile_kwargs={'literal_binds': True})
+    return [row[0] for row in session.execute(text(f"EXPLAIN {compiled}"))]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+VARIANTS = [
+    ('url', lambda url: WebResource.url == url),
+    ('url_hash', WebResource.url_matches),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark web_resources lookups by url vs url_hash')
+    parser.add_argument('--samples', type=int, default=200, help='Number of URLs to look up (default: 200)')
+    parser.add_argument('--statement-timeout', type=int, default=30,
+                        help='Per-query timeout in seconds, so unindexed lookups cannot run forever (default: 30)')
+    args = parser.parse_args()
+
+    load_dotenv()
+    engine = create_engine(database_url(), hide_parameters=True)
+
+    with Session(engine) as session:
+        session.execute(text(f"SET statement_timeout = '{args.statement_timeout}s'"))
+        urls = sample_urls(session, args.samples)
+        if not urls:
+            raise SystemExit("web_resources is empty; load data first.")
+        print(f"{len(urls)} sampled URLs")
+
+        for name, make_filter in VARIANTS:
+            print(f"\n{name}: plan")
+            for line in explain(session, urls[0], make_filter):
+                print(f"  {line}")
+            # Warm up once so both variants see the same cache state
+            time_lookups(session, urls[:1], make_filter)
+            timings = time_lookups(session, urls, make_filter)
+            print(f"{name}: mean {statistics.mean(timings):.2f} ms, "
+                  f"p50 {percentile(timings, 50):.2f} ms, "
+                  f"p95 {percentile(timings, 95):.2f} ms, "
+                  f"p99 {percentile(timings, 99):.2f} ms, "
+                  f"max {max(timings):.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""Caches for lookups the web application repeats on every request.
+
+Every explorer article view and /api/v1/article call resolves a URL to its page
+and document, and the citations partial looks up the page's latest revision.
+Those results only change when load_all.py loads new data, so they are cached
+here:
+
+- in process, in a size-bounded LRU with a TTL (RESOLVER_CACHE_MAX_ENTRIES,
+  RESOLVER_CACHE_TTL_SECONDS), and
+- optionally in a local SQLite file (RESOLVER_CACHE_SQLITE_PATH) shared by all
+  worker processes on the host, e.g. gunicorn workers.
+
+The explorer's citations partial is cached the same way, as rendered HTML per
+(page_id, revision_id), in tiers of its own (PARTIALS_CACHE_MAX_ENTRIES,
+PARTIALS_CACHE_SQLITE_PATH) since its entries are much larger.
+
+Entries are tagged with the data generation (models.DataGeneration) they were
+read at. load_all.py bumps the generation when a load finishes; the cache
+rechecks it at most every RESOLVER_CACHE_GENERATION_CHECK_SECONDS and drops
+entries from older generations.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.orm import Session
+
+from models import DataGeneration, WebResource
+from web_engine import execute_prepared
+
+
+MAX_ENTRIES = int(os.getenv('RESOLVER_CACHE_MAX_ENTRIES', '100000'))
+TTL_SECONDS = float(os.getenv('RESOLVER_CACHE_TTL_SECONDS', '3600'))
+SQLITE_PATH = os.getenv('RESOLVER_CACHE_SQLITE_PATH', '')
+GENERATION_CHECK_SECONDS = float(os.getenv('RESOLVER_CACHE_GENERATION_CHECK_SECONDS', '5'))
+PARTIALS_MAX_ENTRIES = int(os.getenv('PARTIALS_CACHE_MAX_ENTRIES', '2000'))
+PARTIALS_SQLITE_PATH = os.getenv('PARTIALS_CACHE_SQLITE_PATH', '')
+
+MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire `ttl` seconds after being stored."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """Cache tier in a SQLite file shared by the processes on one host.
+
+    Values are stored as JSON together with the data generation they belong to;
+    entries from another generation, or past their TTL, are treated as misses.
+    """
+
+    def __init__(self, path, ttl, table='cache'):
+        self.path = path
+        self.ttl = ttl
+        self.table = table
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, generation INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL, value TEXT NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, generation):
+        try:
+            row = self._conn().execute(
+                f"SELECT value FROM {self.table} WHERE key = ? AND generation = ? AND expires_at > ?",
+                (key, generation, time.time()),
+            ).fetchone()
+        except sqlite3.Error:
+            return MISSING
+        return MISSING if row is None else json.loads(row[0])
+
+    def set(self, key, generation, value):
+        try:
+            self._conn().execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, generation, expires_at, value) VALUES (?, ?, ?, ?)",
+                (key, generation, time.time() + self.ttl, json.dumps(value)),
+            )
+        except sqlite3.Error:
+            pass
+
+    def purge(self, generation):
+        """Delete entries from other generations and expired entries."""
+        try:
+            self._conn().execute(
+                f"DELETE FROM {self.table} WHERE generation != ? OR expires_at <= ?",
+                (generation, time.time()),
+            )
+        except sqlite3.Error:
+            pass
+
+
+class GenerationTracker:
+    """Reads DataGeneration at most every `interval` seconds and reports changes."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.generation = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self, engine):
+        """Return (generation, changed) where changed is True if it differs from the last read."""
+        with self._lock:
+            if self.generation is not None and time.monotonic() - self._checked_at < self.interval:
+                return self.generation, False
+            self._checked_at = time.monotonic()
+        try:
+            with Session(engine) as session:
+                generation = DataGeneration.current(session)
+        except ProgrammingError:
+            # data_generation does not exist on databases created before it was added
+            generation = 0
+        except Exception:
+            # A pool timeout or dropped connection says nothing about the data:
+            # keep serving the last known generation rather than flushing the
+            # caches, and let the error through when there is none yet.
+            if self.generation is None:
+                raise
+            return self.generation, False
+        with self._lock:
+            changed = self.generation is not None and generation != self.generation
+            self.generation = generation
+        return generation, changed
+
+
+generations = GenerationTracker(GENERATION_CHECK_SECONDS)
+_memory = TTLCache(MAX_ENTRIES, TTL_SECONDS)
+_shared = SQLiteCache(SQLITE_PATH, TTL_SECONDS, table='resolver_cache') if SQLITE_PATH else None
+_partials_memory = TTLCache(PARTIALS_MAX_ENTRIES, TTL_SECONDS)
+_partials_shared = (SQLiteCache(PARTIALS_SQLITE_PATH, TTL_SECONDS, table='partials_cache')
+                    if PARTIALS_SQLITE_PATH else None)
+
+
+def cached(engine, namespace, key, load, memory=None, shared=MISSING):
+    """Return `load()` through the memory and SQLite tiers. `load` must return a
+    JSON-serializable value; None is cached too.
+
+    `memory` and `shared` select the tiers; they default to the lookup tiers.
+    """
+    memory = _memory if memory is None else memory
+    shared = _shared if shared is MISSING else shared
+    generation, changed = generations.current(engine)
+    if changed:
+        for tier in (_memory, _partials_memory):
+            tier.clear()
+        for tier in (_shared, _partials_shared):
+            if tier is not None:
+                tier.purge(generation)
+    cache_key = f"{namespace}:{key}"
+    value = memory.get((generation, cache_key))
+    if value is not MISSING:
+        return value
+    if shared is not None:
+        value = shared.get(cache_key, generation)
+    if value is MISSING:
+        value = load()
+        if shared is not None:
+            shared.set(cache_key, generation, value)
+    memory.set((generation, cache_key), value)
+    return value
+
+
+def cached_partial(engine, namespace, key, load):
+    """Like cached(), for rendered HTML fragments, in the PARTIALS_CACHE_* tiers."""
+    return cached(engine, namespace, key, load, memory=_partials_memory, shared=_partials_shared)
+
+
+# ---------------------------------------------------------------------------
+# Cached lookups
+# ---------------------------------------------------------------------------
+
+def resolve_url(session, url):
+    """Return (page_id, document_id) for a web resource URL, or None if it is unknown."""
+    def load():
+        row = execute_prepared(session, 'resolve_url', WebResource.compute_url_hash(url), url).first()
+        return None if row is None else [row.numeric_page_id, row.instance_of_document]
+    value = cached(session.get_bind(), 'url', url, load)
+    return None if value is None else tuple(value)
+
+
+def latest_revision_id(session, page_id):
+    """Return the highest revision id of a wiki page, or None."""
+    return cached(session.get_bind(), 'latest_revision', page_id,
+                  lambda: execute_prepared(session, 'latest_revision', page_id).scalar())
@@ -10,6 +10,12 @@ Usage:
     python3 dedup_parquet.py -d ./staging
     python3 dedup_parquet.py -d ./staging --memory-limit 8GB
     python3 dedup_parquet.py -d ./staging --tables citation_instances citation_histories
+    python3 dedup_parquet.py -d ./staging --sort
+
+With --sort, tables in SORT_KEYS are written sorted by the key readers filter
+them by, so the min/max statistics of each row group let readers (DuckDB,
+pyarrow filters, load_all) skip the row groups that cannot match, and
+Postgres receives the rows of a page together.
 """
 
 import argparse
@@ -20,6 +26,15 @@ import time
 import duckdb
 
 
+# table -> columns its deduped file is sorted by with --sort
+SORT_KEYS = {
+    'citation_instances': ['page_id', 'raw_sha1'],
+    'citation_histories': ['page_id', 'revision_id'],
+    'revisions': ['page_id', 'revision_id'],
+    'template_data': ['template_name', 'parameter_key'],
+}
+
+
 def log(msg):
     ts = time.strftime('%Y-%m-%d %H:%M:%S')
     print(f"{ts} [dedup_parquet] {msg}", flush=True)
@@ -35,17 +50,40 @@ def _out(deduped_dir, table_name):
     return os.path.join(deduped_dir, f'{table_name}.parquet')
 
 
+def _sorted_by(table_name, sort):
+    return SORT_KEYS.get(table_name, []) if sort else []
+
+
+def _order_by(table_name, sort):
+    """ORDER BY clause for a table's deduped output, empty unless sorting."""
+    keys = _sorted_by(table_name, sort)
+    return f"ORDER BY {', '.join(keys)}" if keys else ""
+
+
 def _done_marker(deduped_dir, table_name):
     return os.path.join(deduped_dir, f'.done-{table_name}')
 
 
-def _is_done(deduped_dir, table_name):
-    return os.path.exists(_done_marker(deduped_dir, table_name))
+def _is_done(deduped_dir, table_name, sort=False):
+    """True if the table has been deduped, and sorted if `sort` asks for it.
 
+    The done marker lists the sort key, if any, on its second line.
+    """
+    try:
+        with open(_done_marker(deduped_dir, table_name)) as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return False
+    keys = _sorted_by(table_name, sort)
+    return not keys or lines[1:2] == [','.join(keys)]
 
-def _mark_done(deduped_dir, table_name):
+
+def _mark_done(deduped_dir, table_name, sort=False):
     with open(_done_marker(deduped_dir, table_name), 'w') as f:
         f.write(time.strftime('%Y-%m-%d %H:%M:%S'))
+        keys = _sorted_by(table_name, sort)
+        if keys:
+            f.write('\n' + ','.join(keys))
 
 
 def _has_files(con, glob_pattern):
@@ -57,7 +95,7 @@ def _has_files(con, glob_pattern):
         return False
 
 
-def dedup_containers(con, staging_dir, deduped_dir):
+def dedup_containers(con, staging_dir, deduped_dir, sort=False):
     glob = _glob(staging_dir, 'containers')
     if not _has_files(con, glob):
         return
@@ -71,7 +109,7 @@ def dedup_containers(con, staging_dir, deduped_dir):
     """)
 
 
-def dedup_domains(con, staging_dir, deduped_dir):
+def dedup_domains(con, staging_dir, deduped_dir, sort=False):
     glob = _glob(staging_dir, 'domains')
     if not _has_files(con, glob):
         return
@@ -86,7 +124,7 @@ def dedup_domains(con, staging_dir, deduped_dir):
     """)
 
 
-def dedup_documents(con, staging_dir, deduped_dir):
+def dedup_documents(con, staging_dir, deduped_dir, sort=False):
     glob = _glob(staging_dir, 'documents')
     if not _has_files(con, glob):
         return
@@ -101,7 +139,7 @@ def dedup_documents(con, staging_dir, deduped_dir):
     """)
 
 
-def dedup_web_resources(con, staging_dir, deduped_dir):
+def dedup_web_resources(con, staging_dir, deduped_dir, sort=False):
     glob = _glob(staging_dir, 'web_resources')
     if not _has_files(con, glob):
         return
@@ -116,22 +154,24 @@ def dedup_web_resources(con, staging_dir, deduped_dir):
     """)
 
 
-def dedup_citation_instances(con, staging_dir, deduped_dir):
+def dedup_citation_instances(con, staging_dir, deduped_dir, sort=False):
     glob = _glob(staging_dir, 'citation_instances')
     if not _has_files(con, glob):
         return
     con.execute(f"""
         COPY (
-            SELECT DISTINCT ON (page_id, raw_sha1)
-                page_id, raw_sha1, normalized_sha1, reference_type, reference_name
-            FROM '{glob}'
-            WHERE page_id IS NOT NULL AND raw_sha1 IS NOT NULL
+            SELECT * FROM (
+                SELECT DISTINCT ON (page_id, raw_sha1)
+                    page_id, raw_sha1, normalized_sha1, reference_type, reference_name
+                FROM '{glob}'
+                WHERE page_id IS NOT NULL AND raw_sha1 IS NOT NULL
+            ) {_order_by('citation_instances', sort)}
         ) TO '{_out(deduped_dir, "citation_instances")}'
         (FORMAT PARQUET, COMPRESSION ZSTD, ROW_GROUP_SIZE 500000)
     """)
 
 
-def dedup_normalized_citations(con, staging_dir, deduped_dir):
+def dedup_normalized_citations(con, staging_dir, deduped_dir, sort=False):
     glob = _glob(staging_dir, 'normalized_citations')
     if not _has_files(con, glob):
         return
@@ -146,36 +186,40 @@ def dedup_normalized_citations(con, staging_dir, deduped_dir):
     """)
 
 
-def dedup_citation_histories(con, staging_dir, deduped_dir):
+def dedup_citation_histories(con, staging_dir, deduped_dir, sort=False):
     glob = _glob(staging_dir, 'citation_histories')
     if not _has_files(con, glob):
         return
     con.execute(f"""
         COPY (
-            SELECT DISTINCT page_id, raw_sha1, revision_id
-            FROM '{glob}'
-            WHERE page_id IS NOT NULL AND raw_sha1 IS NOT NULL AND revision_id IS NOT NULL
+            SELECT * FROM (
+                SELECT DISTINCT page_id, raw_sha1, revision_id
+                FROM '{glob}'
+                WHERE page_id IS NOT NULL AND raw_sha1 IS NOT NULL AND revision_id IS NOT NULL
+            ) {_order_by('citation_histories', sort)}
         ) TO '{_out(deduped_dir, "citation_histories")}'
         (FORMAT PARQUET, COMPRESSION ZSTD, ROW_GROUP_SIZE 1000000)
     """)
 
 
-def dedup_revisions(con, staging_dir, deduped_dir):
+def dedup_revisions(con, staging_dir, deduped_dir, sort=False):
     glob = _glob(staging_dir, 'revisions')
     if not _has_files(con, glob):
         return
     con.execute(f"""
         COPY (
-            SELECT DISTINCT ON (revision_id)
-                revision_id, page_id, parent_revision_id, revision_timestamp
-            FROM '{glob}'
-            WHERE revision_id IS NOT NULL
+            SELECT * FROM (
+                SELECT DISTINCT ON (revision_id)
+                    revision_id, page_id, parent_revision_id, revision_timestamp
+                FROM '{glob}'
+                WHERE revision_id IS NOT NULL
+            ) {_order_by('revisions', sort)}
         ) TO '{_out(deduped_dir, "revisions")}'
         (FORMAT PARQUET, COMPRESSION ZSTD, ROW_GROUP_SIZE 500000)
     """)
 
 
-def dedup_ncwr(con, staging_dir, deduped_dir):
+def dedup_ncwr(con, staging_dir, deduped_dir, sort=False):
     glob = _glob(staging_dir, 'ncwr')
     if not _has_files(con, glob):
         return
@@ -189,7 +233,7 @@ def dedup_ncwr(con, staging_dir, deduped_dir):
     """)
 
 
-def dedup_wiki_templates(con, staging_dir, deduped_dir):
+def dedup_wiki_templates(con, staging_dir, deduped_dir, sort=False):
     glob = _glob(staging_dir, 'wiki_templates')
     if not _has_files(con, glob):
         return
@@ -203,17 +247,19 @@ def dedup_wiki_templates(con, staging_dir, deduped_dir):
     """)
 
 
-def dedup_template_data(con, staging_dir, deduped_dir):
+def dedup_template_data(con, staging_dir, deduped_dir, sort=False):
     glob = _glob(staging_dir, 'template_data')
     if not _has_files(con, glob):
         return
     con.execute(f"""
         COPY (
-            SELECT DISTINCT ON (domain_label, template_name, normalized_sha1, offset_start, parameter_key)
-                domain_label, template_name, normalized_sha1, offset_start,
-                parameter_key, parameter_value
-            FROM '{glob}'
-            WHERE domain_label IS NOT NULL AND template_name IS NOT NULL
+            SELECT * FROM (
+                SELECT DISTINCT ON (domain_label, template_name, normalized_sha1, offset_start, parameter_key)
+                    domain_label, template_name, normalized_sha1, offset_start,
+                    parameter_key, parameter_value
+                FROM '{glob}'
+                WHERE domain_label IS NOT NULL AND template_name IS NOT NULL
+            ) {_order_by('template_data', sort)}
         ) TO '{_out(deduped_dir, "template_data")}'
         (FORMAT PARQUET, COMPRESSION ZSTD, ROW_GROUP_SIZE 500000)
     """)
@@ -244,6 +290,9 @@ def main():
                         help='DuckDB memory limit (default: 8GB)')
     parser.add_argument('--temp-dir', default=None,
                         help='DuckDB temp/spill directory (default: auto)')
+    parser.add_argument('--sort', action='store_true',
+                        help='Write ' + ', '.join(SORT_KEYS) + ' sorted by their access key, '
+                             'redoing tables deduped unsorted')
     parser.add_argument('--tables', nargs='+', metavar='TABLE',
                         choices=[t for t, _ in ALL_TABLES],
                         help='Dedup only the specified table(s)')
@@ -269,14 +318,14 @@ def main():
 
     t0 = time.time()
     for table_name, dedup_fn in tables_to_run:
-        if _is_done(deduped_dir, table_name):
+        if _is_done(deduped_dir, table_name, args.sort):
             log(f"{table_name}: already done, skipping")
             continue
         log(f"{table_name}: deduplicating...")
         t1 = time.time()
-        dedup_fn(con, staging_dir, deduped_dir)
+        dedup_fn(con, staging_dir, deduped_dir, sort=args.sort)
         elapsed = time.time() - t1
-        _mark_done(deduped_dir, table_name)
+        _mark_done(deduped_dir, table_name, args.sort)
         log(f"{table_name}: done in {elapsed:.1f}s")
 
     total = time.time() - t0
@@ -0,0 +1,361 @@
+"""Read-only DuckDB copy of the deduplicated Parquet dataset, for serving the API
+and explorer without Postgres.
+
+With API_BACKEND=duckdb, app.py opens this store instead of connecting to
+Postgres. The store is a single DuckDB file (DUCKDB_PATH, by default
+api.duckdb next to the Parquet files) with the same tables and columns that
+load_all.py produces, including the derived ones (citation_instance_stats,
+normalized_citation_pages, ...), so api_v1 and explorer run their queries on it
+unchanged. Ids are assigned here in Parquet row order; they are stable for a
+given dataset but are not the ids of a Postgres load of it.
+
+The file is built from the deduped/ directory the first time it is opened, and
+rebuilt when the Parquet files change. Tables are written sorted on the columns
+the web application filters by, so DuckDB's per-row-group min/max statistics
+(zone maps) skip most of the file: citation_instances and citation_history are
+clustered by page, revisions by (page_id, revision_id), template_data by
+(wiki_template_id, parameter_key_md5). Point lookups on other columns (URL
+hashes, citation hashes, revision ids in citation_history) get ART indexes.
+
+Usage:
+    python3 duckdb_store.py -d ./staging            # build if missing or stale
+    python3 duckdb_store.py -d ./staging --rebuild
+"""
+
+import argparse
+import fcntl
+import glob
+import os
+import time
+
+import duckdb
+import pyarrow.parquet as pq
+from sqlalchemy import create_engine
+
+
+STAGING_DIR = os.getenv('STAGING_DIR', './staging')
+DATASET_DIR = os.getenv('DUCKDB_DATASET_DIR', os.path.join(STAGING_DIR, 'deduped'))
+DUCKDB_PATH = os.getenv('DUCKDB_PATH', '')
+MEMORY_LIMIT = os.getenv('DUCKDB_MEMORY_LIMIT', '')
+# Same defaults as load_all.py
+TEMPLATE_VALUE_COUNT_MIN = int(os.getenv('TEMPLATE_VALUE_COUNT_MIN', '100'))
+TEMPLATE_STATS_TOP_K = int(os.getenv('TEMPLATE_STATS_TOP_K', '20'))
+
+# Bumped when the tables below change, so stores built by an older version are rebuilt
+STORE_VERSION = 1
+
+
+def log(msg):
+    ts = time.strftime('%Y-%m-%d %H:%M:%S')
+    print(f"{ts} [duckdb_store] {msg}", flush=True)
+
+
+# Parquet file -> its columns, cast to these types. Missing files read as empty.
+PARQUET_COLUMNS = {
+    'containers': {'label': 'VARCHAR'},
+    'domains': {'value': 'VARCHAR', 'for_container_label': 'VARCHAR'},
+    'documents': {'language_code': 'VARCHAR', 'has_container_label': 'VARCHAR', 'page_id': 'INTEGER'},
+    'web_resources': {'url': 'VARCHAR', 'domain_label': 'VARCHAR', 'numeric_page_id': 'INTEGER',
+                      'numeric_namespace_id': 'INTEGER'},
+    'wiki_templates': {'domain_label': 'VARCHAR', 'name': 'VARCHAR'},
+    'normalized_citations': {'normalized_sha1': 'VARCHAR', 'reference_normalized': 'VARCHAR',
+                             'appears_on_page_id': 'INTEGER', 'appears_on_domain': 'VARCHAR'},
+    'citation_instances': {'page_id': 'INTEGER', 'raw_sha1': 'VARCHAR', 'normalized_sha1': 'VARCHAR',
+                           'reference_type': 'SMALLINT', 'reference_name': 'VARCHAR'},
+    'revisions': {'revision_id': 'BIGINT', 'page_id': 'INTEGER', 'parent_revision_id': 'BIGINT',
+                  'revision_timestamp': 'VARCHAR'},
+    'citation_histories': {'page_id': 'INTEGER', 'raw_sha1': 'VARCHAR', 'revision_id': 'BIGINT'},
+    'ncwr': {'normalized_sha1': 'VARCHAR', 'url': 'VARCHAR'},
+    'template_data': {'domain_label': 'VARCHAR', 'template_name': 'VARCHAR', 'normalized_sha1': 'VARCHAR',
+                      'offset_start': 'INTEGER', 'parameter_key': 'VARCHAR', 'parameter_value': 'VARCHAR'},
+}
+
+
+def parquet_source(dataset_dir, name):
+    """A FROM-clause item over one deduped Parquet file, with its columns cast and
+    a `row` column numbering rows in file order."""
+    columns = PARQUET_COLUMNS[name]
+    path = os.path.join(dataset_dir, f'{name}.parquet')
+    if not os.path.exists(path):
+        typed = ', '.join(f"NULL::{t} AS {c}" for c, t in columns.items())
+        return f"(SELECT {typed}, 0::BIGINT AS row WHERE false)"
+    available = set(pq.ParquetFile(path).schema_arrow.names)
+    cast = ', '.join(
+        f"CAST({c} AS {t}) AS {c}" if c in available else f"NULL::{t} AS {c}"
+        for c, t in columns.items()
+    )
+    return f"(SELECT {cast}, file_row_number AS row FROM read_parquet('{path}', file_row_number = true))"
+
+
+# (table, SELECT) in build order. Each SELECT mirrors the corresponding load_all.py
+# phase; {name} is replaced by parquet_source(name). Where a phase merges duplicate
+# rows with ON CONFLICT DO UPDATE, the last row in the file wins here.
+TABLES = [
+    ('containers', """
+        SELECT CAST(row_number() OVER (ORDER BY min(row)) AS INTEGER) AS id, label,
+               NULL::INTEGER AS wikidata_id, NULL::INTEGER AS librarybase_id
+        FROM {containers} WHERE label IS NOT NULL GROUP BY label
+    """),
+    ('domains', """
+        SELECT CAST(row_number() OVER (ORDER BY d.first_row) AS INTEGER) AS id, d.value,
+               NULL::VARCHAR AS top_level_domain, NULL::INTEGER AS parent_domain,
+               c.id AS for_container, NULL::INTEGER AS internet_domains_id
+        FROM (SELECT value, arg_max(for_container_label, row) AS label, min(row) AS first_row
+              FROM {domains} WHERE value IS NOT NULL GROUP BY value) d
+        LEFT JOIN containers c ON c.label = d.label
+    """),
+    # One document per (domain, page) of the documents file; wiki_pages maps them back
+    ('wiki_pages', """
+        SELECT d.id AS domain_id, p.page_id,
+               CAST(row_number() OVER (ORDER BY p.first_row) AS INTEGER) AS document_id,
+               p.language_code, p.label
+        FROM (SELECT has_container_label AS label, page_id, arg_max(language_code, row) AS language_code,
+                     min(row) AS first_row
+              FROM {documents} GROUP BY has_container_label, page_id) p
+        JOIN domains d ON d.value = p.label
+        ORDER BY page_id
+    """),
+    ('documents', """
+        SELECT w.document_id AS id, w.language_code, c.id AS has_container,
+               NULL::INTEGER AS part_of_larger_work, NULL::VARCHAR AS title,
+               NULL::INTEGER AS wikidata_id, NULL::INTEGER AS librarybase_id
+        FROM wiki_pages w LEFT JOIN containers c ON c.label = w.label
+        ORDER BY id
+    """),
+    ('web_resources', """
+        SELECT CAST(row_number() OVER (ORDER BY r.first_row) AS BIGINT) AS id, r.url, md5(r.url) AS url_hash,
+               w.document_id AS instance_of_document, NULL::INTEGER AS availability_status,
+               NULL::BIGINT AS is_archive_of, d.id AS domain_id, r.numeric_page_id, r.numeric_namespace_id
+        FROM (SELECT url, arg_max(domain_label, row) AS domain_label,
+                     arg_max(numeric_page_id, row) AS numeric_page_id,
+                     arg_max(numeric_namespace_id, row) AS numeric_namespace_id, min(row) AS first_row
+              FROM {web_resources} WHERE url IS NOT NULL GROUP BY url) r
+        LEFT JOIN domains d ON d.value = r.domain_label
+        LEFT JOIN wiki_pages w ON w.domain_id = d.id AND w.page_id = r.numeric_page_id
+        ORDER BY id
+    """),
+    ('wiki_templates', """
+        SELECT CAST(row_number() OVER (ORDER BY min(t.row)) AS INTEGER) AS id, d.id AS domain, t.name,
+               NULL::INTEGER AS wikidata_id, NULL::INTEGER AS librarybase_id
+        FROM {wiki_templates} t JOIN domains d ON d.value = t.domain_label
+        GROUP BY d.id, t.name
+    """),
+    ('normalized_citations', """
+        SELECT CAST(row_number() OVER (ORDER BY n.first_row) AS INTEGER) AS id, n.normalized_sha1,
+               n.reference_normalized, w.document_id AS appears_on_article
+        FROM (SELECT normalized_sha1, arg_max(reference_normalized, row) AS reference_normalized,
+                     arg_max(appears_on_page_id, row) AS page_id, arg_max(appears_on_domain, row) AS domain,
+                     min(row) AS first_row
+              FROM {normalized_citations} GROUP BY normalized_sha1) n
+        JOIN domains d ON d.value = n.domain
+        JOIN wiki_pages w ON w.domain_id = d.id AND w.page_id = n.page_id
+        ORDER BY id
+    """),
+    # Ids follow (page_id, raw_sha1), so a page's citation instances, and their history
+    # below, are stored together
+    ('citation_instances', """
+        SELECT CAST(row_number() OVER (ORDER BY c.page_id, c.raw_sha1) AS BIGINT) AS id,
+               n.id AS normalized_id, c.page_id, c.raw_sha1,
+               CAST(coalesce(c.reference_type, 0) AS SMALLINT) AS reference_type, c.reference_name
+        FROM (SELECT page_id, raw_sha1, arg_max(normalized_sha1, row) AS normalized_sha1,
+                     arg_max(reference_type, row) AS reference_type, arg_max(reference_name, row) AS reference_name
+              FROM {citation_instances} GROUP BY page_id, raw_sha1) c
+        JOIN normalized_citations n ON n.normalized_sha1 = c.normalized_sha1
+        ORDER BY id
+    """),
+    ('revisions', """
+        SELECT revision_id, arg_max(page_id, row) AS page_id,
+               arg_max(parent_revision_id, row) AS parent_revision_id,
+               arg_max(revision_timestamp, row) AS revision_timestamp,
+               NULL::INTEGER AS found_in_bundle, NULL::INTEGER AS offset_begin, NULL::INTEGER AS length
+        FROM {revisions} GROUP BY revision_id
+        ORDER BY page_id, revision_id
+    """),
+    ('citation_history', """
+        SELECT DISTINCT c.id AS citation_instance_id, h.revision_id
+        FROM {citation_histories} h
+        JOIN citation_instances c ON c.page_id = h.page_id AND c.raw_sha1 = h.raw_sha1
+        ORDER BY citation_instance_id, revision_id
+    """),
+    ('normalized_citation_web_resources', """
+        SELECT DISTINCT n.id AS normalized_id, r.id AS web_resource_id
+        FROM {ncwr} x
+        JOIN normalized_citations n ON n.normalized_sha1 = x.normalized_sha1
+        JOIN web_resources r ON r.url = x.url
+        ORDER BY normalized_id, web_resource_id
+    """),
+    ('template_data', """
+        SELECT t.id AS wiki_template_id, n.id AS normalized_id, x.offset_start, x.parameter_key,
+               md5(x.parameter_key) AS parameter_key_md5, arg_max(x.parameter_value, x.row) AS parameter_value
+        FROM {template_data} x
+        JOIN domains d ON d.value = x.domain_label
+        JOIN wiki_templates t ON t.domain = d.id AND t.name = x.template_name
+        JOIN normalized_citations n ON n.normalized_sha1 = x.normalized_sha1
+        GROUP BY t.id, n.id, x.offset_start, x.parameter_key
+        ORDER BY wiki_template_id, parameter_key_md5, normalized_id
+    """),
+    # Derived tables (load_all.py phases 12-16)
+    ('citation_instance_stats', """
+        SELECT h.citation_instance_id,
+               min(r.revision_id) AS first_seen_id, min(r.revision_timestamp) AS first_seen_ts,
+               max(r.revision_id) AS last_seen_id, max(r.revision_timestamp) AS last_seen_ts,
+               count(*) AS appearance_count
+        FROM citation_history h JOIN revisions r ON r.revision_id = h.revision_id
+        GROUP BY h.citation_instance_id
+        ORDER BY h.citation_instance_id
+    """),
+    ('normalized_citation_pages', """
+        SELECT c.normalized_id, c.page_id, min(s.first_seen_id) AS first_seen_rev,
+               max(s.last_seen_id) AS last_seen_rev,
+               coalesce(max(s.last_seen_id) = any_value(latest.revision_id), false) AS currently_present
+        FROM citation_instances c
+        JOIN citation_instance_stats s ON s.citation_instance_id = c.id
+        LEFT JOIN (SELECT page_id, max(revision_id) AS revision_id FROM revisions GROUP BY page_id) latest
+               ON latest.page_id = c.page_id
+        GROUP BY c.normalized_id, c.page_id
+        ORDER BY c.normalized_id, c.page_id
+    """),
+    ('document_primary_url', """
+        SELECT DISTINCT ON (instance_of_document) instance_of_document AS document_id, url
+        FROM web_resources WHERE instance_of_document IS NOT NULL
+        ORDER BY instance_of_document, id
+    """),
+    ('template_value_counts', f"""
+        SELECT wiki_template_id, parameter_key_md5, md5(parameter_value) AS parameter_value_md5,
+               count(DISTINCT normalized_id) AS citation_count
+        FROM template_data WHERE parameter_value IS NOT NULL
+        GROUP BY ALL HAVING count(DISTINCT normalized_id) >= {TEMPLATE_VALUE_COUNT_MIN}
+    """),
+    # Exact counts here rather than load_all.py's sketch, so count_error is always 0
+    ('template_parameter_stats', f"""
+        SELECT wiki_template_id, parameter_key_md5, rank, parameter_key, parameter_value, value_count,
+               0::BIGINT AS count_error, key_count
+        FROM (
+            SELECT wiki_template_id, parameter_key_md5, parameter_key, parameter_value, count(*) AS value_count,
+                   CAST(row_number() OVER (PARTITION BY wiki_template_id, parameter_key_md5
+                                           ORDER BY count(*) DESC, parameter_value) AS INTEGER) AS rank,
+                   sum(count(*)) OVER (PARTITION BY wiki_template_id, parameter_key_md5) AS key_count
+            FROM template_data WHERE parameter_value IS NOT NULL
+            GROUP BY wiki_template_id, parameter_key_md5, parameter_key, parameter_value
+        )
+        WHERE rank <= {TEMPLATE_STATS_TOP_K}
+        ORDER BY wiki_template_id, parameter_key_md5, rank
+    """),
+]
+
+# Columns used only while building
+DROP_COLUMNS = {'wiki_pages': ['language_code', 'label']}
+
+# Point lookups on columns the tables are not sorted by
+INDEXES = [
+    ('web_resources', 'url_hash'),
+    ('normalized_citations', 'normalized_sha1'),
+    ('normalized_citations', 'id'),
+    ('citation_instances', 'normalized_id'),
+    ('citation_history', 'revision_id'),
+    ('revisions', 'revision_id'),
+    ('wiki_pages', 'page_id'),
+]
+
+
+def dataset_fingerprint(dataset_dir):
+    """Identify the Parquet files a store is built from, so a changed dataset is rebuilt."""
+    parts = [f"v{STORE_VERSION}"]
+    for path in sorted(glob.glob(os.path.join(dataset_dir, '*.parquet'))):
+        st = os.stat(path)
+        parts.append(f"{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns}")
+    return ';'.join(parts)
+
+
+def store_path(dataset_dir):
+    return DUCKDB_PATH or os.path.join(dataset_dir, 'api.duckdb')
+
+
+def store_fingerprint(path):
+    """The fingerprint a store was built from, or None if it is missing or unreadable."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with duckdb.connect(path, read_only=True) as con:
+            return con.execute("SELECT fingerprint FROM store_info").fetchone()[0]
+    except duckdb.Error:
+        return None
+
+
+def build(dataset_dir, path):
+    """Build the store at `path` from the Parquet files in `dataset_dir`.
+
+    It is written to a temporary file and renamed into place, so processes that
+    have the previous store open keep reading it.
+    """
+    fingerprint = dataset_fingerprint(dataset_dir)
+    tmp_path = f"{path}.tmp"
+    for p in (tmp_path, f"{tmp_path}.wal"):
+        if os.path.exists(p):
+            os.remove(p)
+    t0 = time.time()
+    log(f"building {path} from {dataset_dir}")
+    with duckdb.connect(tmp_path) as con:
+        if MEMORY_LIMIT:
+            con.execute(f"SET memory_limit = '{MEMORY_LIMIT}'")
+        sources = {name: parquet_source(dataset_dir, name) for name in PARQUET_COLUMNS}
+        for table, select in TABLES:
+            t1 = time.time()
+            con.execute(f"CREATE TABLE {table} AS {select.format(**sources)}")
+            rows = con.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+            log(f"{table}: {rows} rows in {time.time() - t1:.1f}s")
+        for table, columns in DROP_COLUMNS.items():
+            for column in columns:
+                con.execute(f"ALTER TABLE {table} DROP COLUMN {column}")
+        for table, column in INDEXES:
+            con.execute(f"CREATE INDEX idx_{table}_{column} ON {table} ({column})")
+        # The web application's caches and ETags key on the data generation
+        con.execute("CREATE TABLE data_generation AS "
+                    "SELECT 1::SMALLINT AS id, epoch(now())::BIGINT AS generation, now() AS updated_at")
+        con.execute("CREATE TABLE store_info AS SELECT ?::VARCHAR AS fingerprint, now() AS built_at",
+                    [fingerprint])
+        con.execute("CHECKPOINT")
+    os.replace(tmp_path, path)
+    log(f"built {path} in {time.time() - t0:.1f}s")
+
+
+def ensure_store(dataset_dir=None, rebuild=False):
+    """Return the path of an up-to-date store for `dataset_dir`, building it if needed.
+
+    A lock file serializes builds between processes, e.g. gunicorn workers
+    starting together.
+    """
+    dataset_dir = dataset_dir or DATASET_DIR
+    if not os.path.isdir(dataset_dir):
+        raise RuntimeError(f"DuckDB dataset directory does not exist: {dataset_dir}")
+    path = store_path(dataset_dir)
+    with open(f"{path}.lock", 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if rebuild or store_fingerprint(path) != dataset_fingerprint(dataset_dir):
+            build(dataset_dir, path)
+    return path
+
+
+def create_store_engine(dataset_dir=None):
+    """A read-only SQLAlchemy engine on the store, building it first if needed."""
+    path = ensure_store(dataset_dir)
+    connect_args = {'read_only': True}
+    if MEMORY_LIMIT:
+        connect_args['config'] = {'memory_limit': MEMORY_LIMIT}
+    return create_engine(f"duckdb:///{path}", connect_args=connect_args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the read-only DuckDB store served with API_BACKEND=duckdb')
+    parser.add_argument('-d', '--staging-dir', default=STAGING_DIR,
+                        help='Staging directory containing deduped/ (default: STAGING_DIR env or ./staging)')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='Rebuild even if the store is up to date')
+    args = parser.parse_args()
+
+    path = ensure_store(os.path.join(args.staging_dir, 'deduped'), rebuild=args.rebuild)
+    log(f"{path} is up to date")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,36 @@
 import json
 import os
+import queue
 import re
+import threading
 from functools import lru_cache
+from itertools import zip_longest
 from urllib.parse import urlparse, parse_qs
 
 import requests as http_requests
-from flask import Blueprint, request, render_template
-from sqlalchemy import func, and_, select
+from flask import Blueprint, current_app, request, render_template
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from models import (
-    WebResource, Document, CitationInstance, CitationHistory, NormalizedCitation,
-    Revision, NormalizedCitationWebResource, WikiTemplate, TemplateData,
+    WebResource, Document, CitationInstance, CitationHistory, CitationInstanceStats, NormalizedCitation,
+    Revision, NormalizedCitationWebResource, WikiTemplate, TemplateData, DocumentPrimaryUrl,
+    NormalizedCitationPage, WikiPage,
 )
+from cache import resolve_url, latest_revision_id, cached_partial
+from web_engine import execute_prepared
 
 explorer = Blueprint('explorer', __name__, url_prefix='/explorer')
 
 TYPE_LABELS = {0: "other", 1: "inline", 2: "endnote"}
 
+# Revisions on each side of a requested one whose citations partial is rendered ahead of time
+PARTIALS_PREWARM = int(os.getenv('PARTIALS_CACHE_PREWARM', '2'))
+# Prewarm jobs waiting for the worker thread; when it falls behind, new jobs are dropped
+_prewarm_queue = queue.Queue(maxsize=max(1, int(os.getenv('PARTIALS_CACHE_PREWARM_QUEUE', '32'))))
+_prewarm_lock = threading.Lock()
+_prewarm_pending = set()
+_prewarm_worker = None
+
 NAME_ONLY_REF_RE = re.compile(r'^<ref\s+name\s*=\s*(?:"[^"]+"|\'[^\']+\'|[^\s>/]+)\s*/\s*>$', re.IGNORECASE)
 
 
@@ -117,19 +131,15 @@ def article_view():
         url = resolved
 
     with Session(_get_engine()) as session:
-        wr = session.query(WebResource).filter(WebResource.url == url).first()
-        if not wr:
+        resolved = resolve_url(session, url)
+        if resolved is None:
             return render_template("explorer_index.html", error="Article not found in database.")
 
-        page_id = wr.numeric_page_id
+        page_id, _ = resolved
         if page_id is None:
             return render_template("explorer_index.html", error="Article has no page ID.")
 
-        revisions = session.execute(
-            select(Revision.revision_id, Revision.revision_timestamp, Revision.parent_revision_id)
-            .where(Revision.page_id == page_id)
-            .order_by(Revision.revision_timestamp)
-        ).all()
+        revisions = execute_prepared(session, 'page_revisions', page_id).all()
 
         revisions_list = [
             {
@@ -153,244 +163,291 @@ def article_view():
 def partials_citations():
     """Return an HTML partial of citation cards for a given page_id + revision_id.
 
-    Uses integer FK joins throughout for efficiency. The main query retrieves
-    all citations present at a given revision in a single statement, then
-    batch-fetches related data (other articles, links, templates) to avoid
-    the N+1 query pattern.
+    Rendered partials are cached per (page_id, revision_id) and data generation
+    (see cache.py). Scrubbing the timeline usually moves to an adjacent
+    revision, so the neighbouring revisions are rendered into the cache in the
+    background.
     """
     page_id = request.args.get("page_id", type=int)
     revision_id = request.args.get("revision_id", type=int)
     if page_id is None or revision_id is None:
         return "<p>Missing page_id or revision_id.</p>", 400
 
-    with Session(_get_engine()) as session:
-        rev_ts = session.execute(
-            select(Revision.revision_timestamp).where(Revision.revision_id == revision_id)
-        ).scalar()
-        if rev_ts is None:
-            return "<p>Revision not found.</p>", 404
-
-        # Find the document_id for the current article so we can exclude it from "other articles"
-        current_doc_id = session.execute(
-            select(WebResource.instance_of_document)
-            .where(WebResource.numeric_page_id == page_id)
-            .limit(1)
-        ).scalar()
+    engine = _get_engine()
+    with Session(engine) as session:
+        html, status = cached_partial(
+            engine, 'partials_citations', f"{page_id}:{revision_id}",
+            lambda: _render_citations_partial(session, page_id, revision_id),
+        )
+    if status == 200:
+        _schedule_prewarm(current_app._get_current_object(), page_id, revision_id)
+    return html, status
+
+
+def _schedule_prewarm(app, page_id, revision_id):
+    global _prewarm_worker
+    if PARTIALS_PREWARM <= 0:
+        return
+    key = (page_id, revision_id)
+    with _prewarm_lock:
+        if key in _prewarm_pending:
+            return
+        try:
+            _prewarm_queue.put_nowait((app, page_id, revision_id))
+        except queue.Full:
+            return
+        _prewarm_pending.add(key)
+        if _prewarm_worker is None:
+            _prewarm_worker = threading.Thread(target=_prewarm_loop, name='partials-prewarm', daemon=True)
+            _prewarm_worker.start()
+
+
+def _prewarm_loop():
+    while True:
+        _prewarm_neighbours(*_prewarm_queue.get())
+
+
+def _prewarm_neighbours(app, page_id, revision_id):
+    """Render the PARTIALS_CACHE_PREWARM revisions on either side of revision_id into the cache."""
+    try:
+        engine = _get_engine()
+        with app.app_context(), Session(engine) as session:
+            before = session.execute(
+                select(Revision.revision_id)
+                .where(Revision.page_id == page_id, Revision.revision_id < revision_id)
+                .order_by(Revision.revision_id.desc())
+                .limit(PARTIALS_PREWARM)
+            ).scalars().all()
+            after = session.execute(
+                select(Revision.revision_id)
+                .where(Revision.page_id == page_id, Revision.revision_id > revision_id)
+                .order_by(Revision.revision_id)
+                .limit(PARTIALS_PREWARM)
+            ).scalars().all()
+            # Nearest first, alternating directions
+            for neighbour in (rid for pair in zip_longest(after, before) for rid in pair if rid is not None):
+                cached_partial(
+                    engine, 'partials_citations', f"{page_id}:{neighbour}",
+                    lambda: _render_citations_partial(session, page_id, neighbour),
+                )
+    except Exception as e:
+        app.logger.warning("Prewarming citations for page %s failed: %s", page_id, e)
+    finally:
+        with _prewarm_lock:
+            _prewarm_pending.discard((page_id, revision_id))
 
-        latest_rev_id = session.execute(
-            select(func.max(Revision.revision_id)).where(Revision.page_id == page_id)
-        ).scalar()
 
-        # Get all citation_instance_ids present at this revision
-        present_instances = (
-            select(CitationHistory.citation_instance_id)
-            .where(CitationHistory.revision_id == revision_id)
+def _render_citations_partial(session, page_id, revision_id):
+    """Render the citations partial; returns [html, status].
+
+    Uses integer FK joins throughout for efficiency. The main query retrieves
+    all citations present at a given revision in a single statement, then
+    batch-fetches related data (other articles, links, templates) to avoid
+    the N+1 query pattern.
+    """
+    rev_ts = execute_prepared(session, 'revision_timestamp', revision_id).scalar()
+    if rev_ts is None:
+        return ["<p>Revision not found.</p>", 404]
+
+    latest_rev_id = latest_revision_id(session, page_id)
+
+    # Get all citation_instance_ids present at this revision
+    present_instances = (
+        select(CitationHistory.citation_instance_id)
+        .where(CitationHistory.revision_id == revision_id)
+        .subquery()
+    )
+
+    # Main query: join through integer FKs
+    stmt = (
+        select(
+            CitationInstance.id.label('ci_id'),
+            CitationInstance.raw_sha1,
+            CitationInstance.reference_name,
+            CitationInstance.reference_type,
+            NormalizedCitation.id.label('nc_id'),
+            NormalizedCitation.normalized_sha1,
+            NormalizedCitation.reference_normalized,
+        )
+        .join(NormalizedCitation, NormalizedCitation.id == CitationInstance.normalized_id)
+        .where(CitationInstance.id.in_(select(present_instances.c.citation_instance_id)))
+    )
+    instance_rows = session.execute(stmt).all()
+
+    if not instance_rows:
+        return [render_template(
+            "partials/citations.html",
+            citations=[],
+            citation_count=0,
+            revision_id=revision_id,
+            revision_timestamp=rev_ts,
+        ), 200]
+
+    ci_ids = [r.ci_id for r in instance_rows]
+    nc_ids = list(set(r.nc_id for r in instance_rows))
+
+    # Batch: history stats per citation instance
+    history_stats = {}
+    hist_stmt = (
+        select(CitationInstanceStats)
+        .where(CitationInstanceStats.citation_instance_id.in_(ci_ids))
+    )
+    for hs in session.execute(hist_stmt).scalars():
+        history_stats[hs.citation_instance_id] = hs
+
+    # Batch: other pages the same normalized citations have appeared on (excluding this one)
+    # Join through to DocumentPrimaryUrl to get the article URL and Document for the title
+    other_articles_map = {}
+    if nc_ids:
+        other_pages = (
+            select(
+                NormalizedCitationPage.normalized_id.label('nc_id'),
+                NormalizedCitationPage.page_id,
+                WikiPage.document_id_of(NormalizedCitationPage.page_id).label('doc_id'),
+                NormalizedCitationPage.currently_present,
+            )
+            .where(NormalizedCitationPage.normalized_id.in_(nc_ids))
+            .where(NormalizedCitationPage.page_id != page_id)
             .subquery()
         )
-
-        # Main query: join through integer FKs
-        stmt = (
+        oa_stmt = (
             select(
-                CitationInstance.id.label('ci_id'),
-                CitationInstance.raw_sha1,
-                CitationInstance.reference_name,
-                CitationInstance.reference_type,
-                NormalizedCitation.id.label('nc_id'),
-                NormalizedCitation.normalized_sha1,
-                NormalizedCitation.reference_normalized,
+                other_pages.c.nc_id,
+                other_pages.c.page_id,
+                other_pages.c.doc_id,
+                other_pages.c.currently_present,
+                Document.title.label('doc_title'),
+                DocumentPrimaryUrl.url.label('article_url'),
             )
-            .join(NormalizedCitation, NormalizedCitation.id == CitationInstance.normalized_id)
-            .where(CitationInstance.id.in_(select(present_instances.c.citation_instance_id)))
+            .select_from(other_pages)
+            .outerjoin(Document, Document.id == other_pages.c.doc_id)
+            .outerjoin(DocumentPrimaryUrl, DocumentPrimaryUrl.document_id == other_pages.c.doc_id)
+            .order_by(other_pages.c.nc_id, other_pages.c.page_id)
         )
-        instance_rows = session.execute(stmt).all()
+        for oa in session.execute(oa_stmt).all():
+            other_articles_map.setdefault(oa.nc_id, []).append(oa)
 
-        if not instance_rows:
-            return render_template(
-                "partials/citations.html",
-                citations=[],
-                citation_count=0,
-                revision_id=revision_id,
-                revision_timestamp=rev_ts,
+    # Batch: extracted links per normalized citation
+    links_map = {}
+    if nc_ids:
+        links_stmt = (
+            select(
+                NormalizedCitationWebResource.normalized_id,
+                WebResource.id.label('wr_id'),
+                WebResource.url,
             )
+            .join(WebResource, WebResource.id == NormalizedCitationWebResource.web_resource_id)
+            .where(NormalizedCitationWebResource.normalized_id.in_(nc_ids))
+        )
+        for lk in session.execute(links_stmt).all():
+            links_map.setdefault(lk.normalized_id, []).append(lk)
 
-        ci_ids = [r.ci_id for r in instance_rows]
-        nc_ids = list(set(r.nc_id for r in instance_rows))
-
-        # Batch: history stats per citation instance
-        history_stats = {}
-        hist_stmt = (
+    # Batch: templates per normalized citation
+    templates_map = {}
+    if nc_ids:
+        tpl_stmt = (
             select(
-                CitationHistory.citation_instance_id,
-                func.min(Revision.revision_timestamp).label("first_seen_ts"),
-                func.max(Revision.revision_timestamp).label("last_seen_ts"),
-                func.min(Revision.revision_id).label("first_seen_id"),
-                func.max(Revision.revision_id).label("last_seen_id"),
-                func.count(Revision.revision_id).label("appearance_count"),
+                TemplateData.normalized_id,
+                WikiTemplate.id.label('wt_id'),
+                WikiTemplate.name,
+                TemplateData.parameter_key,
+                TemplateData.parameter_value,
+                TemplateData.offset_start,
             )
-            .join(Revision, Revision.revision_id == CitationHistory.revision_id)
-            .where(CitationHistory.citation_instance_id.in_(ci_ids))
-            .group_by(CitationHistory.citation_instance_id)
+            .join(WikiTemplate, WikiTemplate.id == TemplateData.wiki_template_id)
+            .where(TemplateData.normalized_id.in_(nc_ids))
+            .order_by(TemplateData.offset_start, TemplateData.parameter_key)
         )
-        for hs in session.execute(hist_stmt).all():
-            history_stats[hs.citation_instance_id] = hs
-
-        # Batch: other articles sharing the same normalized citation
-        # Join through to WebResource to get the article URL and Document for the title
-        other_articles_map = {}
-        if nc_ids:
-            article_wr = (
-                select(
-                    WebResource.instance_of_document,
-                    WebResource.url.label('article_url'),
-                )
-                .where(WebResource.instance_of_document.isnot(None))
-                .distinct(WebResource.instance_of_document)
-                .subquery()
-            )
-            oa_stmt = (
-                select(
-                    NormalizedCitation.id.label('nc_id'),
-                    NormalizedCitation.appears_on_article,
-                    Document.id.label('doc_id'),
-                    Document.title.label('doc_title'),
-                    article_wr.c.article_url,
-                )
-                .outerjoin(Document, Document.id == NormalizedCitation.appears_on_article)
-                .outerjoin(article_wr, article_wr.c.instance_of_document == NormalizedCitation.appears_on_article)
-                .where(NormalizedCitation.id.in_(nc_ids))
-            )
-            for oa in session.execute(oa_stmt).all():
-                other_articles_map.setdefault(oa.nc_id, []).append(oa)
-
-        # Batch: extracted links per normalized citation
-        links_map = {}
-        if nc_ids:
-            links_stmt = (
-                select(
-                    NormalizedCitationWebResource.normalized_id,
-                    WebResource.id.label('wr_id'),
-                    WebResource.url,
-                )
-                .join(WebResource, WebResource.id == NormalizedCitationWebResource.web_resource_id)
-                .where(NormalizedCitationWebResource.normalized_id.in_(nc_ids))
-            )
-            for lk in session.execute(links_stmt).all():
-                links_map.setdefault(lk.normalized_id, []).append(lk)
-
-        # Batch: templates per normalized citation
-        templates_map = {}
-        if nc_ids:
-            tpl_stmt = (
-                select(
-                    TemplateData.normalized_id,
-                    WikiTemplate.id.label('wt_id'),
-                    WikiTemplate.name,
-                    TemplateData.parameter_key,
-                    TemplateData.parameter_value,
-                    TemplateData.offset_start,
-                )
-                .join(WikiTemplate, WikiTemplate.id == TemplateData.wiki_template_id)
-                .where(TemplateData.normalized_id.in_(nc_ids))
-                .order_by(TemplateData.offset_start, TemplateData.parameter_key)
-            )
-            for t in session.execute(tpl_stmt).all():
-                templates_map.setdefault(t.normalized_id, []).append(t)
-
-        # Check next revision for removed_at
-        next_rev = session.execute(
-            select(Revision.revision_id, Revision.revision_timestamp)
-            .where(Revision.page_id == page_id)
-            .where(Revision.revision_id > revision_id)
-            .order_by(Revision.revision_id)
-            .limit(1)
-        ).first()
+        for t in session.execute(tpl_stmt).all():
+            templates_map.setdefault(t.normalized_id, []).append(t)
 
-        next_rev_ci_ids = set()
-        if next_rev:
-            next_rev_ci_ids = set(session.execute(
-                select(CitationHistory.citation_instance_id)
-                .where(CitationHistory.revision_id == next_rev.revision_id)
-            ).scalars().all())
-
-        # Build response
-        citations = []
-        for r in instance_rows:
-            hs = history_stats.get(r.ci_id)
-            is_name_only = _is_name_only_reference(r.reference_normalized, r.reference_name)
-
-            # Other articles (exclude self)
-            other_articles = [
-                {
-                    "page_id": a.appears_on_article,
-                    "document_id": a.doc_id,
-                    "title": a.doc_title,
-                    "url": a.article_url,
-                }
-                for a in other_articles_map.get(r.nc_id, [])
-                if a.appears_on_article != current_doc_id  # exclude self using document ID
-            ] if not is_name_only else []
-
-            # Extracted links
-            links = [
-                {"web_resource_id": lk.wr_id, "url": lk.url}
-                for lk in links_map.get(r.nc_id, [])
-            ]
-
-            # Templates
-            tmpl_raw = templates_map.get(r.nc_id, [])
-            tmpl_map = {}
-            for t in tmpl_raw:
-                key = (t.wt_id, t.name, t.offset_start)
-                if key not in tmpl_map:
-                    tmpl_map[key] = {}
-                tmpl_map[key][t.parameter_key] = t.parameter_value
-            templates = [
-                {"wiki_template_id": k[0], "template_name": k[1], "parameters": v}
-                for k, v in tmpl_map.items()
-            ]
-
-            removed_at = None
-            if next_rev and r.ci_id not in next_rev_ci_ids:
-                removed_at = {
-                    "revision_id": next_rev.revision_id,
-                    "revision_timestamp": next_rev.revision_timestamp,
-                }
-
-            ref_names = [r.reference_name] if r.reference_name else []
-
-            citations.append({
-                "citation_instance_id": r.ci_id,
-                "normalized_sha1": r.normalized_sha1,
-                "reference_normalized": r.reference_normalized,
-                "reference_type": TYPE_LABELS.get(r.reference_type, str(r.reference_type)),
-                "reference_names": ref_names,
-                "first_seen": {
-                    "revision_id": hs.first_seen_id if hs else None,
-                    "revision_timestamp": hs.first_seen_ts if hs else None,
-                },
-                "last_seen": {
-                    "revision_id": hs.last_seen_id if hs else None,
-                    "revision_timestamp": hs.last_seen_ts if hs else None,
-                },
-                "removed_at": removed_at,
-                "currently_visible": (hs.last_seen_id == latest_rev_id) if hs else False,
-                "appearance_count": hs.appearance_count if hs else 0,
-                "other_articles": other_articles,
-                "extracted_links": links,
-                "templates": templates,
-            })
-
-        # Sort by last seen descending
-        citations.sort(key=lambda c: c["last_seen"]["revision_timestamp"] or "", reverse=True)
+    # Check next revision for removed_at
+    next_rev = execute_prepared(session, 'next_revision', page_id, revision_id).first()
 
-    return render_template(
+    next_rev_ci_ids = set()
+    if next_rev:
+        next_rev_ci_ids = set(execute_prepared(
+            session, 'present_citation_instances', next_rev.revision_id
+        ).scalars().all())
+
+    # Build response
+    citations = []
+    for r in instance_rows:
+        hs = history_stats.get(r.ci_id)
+        is_name_only = _is_name_only_reference(r.reference_normalized, r.reference_name)
+
+        other_articles = [
+            {
+                "page_id": a.page_id,
+                "document_id": a.doc_id,
+                "title": a.doc_title,
+                "url": a.article_url,
+                "currently_present": a.currently_present,
+            }
+            for a in other_articles_map.get(r.nc_id, [])
+        ] if not is_name_only else []
+
+        # Extracted links
+        links = [
+            {"web_resource_id": lk.wr_id, "url": lk.url}
+            for lk in links_map.get(r.nc_id, [])
+        ]
+
+        # Templates
+        tmpl_raw = templates_map.get(r.nc_id, [])
+        tmpl_map = {}
+        for t in tmpl_raw:
+            key = (t.wt_id, t.name, t.offset_start)
+            if key not in tmpl_map:
+                tmpl_map[key] = {}
+            tmpl_map[key][t.parameter_key] = t.parameter_value
+        templates = [
+            {"wiki_template_id": k[0], "template_name": k[1], "parameters": v}
+            for k, v in tmpl_map.items()
+        ]
+
+        removed_at = None
+        if next_rev and r.ci_id not in next_rev_ci_ids:
+            removed_at = {
+                "revision_id": next_rev.revision_id,
+                "revision_timestamp": next_rev.revision_timestamp,
+            }
+
+        ref_names = [r.reference_name] if r.reference_name else []
+
+        citations.append({
+            "citation_instance_id": r.ci_id,
+            "normalized_sha1": r.normalized_sha1,
+            "reference_normalized": r.reference_normalized,
+            "reference_type": TYPE_LABELS.get(r.reference_type, str(r.reference_type)),
+            "reference_names": ref_names,
+            "first_seen": {
+                "revision_id": hs.first_seen_id if hs else None,
+                "revision_timestamp": hs.first_seen_ts if hs else None,
+            },
+            "last_seen": {
+                "revision_id": hs.last_seen_id if hs else None,
+                "revision_timestamp": hs.last_seen_ts if hs else None,
+            },
+            "removed_at": removed_at,
+            "currently_visible": (hs.last_seen_id == latest_rev_id) if hs else False,
+            "appearance_count": hs.appearance_count if hs else 0,
+            "other_articles": other_articles,
+            "extracted_links": links,
+            "templates": templates,
+        })
+
+    # Sort by last seen descending
+    citations.sort(key=lambda c: c["last_seen"]["revision_timestamp"] or "", reverse=True)
+
+    return [render_template(
         "partials/citations.html",
         citations=citations,
         citation_count=len(citations),
         page_id=page_id,
         revision_id=revision_id,
         revision_timestamp=rev_ts,
-    )
+    ), 200]
 
 
 @explorer.route("/citation/<normalized_sha1>/report", methods=["GET"])
@@ -411,34 +468,37 @@ def citation_report(normalized_sha1):
                 total=0,
             )
 
-        article_wr = (
-            select(
-                WebResource.instance_of_document,
-                WebResource.url.label("article_url"),
-            )
-            .where(WebResource.instance_of_document.isnot(None))
-            .distinct(WebResource.instance_of_document)
-            .subquery()
-        )
-
-        stmt = (
+        # Revisions the citation appears in, with the Document of each page resolved
+        # through wiki_pages
+        history = (
             select(
                 CitationHistory.revision_id,
                 Revision.revision_timestamp,
                 Revision.page_id,
-                Document.id.label("doc_id"),
-                Document.title.label("doc_title"),
-                article_wr.c.article_url,
+                WikiPage.document_id_of(Revision.page_id).label("doc_id"),
             )
             .join(Revision, Revision.revision_id == CitationHistory.revision_id)
             .join(CitationInstance, CitationInstance.id == CitationHistory.citation_instance_id)
-            .outerjoin(Document, Document.id == Revision.page_id)
-            .outerjoin(article_wr, article_wr.c.instance_of_document == Revision.page_id)
             .where(CitationInstance.normalized_id == nc.id)
         )
         if page_id is not None:
-            stmt = stmt.where(Revision.page_id == page_id)
-        stmt = stmt.order_by(Revision.revision_timestamp)
+            history = history.where(Revision.page_id == page_id)
+        history = history.subquery()
+
+        stmt = (
+            select(
+                history.c.revision_id,
+                history.c.revision_timestamp,
+                history.c.page_id,
+                history.c.doc_id,
+                Document.title.label("doc_title"),
+                DocumentPrimaryUrl.url.label("article_url"),
+            )
+            .select_from(history)
+            .outerjoin(Document, Document.id == history.c.doc_id)
+            .outerjoin(DocumentPrimaryUrl, DocumentPrimaryUrl.document_id == history.c.doc_id)
+            .order_by(history.c.revision_timestamp)
+        )
 
         rows = session.execute(stmt).all()
 
@@ -502,46 +562,35 @@ def citation_other_articles_report(normalized_sha1):
                 total=0,
             )
 
-        current_doc_id = None
-        if current_page_id is not None:
-            current_doc_id = session.execute(
-                select(WebResource.instance_of_document)
-                .where(WebResource.numeric_page_id == current_page_id)
-                .limit(1)
-            ).scalar()
-
-        article_wr = (
+        # Pages the citation has appeared on, precomputed by load_all.py
+        pages = (
             select(
-                WebResource.instance_of_document,
-                WebResource.url.label("article_url"),
+                NormalizedCitationPage.page_id,
+                WikiPage.document_id_of(NormalizedCitationPage.page_id).label("doc_id"),
             )
-            .where(WebResource.instance_of_document.isnot(None))
-            .distinct(WebResource.instance_of_document)
-            .subquery()
+            .where(NormalizedCitationPage.normalized_id == nc.id)
         )
+        if current_page_id is not None:
+            pages = pages.where(NormalizedCitationPage.page_id != current_page_id)
+        pages = pages.subquery()
 
         stmt = (
             select(
-                Revision.page_id.label("doc_id"),
+                pages.c.page_id,
                 Document.title.label("doc_title"),
-                article_wr.c.article_url,
+                DocumentPrimaryUrl.url.label("article_url"),
             )
-            .join(CitationHistory, CitationHistory.revision_id == Revision.revision_id)
-            .join(CitationInstance, CitationInstance.id == CitationHistory.citation_instance_id)
-            .outerjoin(Document, Document.id == Revision.page_id)
-            .outerjoin(article_wr, article_wr.c.instance_of_document == Revision.page_id)
-            .where(CitationInstance.normalized_id == nc.id)
-            .distinct(Revision.page_id, Document.title, article_wr.c.article_url)
-            .order_by(Document.title, Revision.page_id)
+            .select_from(pages)
+            .outerjoin(Document, Document.id == pages.c.doc_id)
+            .outerjoin(DocumentPrimaryUrl, DocumentPrimaryUrl.document_id == pages.c.doc_id)
+            .order_by(Document.title, pages.c.page_id)
         )
-        if current_doc_id is not None:
-            stmt = stmt.where(Revision.page_id != current_doc_id)
 
         rows = session.execute(stmt).all()
 
     articles = [
         {
-            "page_id": r.doc_id,
+            "page_id": r.page_id,
             "title": r.doc_title,
             "url": r.article_url,
         }
@@ -575,9 +624,8 @@ def template_report(wiki_template_id):
             )
             .join(TemplateData,
                   TemplateData.normalized_id == NormalizedCitation.id)
-            .where(TemplateData.wiki_template_id == wiki_template_id)
-            .where(TemplateData.parameter_key == parameter_key)
-            .where(TemplateData.parameter_value == parameter_value)
+            .where(TemplateData.value_matches(wiki_template_id, parameter_key, parameter_value))
+            .order_by(NormalizedCitation.id)
         )
         rows = session.execute(stmt).all()
 
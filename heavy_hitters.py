@@ -0,0 +1,64 @@
+"""Approximate top-K counting in bounded memory (the SpaceSaving algorithm).
+
+A SpaceSaving sketch keeps at most `capacity` counters, whatever the number of
+distinct items it sees. While it has room, every new item gets a counter of its
+own; once full, a new item takes over the counter with the smallest count and
+inherits that count as its error. Any item whose true count exceeds
+total / capacity is guaranteed to hold a counter, and every counter's count
+overestimates the item's true count by at most its error.
+
+Used by load_all.py to compute the most common values of each template
+parameter (template_parameter_stats) in one pass over template_data, without
+holding every distinct value (e.g. every DOI) in memory.
+"""
+
+import heapq
+
+
+class SpaceSaving:
+    """Top-K sketch over items with integer weights. Items must be hashable and
+    comparable with each other, e.g. strings."""
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.total = 0
+        self._counters = {}  # item -> [count, error]
+        # (count, item) entries; stale ones, whose count is no longer the
+        # item's, are skipped when looking for the minimum
+        self._heap = []
+
+    def add(self, item, weight=1):
+        self.total += weight
+        counter = self._counters.get(item)
+        if counter is None:
+            if len(self._counters) < self.capacity:
+                counter = self._counters[item] = [0, 0]
+            else:
+                evicted, minimum = self._pop_min()
+                del self._counters[evicted]
+                counter = self._counters[item] = [minimum, minimum]
+        counter[0] += weight
+        heapq.heappush(self._heap, (counter[0], item))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(c[0], i) for i, c in self._counters.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self):
+        while True:
+            count, item = heapq.heappop(self._heap)
+            counter = self._counters.get(item)
+            if counter is not None and counter[0] == count:
+                return item, count
+
+    def top(self, k):
+        """The `k` items with the highest counts, as (item, count, error), highest first.
+
+        The true count of each item is between count - error and count.
+        """
+        ranked = sorted(self._counters.items(), key=lambda kv: (-kv[1][0], kv[1][1], kv[0]))
+        return [(item, count, error) for item, (count, error) in ranked[:k]]
+
+    def __len__(self):
+        return len(self._counters)
@@ -0,0 +1,85 @@
+"""HTTP caching headers for the API and explorer.
+
+Responses only change when load_all.py loads new data and bumps the data
+generation (models.DataGeneration), so every GET response of the cached
+blueprints gets a strong ETag derived from the endpoint, its arguments, the
+current generation and the application version, plus a Cache-Control header
+(HTTP_CACHE_MAX_AGE). The version changes on every deploy, so responses whose
+shape changed are not revalidated from a client's or proxy's older copy. It is
+read from APP_VERSION; only when that is unset is the commit of the git
+checkout asked for, once, on the first cached request rather than at import.
+
+A request whose If-None-Match carries the current ETag is answered with 304
+before the view runs, so none of its queries are executed. The generation is
+read through cache.generations, i.e. at most every
+RESOLVER_CACHE_GENERATION_CHECK_SECONDS.
+"""
+
+import functools
+import hashlib
+import os
+import subprocess
+
+from flask import g, request
+
+from cache import generations
+
+
+MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', '60'))
+
+# Bump when the shape of a response changes, for deploys that set no APP_VERSION
+# and do not run from a git checkout.
+RESPONSE_VERSION = 1
+
+
+def app_version():
+    """Return RESPONSE_VERSION with APP_VERSION, or else the git commit of the checkout."""
+    return f"{RESPONSE_VERSION}:{os.getenv('APP_VERSION') or _git_commit()}"
+
+
+@functools.lru_cache(maxsize=None)
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def compute_etag(endpoint, path, args, generation, version=None):
+    """Return the ETag value for a request; `args` is a list of (name, value) pairs.
+    `version` defaults to app_version()."""
+    if version is None:
+        version = app_version()
+    key = repr((endpoint, path, sorted(args), generation, version))
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+
+def init_http_caching(app, engine, blueprints):
+    """Add ETag / Cache-Control handling to GET requests of the given blueprints."""
+    names = {bp.name for bp in blueprints}
+
+    @app.before_request
+    def _check_etag():
+        if request.method not in ('GET', 'HEAD') or request.blueprint not in names:
+            return None
+        generation, _ = generations.current(engine)
+        g.etag = compute_etag(request.endpoint, request.path,
+                              list(request.args.items(multi=True)), generation)
+        if request.if_none_match.contains(g.etag):
+            response = app.response_class(status=304)
+            return _add_headers(response, g.etag)
+        return None
+
+    @app.after_request
+    def _set_etag(response):
+        etag = g.pop('etag', None)
+        if etag is not None and response.status_code == 200:
+            _add_headers(response, etag)
+        return response
+
+
+def _add_headers(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f"public, max-age={MAX_AGE}"
+    return response
@@ -0,0 +1,217 @@
+"""Build secondary indexes concurrently after a bulk load.
+
+Used by `init_db.py --add-indexes`. Every non-unique index in the models is
+built on its own connection, up to `jobs` at a time, largest tables first.
+Each connection sets maintenance_work_mem and max_parallel_maintenance_workers
+before building. Builds can use CREATE INDEX CONCURRENTLY so the tables stay
+writable. Progress is read from pg_stat_progress_create_index.
+
+For partitioned tables (see partitions.py), the index is built on each partition
+as a separate task. Once all of a table's partitions are indexed, any detached
+partitions are attached and the parent index is created, which adopts the
+partition indexes.
+
+A failed build does not stop the others. Runs are resumable: valid indexes that
+already exist are skipped, and invalid ones left by an interrupted CONCURRENTLY
+build are dropped and rebuilt.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
+
+from partitions import is_partitioned, list_partitions, attach_partitions
+
+
+def log(msg):
+    ts = time.strftime('%Y-%m-%d %H:%M:%S')
+    print(f"{ts} [init_db] {msg}", flush=True)
+
+
+def index_state(conn, name):
+    """Return None if the index does not exist, else whether it is valid."""
+    return conn.execute(
+        text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:n)"), {'n': name}
+    ).scalar()
+
+
+def index_ddl(idx, dialect, table_name=None, index_name=None, concurrently=False):
+    """Render CREATE INDEX for `idx`, optionally retargeted at a partition."""
+    ddl = str(CreateIndex(idx).compile(dialect=dialect))
+    if table_name:
+        ddl = ddl.replace(f" ON {idx.table.name} ", f" ON {table_name} ", 1)
+    if index_name:
+        ddl = ddl.replace(f" {idx.name} ON ", f" {index_name} ON ", 1)
+    if concurrently:
+        ddl = ddl.replace("CREATE INDEX ", "CREATE INDEX CONCURRENTLY ", 1)
+    return ddl
+
+
+def plan_builds(engine, metadata, concurrently=False):
+    """Return (builds, partitioned) where builds is a list of (index name, relation,
+    ddl) and partitioned maps each partitioned table to the names of its
+    partition indexes.
+
+    Builds are ordered largest relation first, taking one index from each
+    relation in turn, so concurrent builds spread across tables.
+    """
+    builds = []
+    partitioned = {}
+    with engine.connect() as conn:
+        for table in metadata.tables.values():
+            secondary = [idx for idx in table.indexes if not idx.unique]
+            if not secondary:
+                continue
+            if is_partitioned(conn, table.name):
+                partitioned[table.name] = []
+                for part, _ in list_partitions(conn, table.name):
+                    suffix = part[len(table.name):]
+                    for idx in secondary:
+                        name = f"{idx.name}{suffix}"
+                        partitioned[table.name].append(name)
+                        builds.append((name, part, index_ddl(
+                            idx, engine.dialect, table_name=part, index_name=name,
+                            concurrently=concurrently)))
+            else:
+                for idx in secondary:
+                    builds.append((idx.name, table.name,
+                                   index_ddl(idx, engine.dialect, concurrently=concurrently)))
+        sizes = {
+            rel: conn.execute(text("SELECT pg_relation_size(to_regclass(:r))"), {'r': rel}).scalar() or 0
+            for rel in set(rel for _, rel, _ in builds)
+        }
+    rank = {}
+    for i, (name, rel, _) in enumerate(builds):
+        rank[name] = sum(1 for _, r, _ in builds[:i] if r == rel)
+    builds.sort(key=lambda b: (rank[b[0]], -sizes[b[1]]))
+    return builds, partitioned
+
+
+class ProgressMonitor(threading.Thread):
+    """Periodically log pg_stat_progress_create_index for the builds in flight."""
+
+    def __init__(self, engine, interval):
+        super().__init__(daemon=True)
+        self.engine = engine
+        self.interval = interval
+        self.building = {}  # backend pid -> index name
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            pids = dict(self.building)
+            if not pids:
+                continue
+            try:
+                with self.engine.connect() as conn:
+                    rows = conn.execute(text(
+                        "SELECT pid, phase, blocks_done, blocks_total, tuples_done, tuples_total "
+                        "FROM pg_stat_progress_create_index WHERE pid = ANY(:pids)"
+                    ), {'pids': list(pids)}).all()
+            except Exception as e:
+                log(f"progress: {e}")
+                continue
+            for pid, phase, blocks_done, blocks_total, tuples_done, tuples_total in rows:
+                if blocks_total:
+                    pct = f"{100 * blocks_done / blocks_total:.0f}% of blocks"
+                elif tuples_total:
+                    pct = f"{100 * tuples_done / tuples_total:.0f}% of tuples"
+                else:
+                    pct = "-"
+                log(f"progress: {pids.get(pid)}: {phase} ({pct})")
+
+    def stop(self):
+        self.stopped.set()
+
+
+def build_index(engine, name, ddl, settings, monitor, lock=None):
+    """Build one index on an autocommit connection. Returns 'created' or 'exists'.
+
+    `lock`, if given, is held for the duration of the build.
+    """
+    with (lock or nullcontext()), \
+            engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        state = index_state(conn, name)
+        if state:
+            return 'exists'
+        if state is False:
+            # Left behind by an interrupted CREATE INDEX CONCURRENTLY
+            log(f"{name}: dropping invalid index from an earlier run")
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        for setting, value in settings.items():
+            conn.execute(text(f"SET {setting} = '{value}'"))
+        pid = conn.execute(text("SELECT pg_backend_pid()")).scalar()
+        monitor.building[pid] = name
+        try:
+            conn.execute(text(ddl))
+        finally:
+            monitor.building.pop(pid, None)
+    return 'created'
+
+
+def build_indexes(engine, metadata, jobs=1, maintenance_work_mem=None, parallel_workers=None,
+                  concurrently=False, progress_interval=30):
+    """Build all secondary indexes in `metadata`. Returns the names of failed builds."""
+    settings = {}
+    if maintenance_work_mem:
+        settings['maintenance_work_mem'] = maintenance_work_mem
+    if parallel_workers is not None:
+        settings['max_parallel_maintenance_workers'] = parallel_workers
+
+    builds, partitioned = plan_builds(engine, metadata, concurrently=concurrently)
+    log(f"{len(builds)} index build(s) planned, {jobs} at a time")
+
+    # CREATE INDEX CONCURRENTLY builds on the same table wait on each other's
+    # snapshots and can deadlock, so they are serialized per table.
+    locks = defaultdict(threading.Lock) if concurrently else None
+
+    failed = []
+    monitor = ProgressMonitor(engine, progress_interval)
+    monitor.start()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            futures = {
+                pool.submit(build_index, engine, name, ddl, settings, monitor,
+                            locks[rel] if locks is not None else None): (name, ddl)
+                for name, rel, ddl in builds
+            }
+            for future in as_completed(futures):
+                name, ddl = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failed.append(name)
+                    log(f"{name}: failed: {e.__class__.__name__}: {str(e).splitlines()[0]}")
+                    continue
+                if result == 'exists':
+                    log(f"{name}: already exists, skipping")
+                else:
+                    log(f"{name}: created")
+    finally:
+        monitor.stop()
+
+    # Partitioned parents: attach partitions and create the parent indexes once
+    # every partition index of the table has been built.
+    for table_name, names in partitioned.items():
+        if any(n in failed for n in names):
+            log(f"{table_name}: not attaching partitions; some partition indexes failed")
+            continue
+        table = metadata.tables[table_name]
+        try:
+            with engine.begin() as conn:
+                attached = attach_partitions(conn, table_name)
+                if attached:
+                    log(f"{table_name}: attached {attached} partition(s)")
+                for idx in table.indexes:
+                    if not idx.unique and index_state(conn, idx.name) is None:
+                        conn.execute(text(index_ddl(idx, engine.dialect)))
+                        log(f"{idx.name}: created on partitioned table {table_name}")
+        except Exception as e:
+            failed.append(table_name)
+            log(f"{table_name}: failed to attach partitions or create parent indexes: {e}")
+    return failed
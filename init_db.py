@@ -3,6 +3,8 @@ import os
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
 from models import Base
+from partitions import partitioned_metadata, is_partitioned, create_partitions
+from index_builder import build_indexes
 
 
 def _db_url() -> str:
@@ -38,6 +40,42 @@ def main() -> None:
         "--drop-indexes", action="store_true",
         help="Drop secondary (non-unique) indexes from existing tables.",
     )
+    parser.add_argument(
+        "--partitions", type=int, default=0, metavar="N",
+        help="Create citation_history and citation_instances as partitioned tables with N "
+             "partitions each. With --no-indexes the partitions are created detached for "
+             "bulk loading and attached by --add-indexes (see partitions.py).",
+    )
+    parser.add_argument(
+        "--citation-history-partition-by", choices=["citation_instance_id", "revision_id"],
+        default="citation_instance_id",
+        help="Partition citation_history by hash of citation_instance_id or by revision_id "
+             "range (default: citation_instance_id).",
+    )
+    parser.add_argument(
+        "--revision-range-size", type=int, default=100_000_000, metavar="N",
+        help="Width of each revision_id range partition (default: 100000000).",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1,
+        help="Index builds run concurrently by --add-indexes (default: 1).",
+    )
+    parser.add_argument(
+        "--concurrently", action="store_true",
+        help="With --add-indexes, use CREATE INDEX CONCURRENTLY so tables stay writable.",
+    )
+    parser.add_argument(
+        "--maintenance-work-mem", metavar="SIZE",
+        help="maintenance_work_mem for each index build, e.g. 2GB (default: server setting).",
+    )
+    parser.add_argument(
+        "--parallel-workers", type=int, metavar="N",
+        help="max_parallel_maintenance_workers for each index build (default: server setting).",
+    )
+    parser.add_argument(
+        "--progress-interval", type=int, default=30, metavar="SECONDS",
+        help="Seconds between index build progress reports (default: 30).",
+    )
     args = parser.parse_args()
 
     if sum([args.no_indexes, args.add_indexes, args.drop_indexes]) > 1:
@@ -54,17 +92,18 @@ def main() -> None:
     )
 
     if args.add_indexes:
-        count = 0
-        for table in Base.metadata.tables.values():
-            for idx in table.indexes:
-                if not idx.unique:
-                    try:
-                        idx.create(bind=engine)
-                        print(f"Created index {idx.name}")
-                        count += 1
-                    except Exception as e:
-                        print(f"Skipping index {idx.name}: {e}")
-        print(f"Done. Created {count} index(es).")
+        failed = build_indexes(
+            engine, Base.metadata,
+            jobs=args.jobs,
+            maintenance_work_mem=args.maintenance_work_mem,
+            parallel_workers=args.parallel_workers,
+            concurrently=args.concurrently,
+            progress_interval=args.progress_interval,
+        )
+        if failed:
+            raise SystemExit(f"{len(failed)} index build(s) failed: {', '.join(failed)}. "
+                             f"Re-run --add-indexes to retry them.")
+        print("Done.")
         return
 
     if args.drop_indexes:
@@ -81,10 +120,19 @@ def main() -> None:
         print(f"Done. Dropped {count} index(es).")
         return
 
+    metadata = Base.metadata
+    methods = {}
+    if args.partitions:
+        methods = {
+            'citation_history': 'hash' if args.citation_history_partition_by == 'citation_instance_id' else 'range',
+            'citation_instances': 'hash',
+        }
+        metadata = partitioned_metadata(methods)
+
     # Collect secondary indexes to omit when --no-indexes is set
     saved_indexes = {}
     if args.no_indexes:
-        for table_name, table in Base.metadata.tables.items():
+        for table_name, table in metadata.tables.items():
             secondary = [idx for idx in table.indexes if not idx.unique]
             saved_indexes[table_name] = secondary
             for idx in secondary:
@@ -92,18 +140,23 @@ def main() -> None:
 
     try:
         if args.table:
-            table = Base.metadata.tables.get(args.table)
+            table = metadata.tables.get(args.table)
             if table is None:
-                available = sorted(Base.metadata.tables.keys())
+                available = sorted(metadata.tables.keys())
                 parser.error(f"Unknown table '{args.table}'. Available tables: {', '.join(available)}")
             table.create(bind=engine, checkfirst=True)
         else:
-            Base.metadata.create_all(bind=engine)
+            metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            for table_name in methods:
+                if (args.table in (None, table_name)) and is_partitioned(conn, table_name):
+                    create_partitions(conn, table_name, args.partitions,
+                                      interval=args.revision_range_size, detached=args.no_indexes)
     finally:
         # Restore indexes on metadata so the module stays consistent
         for table_name, indexes in saved_indexes.items():
             for idx in indexes:
-                Base.metadata.tables[table_name].indexes.add(idx)
+                metadata.tables[table_name].indexes.add(idx)
 
 
 if __name__ == "__main__":
@@ -12,30 +12,45 @@ Usage:
     python3 load_all.py  # uses STAGING_DIR from .env or default ./staging
     python3 load_all.py --tables containers domains documents
     python3 load_all.py --tables citation_histories  # load only citation_histories
+    python3 load_all.py -d ./staging --jobs 8  # load on 8 concurrent connections
 """
 
 import hashlib
+import io
 import itertools
 import os
 import sys
+import threading
 import time
 import glob
 import argparse
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 from dotenv import load_dotenv
 load_dotenv()
 
-import duckdb
-from sqlalchemy import create_engine, text, select as sa_select, func as sa_func
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from sqlalchemy import (
+    create_engine, text, tuple_, select as sa_select, func as sa_func, update as sa_update, delete as sa_delete,
+    table as sa_table, column as sa_column, union_all,
+    MetaData, Table, Column, Integer, BigInteger, SmallInteger, String, Text, CHAR,
+)
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
 from models import (
     Base, Container, Domain, Document, WebResource, CitationInstance,
     CitationHistory, Revision, NormalizedCitation,
-    NormalizedCitationWebResource, WikiTemplate, TemplateData,
+    NormalizedCitationWebResource, WikiTemplate, TemplateData, WikiPage, LoadProgress,
+    DataGeneration, CitationInstanceStats, DocumentPrimaryUrl, NormalizedCitationPage,
+    TemplateValueCount, TemplateParameterStat,
 )
+from heavy_hitters import SpaceSaving
+from partitions import is_partitioned, detached_partitions, attach_partitions
 
 _required_db_vars = ['DB_HOST', 'DB_PORT', 'DB_NAME', 'DB_USER', 'DB_PASS']
 _missing = [v for v in _required_db_vars if not os.getenv(v)]
@@ -54,15 +69,31 @@ Engine = create_engine(DB, poolclass=NullPool, hide_parameters=True)
 Session = sessionmaker(bind=Engine)
 
 BATCH_SIZE = int(os.getenv('LOAD_BATCH_SIZE', '5000'))
+JOBS = int(os.getenv('LOAD_JOBS', '1'))
+# citation_instances ids per transaction when citation_instance_stats is built from scratch
+STATS_CHUNK_SIZE = 1_000_000
+# page_id range per transaction when normalized_citation_pages is built from scratch
+PAGES_CHUNK_SIZE = 1_000_000
+# template parameter values used by fewer citations are counted per request, through the index
+TEMPLATE_VALUE_COUNT_MIN = int(os.getenv('TEMPLATE_VALUE_COUNT_MIN', '100'))
+# most common values kept per template parameter in template_parameter_stats; the sketch
+# that finds them keeps 10x as many counters per parameter
+TEMPLATE_STATS_TOP_K = int(os.getenv('TEMPLATE_STATS_TOP_K', '20'))
+# template_data rows read (and pre-aggregated) at a time when computing the stats
+TEMPLATE_STATS_BATCH_SIZE = 100_000
 
 
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
+_log_lock = threading.Lock()
+
+
 def log(msg):
     ts = time.strftime('%Y-%m-%d %H:%M:%S')
-    print(f"{ts} [load_all] {msg}", flush=True)
+    with _log_lock:
+        print(f"{ts} [load_all] {msg}", flush=True)
 
 
 def find_deduped_parquet(staging_dir, table_name):
@@ -74,28 +105,125 @@ def find_deduped_parquet(staging_dir, table_name):
     return None
 
 
-def read_parquet_batches(filepath, batch_size=BATCH_SIZE):
-    """Yield batches of dicts from a Parquet file using DuckDB for efficiency."""
+def read_parquet_batches(filepath, batch_size=None, row_groups=None, columns=None):
+    """Yield pyarrow RecordBatches from a Parquet file, optionally limited to some row groups
+    and columns."""
     if not filepath or not os.path.exists(filepath):
         return
-    con = duckdb.connect()
-    result = con.execute(f"SELECT * FROM '{filepath}'")
-    columns = [desc[0] for desc in result.description]
-    while True:
-        chunk = result.fetchmany(batch_size)
-        if not chunk:
-            break
-        batch = []
-        for row in chunk:
-            d = {}
-            for i, col in enumerate(columns):
-                val = row[i]
-                # Convert DuckDB NoneType properly
-                if val is not None:
-                    d[col] = val
-            batch.append(d)
-        yield batch
-    con.close()
+    pf = pq.ParquetFile(filepath)
+    yield from pf.iter_batches(batch_size=batch_size or BATCH_SIZE, row_groups=row_groups, columns=columns)
+
+
+def batch_columns(batch, *names):
+    """Return the named columns of a RecordBatch as Python lists.
+
+    Columns missing from the file come back as lists of None, so callers can zip
+    them without special-casing older staging schemas.
+    """
+    schema_names = batch.schema.names
+    return [
+        batch.column(name).to_pylist() if name in schema_names else [None] * batch.num_rows
+        for name in names
+    ]
+
+
+def parquet_fingerprint(filepath, pf=None):
+    """Identify a deduped Parquet file so progress markers from an older file are ignored."""
+    pf = pf or pq.ParquetFile(filepath)
+    st = os.stat(filepath)
+    return f"{pf.metadata.num_rows}:{pf.metadata.num_row_groups}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def completed_row_groups(session, table_name, source):
+    return set(session.execute(
+        sa_select(LoadProgress.row_group)
+        .where(LoadProgress.table_name == table_name)
+        .where(LoadProgress.source == source)
+        .where(LoadProgress.row_group != LoadProgress.TABLE_COMPLETE)
+    ).scalars())
+
+
+def checkpointed_batches(session, table_name, filepath, row_groups=None):
+    """Yield batches one row group at a time, skipping row groups already recorded
+    in load_progress.
+
+    After the last batch of a row group has been processed, its marker is written
+    and the session is committed, so each marker becomes durable in the same
+    transaction as the rows it covers.
+    """
+    if not filepath or not os.path.exists(filepath):
+        return
+    pf = pq.ParquetFile(filepath)
+    source = parquet_fingerprint(filepath, pf)
+    if row_groups is None:
+        row_groups = range(pf.num_row_groups)
+    done = completed_row_groups(session, table_name, source)
+    todo = [rg for rg in row_groups if rg not in done]
+    if len(todo) < len(row_groups):
+        log(f"{table_name}: skipping {len(row_groups) - len(todo)} row group(s) already loaded")
+    for rg in todo:
+        rows = 0
+        for batch in read_parquet_batches(filepath, row_groups=[rg]):
+            yield batch
+            rows += batch.num_rows
+        LoadProgress.upsert(session, table_name=table_name, row_group=rg, source=source, row_count=rows)
+        session.commit()
+
+
+def table_source(staging_dir, table_name):
+    filepath = find_deduped_parquet(staging_dir, table_name)
+    return parquet_fingerprint(filepath) if filepath else None
+
+
+def is_table_loaded(table_name, staging_dir):
+    """True if load_progress marks this table's current deduped file as fully loaded."""
+    source = table_source(staging_dir, table_name)
+    if source is None:
+        return False
+    with Session() as session:
+        return session.execute(
+            sa_select(LoadProgress.row_group)
+            .where(LoadProgress.table_name == table_name)
+            .where(LoadProgress.row_group == LoadProgress.TABLE_COMPLETE)
+            .where(LoadProgress.source == source)
+        ).first() is not None
+
+
+def mark_table_loaded(table_name, staging_dir):
+    source = table_source(staging_dir, table_name)
+    if source is None:
+        return
+    with Session() as session:
+        LoadProgress.upsert(session, table_name=table_name, row_group=LoadProgress.TABLE_COMPLETE,
+                            source=source)
+        session.commit()
+
+
+def reset_progress(table_names):
+    """Forget load_progress markers so the given tables are loaded from scratch."""
+    with Session() as session:
+        session.execute(LoadProgress.__table__.delete().where(LoadProgress.table_name.in_(table_names)))
+        session.commit()
+
+
+def describe_source(filepath, row_groups=None):
+    """Format a Parquet path (and row-group range, for partitions) for log messages."""
+    if not row_groups:
+        return filepath
+    return f"{filepath} (row groups {row_groups[0]}-{row_groups[-1]})"
+
+
+def split_row_groups(num_row_groups, parts):
+    """Split row-group indexes 0..num_row_groups-1 into at most `parts` contiguous ranges."""
+    parts = max(1, min(parts, num_row_groups))
+    size, extra = divmod(num_row_groups, parts)
+    ranges = []
+    start = 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
 
 
 def chunked_iterable(iterable, n):
@@ -108,33 +236,194 @@ def chunked_iterable(iterable, n):
         yield chunk
 
 
+# Session-local temporary tables used to resolve foreign keys server-side with
+# INSERT ... SELECT joins instead of per-batch lookups in Python. Each Parquet
+# batch is COPYed in as-is, so rows never become Python objects.
+_staging_metadata = MetaData()
+
+
+def _staging_table(name, *columns):
+    return Table(
+        f'_stage_{name}', _staging_metadata, *columns,
+        prefixes=['TEMPORARY'], postgresql_on_commit='DELETE ROWS',
+    )
+
+
+_normalized_citations_stage = _staging_table(
+    'normalized_citations',
+    Column('normalized_sha1', CHAR(40)),
+    Column('reference_normalized', Text),
+    Column('appears_on_domain', String),
+    Column('appears_on_page_id', Integer),
+)
+
+_citation_instances_stage = _staging_table(
+    'citation_instances',
+    Column('page_id', Integer),
+    Column('raw_sha1', CHAR(40)),
+    Column('normalized_sha1', CHAR(40)),
+    Column('reference_type', SmallInteger),
+    Column('reference_name', String),
+)
+
+_revisions_stage = _staging_table(
+    'revisions',
+    Column('revision_id', BigInteger),
+    Column('page_id', Integer),
+    Column('parent_revision_id', BigInteger),
+    Column('revision_timestamp', String),
+)
+
+_citation_histories_stage = _staging_table(
+    'citation_histories',
+    Column('page_id', Integer),
+    Column('raw_sha1', CHAR(40)),
+    Column('revision_id', BigInteger),
+)
+
+# Counts of one template_value_counts rebuild, diffed against the table
+_template_value_counts_stage = _staging_table(
+    'template_value_counts',
+    Column('wiki_template_id', Integer),
+    Column('parameter_key_md5', CHAR(32)),
+    Column('parameter_value_md5', CHAR(32)),
+    Column('citation_count', BigInteger),
+)
+
+# Rows resolved against citation_instances / normalized_citations, filled once
+# per batch when they are routed to detached partitions (see partition_selects)
+_citation_instances_resolved = _staging_table(
+    'citation_instances_resolved',
+    Column('page_id', Integer),
+    Column('raw_sha1', CHAR(40)),
+    Column('normalized_id', Integer),
+    Column('reference_type', SmallInteger),
+    Column('reference_name', String),
+)
+
+_citation_histories_resolved = _staging_table(
+    'citation_histories_resolved',
+    Column('citation_instance_id', BigInteger),
+    Column('revision_id', BigInteger),
+)
+
+_ncwr_stage = _staging_table(
+    'ncwr',
+    Column('normalized_sha1', CHAR(40)),
+    Column('url', String),
+)
+
+_template_data_stage = _staging_table(
+    'template_data',
+    Column('domain_label', String),
+    Column('template_name', String),
+    Column('normalized_sha1', CHAR(40)),
+    Column('offset_start', Integer),
+    Column('parameter_key', String),
+    Column('parameter_value', Text),
+)
+
+
+def copy_batch(session, table, batch):
+    """COPY a RecordBatch into a temporary staging table.
+
+    The batch is encoded to CSV by Arrow in one call. The table is created on
+    first use for the session's connection and emptied before each batch;
+    staging columns absent from the batch are loaded as NULL.
+    """
+    conn = session.connection()
+    table.create(conn, checkfirst=True)
+    conn.execute(text(f"TRUNCATE {table.name}"))
+    columns = [c.name for c in table.columns]
+    arrays = [
+        batch.column(c) if c in batch.schema.names else pa.nulls(batch.num_rows)
+        for c in columns
+    ]
+    buf = io.BytesIO()
+    # Arrow quotes every string (so '' stays distinct from NULL) and writes null
+    # as an unquoted empty field, which COPY reads as NULL.
+    pa_csv.write_csv(pa.RecordBatch.from_arrays(arrays, names=columns), buf,
+                     write_options=pa_csv.WriteOptions(include_header=False))
+    buf.seek(0)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf
+        )
+    finally:
+        cursor.close()
+
+
+def partition_selects(session, table, select_stmt, resolved):
+    """Return (resolve, [(target, select)]): the selects together insert the rows
+    of `select_stmt` once `resolve(session)` has run for the current batch.
+
+    If `table` is partitioned and has detached partitions (see partitions.py),
+    the rows of `select_stmt` are resolved once per batch into the `resolved`
+    staging table, and each partition is targeted directly with the rows of it
+    satisfying the partition's bound; the joins of `select_stmt` thus run once
+    rather than once per partition. Otherwise `resolve` does nothing, the
+    table itself is the only target and Postgres routes rows to partitions.
+    The columns of `select_stmt` must be labeled with the target column names,
+    which are also those of `resolved`, so partition bounds can refer to them.
+    """
+    conn = session.connection()
+    detached = detached_partitions(conn, table.name) if is_partitioned(conn, table.name) else []
+    columns = [c.name for c in resolved.columns]
+
+    def resolve(session):
+        if not detached:
+            return
+        conn = session.connection()
+        resolved.create(conn, checkfirst=True)
+        conn.execute(text(f"TRUNCATE {resolved.name}"))
+        conn.execute(insert(resolved).from_select(columns, select_stmt))
+
+    if not detached:
+        return resolve, [(table, select_stmt)]
+    return resolve, [
+        (sa_table(name, *[sa_column(c.name) for c in table.columns]),
+         sa_select(*resolved.c).where(text(predicate)))
+        for name, predicate in detached
+    ]
+
+
+def warn_if_no_wiki_pages(session, table_name):
+    """Log a warning when a phase that joins against wiki_pages runs before documents."""
+    if session.execute(sa_select(WikiPage.page_id).limit(1)).first() is None:
+        log(f"{table_name}: warning: wiki_pages is empty; load documents first "
+            f"or page -> document references will not resolve")
+
+
 # ---------------------------------------------------------------------------
 # Load functions per table
 # ---------------------------------------------------------------------------
 
-def load_containers(session, staging_dir):
+def load_containers(session, staging_dir, row_groups=None):
     filepath = find_deduped_parquet(staging_dir, 'containers')
     if not filepath:
         return
-    log(f"containers: loading from {filepath}")
+    log(f"containers: loading from {describe_source(filepath, row_groups)}")
     count = 0
-    for batch in read_parquet_batches(filepath):
-        Container.bulk_upsert(session, batch)
-        count += len(batch)
+    for batch in checkpointed_batches(session, 'containers', filepath, row_groups):
+        labels, = batch_columns(batch, 'label')
+        Container.bulk_upsert(session, [{'label': l} for l in labels])
+        count += batch.num_rows
     log(f"containers: {count} rows loaded")
     session.commit()
 
 
-def load_domains(session, staging_dir):
+def load_domains(session, staging_dir, row_groups=None):
     filepath = find_deduped_parquet(staging_dir, 'domains')
     if not filepath:
         return
-    log(f"domains: loading from {filepath}")
+    log(f"domains: loading from {describe_source(filepath, row_groups)}")
 
     count = 0
-    for batch in read_parquet_batches(filepath):
+    for batch in checkpointed_batches(session, 'domains', filepath, row_groups):
+        values, container_labels = batch_columns(batch, 'value', 'for_container_label')
         # Resolve container labels to ids for this batch
-        labels = set(r.get('for_container_label') for r in batch if r.get('for_container_label'))
+        labels = set(l for l in container_labels if l)
         label_to_id = {}
         if labels:
             result = session.execute(
@@ -142,94 +431,120 @@ def load_domains(session, staging_dir):
             ).all()
             label_to_id = {l: i for l, i in result}
 
-        cleaned = []
-        for r in batch:
-            d = {'value': r['value']}
-            fcl = r.get('for_container_label')
-            if fcl and fcl in label_to_id:
-                d['for_container'] = label_to_id[fcl]
-            cleaned.append(d)
-
+        cleaned = [
+            {'value': v, 'for_container': label_to_id.get(l)}
+            for v, l in zip(values, container_labels)
+        ]
         Domain.bulk_upsert(session, cleaned)
         count += len(cleaned)
     log(f"domains: {count} rows loaded")
     session.commit()
 
 
-def load_documents(session, staging_dir):
-    """Load documents. Returns a mapping of (domain, page_id) -> document_id."""
+def load_documents(session, staging_dir, row_groups=None):
+    """Load documents and persist the (domain, page_id) -> document_id mapping in wiki_pages.
+
+    Document ids are reserved from the sequence in one round trip per batch and
+    the rows are written with a single multi-row INSERT. Pages that already have
+    a wiki_pages row are skipped, so re-running this phase does not create
+    duplicate documents. Rows whose container names no domain are still loaded
+    as documents, but get no wiki_pages row, so --restart loads them again.
+    """
     filepath = find_deduped_parquet(staging_dir, 'documents')
     if not filepath:
-        return {}
-    log(f"documents: loading from {filepath}")
+        return
+    log(f"documents: loading from {describe_source(filepath, row_groups)}")
 
-    page_to_doc_id = {}
     count = 0
-    for batch in read_parquet_batches(filepath):
-        # Resolve container labels
-        labels = set(r.get('has_container_label') for r in batch if r.get('has_container_label'))
+    unmapped = 0
+    for batch in checkpointed_batches(session, 'documents', filepath, row_groups):
+        language_codes, container_labels, page_ids = batch_columns(
+            batch, 'language_code', 'has_container_label', 'page_id')
+        # Resolve container labels (and the domains they name) to ids
+        labels = list(set(l for l in container_labels if l))
         label_to_id = {}
+        domain_to_id = {}
         if labels:
             result = session.execute(
-                sa_select(Container.label, Container.id).where(Container.label.in_(list(labels)))
+                sa_select(Container.label, Container.id).where(Container.label.in_(labels))
             ).all()
             label_to_id = {l: i for l, i in result}
+            result = session.execute(
+                sa_select(Domain.value, Domain.id).where(Domain.value.in_(labels))
+            ).all()
+            domain_to_id = {v: i for v, i in result}
 
-        for r in batch:
-            container_label = r.get('has_container_label')
-            container_id = label_to_id.get(container_label)
-            doc_id = Document.upsert(
-                session,
-                language_code=r.get('language_code'),
-                has_container=container_id,
-            )
-            page_to_doc_id[(container_label or '', r['page_id'])] = doc_id
-            count += 1
+        pages = {}
+        without_page = []
+        for language_code, label, page_id in zip(language_codes, container_labels, page_ids):
+            dom_id = domain_to_id.get(label)
+            if dom_id is None:
+                without_page.append((None, (language_code, label)))
+            else:
+                pages[(dom_id, page_id)] = (language_code, label)
+
+        # Skip pages that already have a document from a previous run
+        existing = set()
+        for chunk in chunked_iterable(list(pages), 1000):
+            result = session.execute(
+                sa_select(WikiPage.domain_id, WikiPage.page_id)
+                .where(tuple_(WikiPage.domain_id, WikiPage.page_id).in_(chunk))
+            ).all()
+            existing.update((d, p) for d, p in result)
+        new_pages = [(key, r) for key, r in pages.items() if key not in existing] + without_page
+
+        doc_ids = Document.reserve_ids(session, len(new_pages))
+        documents = []
+        wiki_pages = []
+        for doc_id, (key, (language_code, label)) in zip(doc_ids, new_pages):
+            documents.append({
+                'id': doc_id,
+                'language_code': language_code,
+                'has_container': label_to_id.get(label),
+            })
+            if key is not None:
+                wiki_pages.append({'domain_id': key[0], 'page_id': key[1], 'document_id': doc_id})
 
+        Document.bulk_insert(session, documents)
+        WikiPage.bulk_upsert(session, wiki_pages)
+        count += len(documents)
+        unmapped += len(without_page)
+
+    if unmapped:
+        log(f"documents: warning: {unmapped} rows have no matching domain; "
+            f"loaded without a wiki_pages row")
     log(f"documents: {count} rows loaded")
     session.commit()
-    return page_to_doc_id
 
 
-def load_web_resources(session, staging_dir, page_to_doc_id):
+def load_web_resources(session, staging_dir, row_groups=None):
     filepath = find_deduped_parquet(staging_dir, 'web_resources')
     if not filepath:
         return
-    log(f"web_resources: loading from {filepath}")
-
-    # Defer foreign key constraint checks until commit for faster inserts
-    session.execute(text("SET CONSTRAINTS ALL DEFERRED"))
+    log(f"web_resources: loading from {describe_source(filepath, row_groups)}")
 
     count = 0
-    for batch in read_parquet_batches(filepath):
+    for batch in checkpointed_batches(session, 'web_resources', filepath, row_groups):
+        urls, domain_labels, page_ids, namespace_ids = batch_columns(
+            batch, 'url', 'domain_label', 'numeric_page_id', 'numeric_namespace_id')
         # Resolve domain labels to ids
-        domain_labels = set(r.get('domain_label') for r in batch if r.get('domain_label'))
+        labels = set(l for l in domain_labels if l)
         domain_to_id = {}
-        if domain_labels:
+        if labels:
             result = session.execute(
-                sa_select(Domain.value, Domain.id).where(Domain.value.in_(list(domain_labels)))
+                sa_select(Domain.value, Domain.id).where(Domain.value.in_(list(labels)))
             ).all()
             domain_to_id = {v: i for v, i in result}
 
-        cleaned = []
-        for r in batch:
-            wr = {'url': r['url']}
-            dl = r.get('domain_label')
-            if dl and dl in domain_to_id:
-                wr['domain_id'] = domain_to_id[dl]
-            if r.get('numeric_page_id') is not None:
-                wr['numeric_page_id'] = r['numeric_page_id']
-            if r.get('numeric_namespace_id') is not None:
-                wr['numeric_namespace_id'] = r['numeric_namespace_id']
-            # Resolve document id from page_id
-            page_id = r.get('page_id')
-            domain_label = r.get('domain_label', '')
-            if page_id is not None:
-                doc_id = page_to_doc_id.get((domain_label, page_id))
-                if doc_id is not None:
-                    wr['instance_of_document'] = doc_id
-            cleaned.append(wr)
-
+        cleaned = [
+            {
+                'url': url,
+                'domain_id': domain_to_id.get(label),
+                'numeric_page_id': page_id,
+                'numeric_namespace_id': namespace_id,
+            }
+            for url, label, page_id, namespace_id in zip(urls, domain_labels, page_ids, namespace_ids)
+        ]
         WebResource.bulk_upsert(session, cleaned)
         count += len(cleaned)
 
@@ -237,293 +552,706 @@ def load_web_resources(session, staging_dir, page_to_doc_id):
     session.commit()
 
 
-def load_wiki_templates(session, staging_dir):
+def link_web_resources_to_documents(session, staging_dir):
+    """Set web_resources.instance_of_document for wiki article URLs with a single
+    server-side join against wiki_pages. Runs once after all web_resources
+    partitions have been loaded."""
+    warn_if_no_wiki_pages(session, 'web_resources')
+    stmt = (
+        sa_update(WebResource)
+        .where(WikiPage.domain_id == WebResource.domain_id)
+        .where(WikiPage.page_id == WebResource.numeric_page_id)
+        .where(WebResource.instance_of_document.is_(None))
+        .values(instance_of_document=WikiPage.document_id)
+    )
+    linked = session.execute(stmt).rowcount
+    log(f"web_resources: {linked} rows linked to documents")
+    session.commit()
+
+
+def load_wiki_templates(session, staging_dir, row_groups=None):
     filepath = find_deduped_parquet(staging_dir, 'wiki_templates')
     if not filepath:
         return
-    log(f"wiki_templates: loading from {filepath}")
+    log(f"wiki_templates: loading from {describe_source(filepath, row_groups)}")
 
     count = 0
-    for batch in read_parquet_batches(filepath):
+    for batch in checkpointed_batches(session, 'wiki_templates', filepath, row_groups):
+        domain_labels, names = batch_columns(batch, 'domain_label', 'name')
         # Resolve domain labels
-        domain_labels = set(r['domain_label'] for r in batch)
+        labels = set(domain_labels)
         domain_to_id = {}
-        if domain_labels:
+        if labels:
             result = session.execute(
-                sa_select(Domain.value, Domain.id).where(Domain.value.in_(list(domain_labels)))
+                sa_select(Domain.value, Domain.id).where(Domain.value.in_(list(labels)))
             ).all()
             domain_to_id = {v: i for v, i in result}
 
-        cleaned = []
-        for r in batch:
-            dom_id = domain_to_id.get(r['domain_label'])
-            if dom_id is not None:
-                cleaned.append({'domain': dom_id, 'name': r['name']})
-
+        cleaned = [
+            {'domain': domain_to_id[label], 'name': name}
+            for label, name in zip(domain_labels, names)
+            if label in domain_to_id
+        ]
         WikiTemplate.bulk_upsert(session, cleaned)
         count += len(cleaned)
     log(f"wiki_templates: {count} rows loaded")
     session.commit()
 
 
-def load_normalized_citations(session, staging_dir, page_to_doc_id):
+def load_normalized_citations(session, staging_dir, row_groups=None):
+    """Load normalized citations, resolving the page they appear on to a document id
+    with a server-side join against wiki_pages."""
     filepath = find_deduped_parquet(staging_dir, 'normalized_citations')
     if not filepath:
         return
-    log(f"normalized_citations: loading from {filepath}")
+    log(f"normalized_citations: loading from {describe_source(filepath, row_groups)}")
+    warn_if_no_wiki_pages(session, 'normalized_citations')
+
+    stage = _normalized_citations_stage
+    select_stmt = (
+        sa_select(stage.c.normalized_sha1, stage.c.reference_normalized, WikiPage.document_id)
+        .join(Domain, Domain.value == stage.c.appears_on_domain)
+        .join(WikiPage, (WikiPage.domain_id == Domain.id)
+              & (WikiPage.page_id == stage.c.appears_on_page_id))
+        .distinct(stage.c.normalized_sha1)
+    )
+    stmt = insert(NormalizedCitation).from_select(
+        ['normalized_sha1', 'reference_normalized', 'appears_on_article'], select_stmt
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['normalized_sha1'],
+        set_={
+            'reference_normalized': stmt.excluded.reference_normalized,
+            'appears_on_article': stmt.excluded.appears_on_article,
+        }
+    )
 
     count = 0
-    for batch in read_parquet_batches(filepath):
-        cleaned = []
-        for r in batch:
-            domain = r.get('appears_on_domain', '')
-            page_id = r.get('appears_on_page_id')
-            doc_id = page_to_doc_id.get((domain, page_id))
-            if doc_id is None:
-                continue
-            cleaned.append({
-                'normalized_sha1': r['normalized_sha1'],
-                'reference_normalized': r['reference_normalized'],
-                'appears_on_article': doc_id,
-            })
-
-        if cleaned:
-            stmt = insert(NormalizedCitation).values(cleaned).on_conflict_do_update(
-                index_elements=['normalized_sha1'],
-                set_={
-                    'reference_normalized': insert(NormalizedCitation).excluded.reference_normalized,
-                    'appears_on_article': insert(NormalizedCitation).excluded.appears_on_article,
-                }
-            )
-            session.execute(stmt)
-            count += len(cleaned)
+    for batch in checkpointed_batches(session, 'normalized_citations', filepath, row_groups):
+        copy_batch(session, stage, batch)
+        count += session.execute(stmt).rowcount
     log(f"normalized_citations: {count} rows loaded")
     session.commit()
 
 
-def load_citation_instances(session, staging_dir):
-    """Load citation instances. Resolves normalized_sha1 -> normalized_id via DB lookup."""
+def load_citation_instances(session, staging_dir, row_groups=None):
+    """Load citation instances, resolving normalized_sha1 -> normalized_id with a
+    server-side join against normalized_citations."""
     filepath = find_deduped_parquet(staging_dir, 'citation_instances')
     if not filepath:
         return
-    log(f"citation_instances: loading from {filepath}")
+    log(f"citation_instances: loading from {describe_source(filepath, row_groups)}")
+
+    stage = _citation_instances_stage
+    select_stmt = (
+        sa_select(stage.c.page_id, stage.c.raw_sha1, NormalizedCitation.id.label('normalized_id'),
+                  sa_func.coalesce(stage.c.reference_type, 0).label('reference_type'),
+                  stage.c.reference_name)
+        .join(NormalizedCitation, NormalizedCitation.normalized_sha1 == stage.c.normalized_sha1)
+        .distinct(stage.c.page_id, stage.c.raw_sha1)
+    )
+    resolve, targets = partition_selects(session, CitationInstance.__table__, select_stmt,
+                                         _citation_instances_resolved)
+    statements = []
+    for target, select in targets:
+        stmt = insert(target).from_select(
+            ['page_id', 'raw_sha1', 'normalized_id', 'reference_type', 'reference_name'], select
+        )
+        statements.append(stmt.on_conflict_do_update(
+            index_elements=['page_id', 'raw_sha1'],
+            set_={
+                'normalized_id': stmt.excluded.normalized_id,
+                'reference_type': stmt.excluded.reference_type,
+                'reference_name': stmt.excluded.reference_name,
+            }
+        ))
 
     count = 0
-    for batch in read_parquet_batches(filepath):
-        # Resolve normalized_sha1 -> normalized_id
-        sha1s = list(set(r['normalized_sha1'] for r in batch if r.get('normalized_sha1')))
-        sha1_to_id = {}
-        if sha1s:
-            # Query in chunks to avoid overly large IN clauses
-            for chunk in chunked_iterable(sha1s, 1000):
-                result = session.execute(
-                    sa_select(NormalizedCitation.normalized_sha1, NormalizedCitation.id)
-                    .where(NormalizedCitation.normalized_sha1.in_(chunk))
-                ).all()
-                sha1_to_id.update({s: i for s, i in result})
-
-        cleaned = []
-        for r in batch:
-            norm_id = sha1_to_id.get(r.get('normalized_sha1'))
-            if norm_id is None:
-                continue
-            cleaned.append({
-                'page_id': r['page_id'],
-                'raw_sha1': r['raw_sha1'],
-                'normalized_id': norm_id,
-                'reference_type': r.get('reference_type', 0),
-                'reference_name': r.get('reference_name'),
-            })
-
-        if cleaned:
-            CitationInstance.bulk_upsert(session, cleaned)
-            count += len(cleaned)
+    for batch in checkpointed_batches(session, 'citation_instances', filepath, row_groups):
+        copy_batch(session, stage, batch)
+        resolve(session)
+        count += sum(session.execute(stmt).rowcount for stmt in statements)
     log(f"citation_instances: {count} rows loaded")
     session.commit()
 
 
-def load_revisions(session, staging_dir):
+def load_revisions(session, staging_dir, row_groups=None):
     filepath = find_deduped_parquet(staging_dir, 'revisions')
     if not filepath:
         return
-    log(f"revisions: loading from {filepath}")
+    log(f"revisions: loading from {describe_source(filepath, row_groups)}")
+
+    stage = _revisions_stage
+    select_stmt = sa_select(
+        stage.c.revision_id, stage.c.page_id, stage.c.parent_revision_id, stage.c.revision_timestamp
+    ).distinct(stage.c.revision_id)
+    stmt = insert(Revision).from_select(
+        ['revision_id', 'page_id', 'parent_revision_id', 'revision_timestamp'], select_stmt
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['revision_id'],
+        set_={
+            'page_id': stmt.excluded.page_id,
+            'parent_revision_id': stmt.excluded.parent_revision_id,
+            'revision_timestamp': stmt.excluded.revision_timestamp,
+        }
+    )
 
     count = 0
-    for batch in read_parquet_batches(filepath):
-        # Ensure every row has parent_revision_id (even if None) so
-        # SQLAlchemy multi-row INSERT sees consistent columns.
-        for row in batch:
-            row.setdefault('parent_revision_id', None)
-        stmt = insert(Revision).values(batch)
-        stmt = stmt.on_conflict_do_update(
-            index_elements=['revision_id'],
-            set_={
-                'page_id': stmt.excluded.page_id,
-                'parent_revision_id': stmt.excluded.parent_revision_id,
-                'revision_timestamp': stmt.excluded.revision_timestamp,
-            }
-        )
-        session.execute(stmt)
-        count += len(batch)
+    for batch in checkpointed_batches(session, 'revisions', filepath, row_groups):
+        copy_batch(session, stage, batch)
+        count += session.execute(stmt).rowcount
     log(f"revisions: {count} rows loaded")
     session.commit()
 
 
-def load_citation_histories(session, staging_dir):
-    """Load citation histories. Resolves (page_id, raw_sha1) -> citation_instance_id."""
+def load_citation_histories(session, staging_dir, row_groups=None):
+    """Load citation histories, resolving (page_id, raw_sha1) -> citation_instance_id
+    with a server-side join against citation_instances."""
     filepath = find_deduped_parquet(staging_dir, 'citation_histories')
     if not filepath:
         return
-    log(f"citation_histories: loading from {filepath}")
+    log(f"citation_histories: loading from {describe_source(filepath, row_groups)}")
+
+    stage = _citation_histories_stage
+    select_stmt = (
+        sa_select(CitationInstance.id.label('citation_instance_id'), stage.c.revision_id)
+        .select_from(stage)
+        .join(CitationInstance, (CitationInstance.page_id == stage.c.page_id)
+              & (CitationInstance.raw_sha1 == stage.c.raw_sha1))
+    )
+    resolve, targets = partition_selects(session, CitationHistory.__table__, select_stmt,
+                                         _citation_histories_resolved)
+    statements = [
+        insert(target).from_select(['citation_instance_id', 'revision_id'], select).on_conflict_do_nothing()
+        for target, select in targets
+    ]
 
     count = 0
     skipped = 0
-    for batch in read_parquet_batches(filepath):
-        # Resolve (page_id, raw_sha1) -> citation_instance_id
-        keys = list(set((r['page_id'], r['raw_sha1']) for r in batch))
-        key_to_id = {}
-        if keys:
-            from sqlalchemy import tuple_
-            for chunk in chunked_iterable(keys, 1000):
-                result = session.execute(
-                    sa_select(CitationInstance.page_id, CitationInstance.raw_sha1, CitationInstance.id)
-                    .where(tuple_(CitationInstance.page_id, CitationInstance.raw_sha1).in_(chunk))
-                ).all()
-                key_to_id.update({(p, s): i for p, s, i in result})
-
-        cleaned = []
-        for r in batch:
-            ci_id = key_to_id.get((r['page_id'], r['raw_sha1']))
-            if ci_id is None:
-                skipped += 1
-                continue
-            cleaned.append({
-                'citation_instance_id': ci_id,
-                'revision_id': r['revision_id'],
-            })
-
-        if cleaned:
-            stmt = insert(CitationHistory).values(cleaned).on_conflict_do_nothing()
-            session.execute(stmt)
-            count += len(cleaned)
+    for batch in checkpointed_batches(session, 'citation_histories', filepath, row_groups):
+        copy_batch(session, stage, batch)
+        resolve(session)
+        inserted = sum(session.execute(stmt).rowcount for stmt in statements)
+        count += inserted
+        skipped += batch.num_rows - inserted
 
     if skipped:
-        log(f"citation_histories: warning: {skipped} rows skipped (no matching citation_instance)")
+        log(f"citation_histories: warning: {skipped} rows skipped "
+            f"(no matching citation_instance, or already loaded)")
     log(f"citation_histories: {count} rows loaded")
     session.commit()
 
 
-def load_ncwr(session, staging_dir):
-    """Load normalized_citation_web_resources. Resolves normalized_sha1 -> normalized_id and url -> web_resource_id."""
+def attach_citation_instance_partitions(session, staging_dir):
+    """Attach citation_instances partitions that were loaded detached, so that
+    citation_histories can resolve ids through the parent table."""
+    conn = session.connection()
+    if is_partitioned(conn, 'citation_instances'):
+        attached = attach_partitions(conn, 'citation_instances')
+        if attached:
+            log(f"citation_instances: {attached} partition(s) attached")
+    session.commit()
+
+
+def report_detached_partitions(session, staging_dir):
+    conn = session.connection()
+    if is_partitioned(conn, 'citation_history'):
+        detached = detached_partitions(conn, 'citation_history')
+        if detached:
+            log(f"citation_histories: {len(detached)} citation_history partition(s) loaded detached; "
+                f"run init_db.py --add-indexes to index and attach them")
+
+
+def citation_history_source(session):
+    """Return a FROM clause over every citation_history row, including rows in
+    partitions that are still detached."""
+    conn = session.connection()
+    detached = detached_partitions(conn, 'citation_history') if is_partitioned(conn, 'citation_history') else []
+    if not detached:
+        return CitationHistory.__table__.alias('history')
+    parts = [CitationHistory.__table__] + [
+        sa_table(name, sa_column('citation_instance_id'), sa_column('revision_id')) for name, _ in detached
+    ]
+    return union_all(*[
+        sa_select(t.c.citation_instance_id, t.c.revision_id) for t in parts
+    ]).subquery('history')
+
+
+def revision_watermark(session, table_name):
+    """Return (covered, upper): the highest revision_id a derived table was last
+    built for (0 if never) and the highest revision_id loaded now."""
+    marker = session.execute(
+        sa_select(LoadProgress.source)
+        .where(LoadProgress.table_name == table_name)
+        .where(LoadProgress.row_group == LoadProgress.TABLE_COMPLETE)
+    ).scalar()
+    upper = session.execute(sa_select(sa_func.max(Revision.revision_id))).scalar()
+    return (int(marker) if marker else 0), upper
+
+
+def citation_instance_stats_select(history, where):
+    """SELECT the citation_instance_stats rows of the citation instances matching `where`."""
+    h = history.c
+    return (
+        sa_select(h.citation_instance_id,
+                  sa_func.min(Revision.revision_id), sa_func.min(Revision.revision_timestamp),
+                  sa_func.max(Revision.revision_id), sa_func.max(Revision.revision_timestamp),
+                  sa_func.count())
+        .select_from(history)
+        .join(Revision, Revision.revision_id == h.revision_id)
+        .where(where(h))
+        .group_by(h.citation_instance_id)
+    )
+
+
+def load_citation_instance_stats(session, staging_dir, row_groups=None):
+    """Build or update citation_instance_stats from citation_history.
+
+    The load_progress marker for this table records the highest revision_id the
+    stats cover. Without one, stats are built from scratch in ranges of
+    citation_instance_id, one transaction each. Otherwise only citation instances
+    with history rows in newer revisions are recomputed. Stats rows are always
+    recomputed in full rather than incremented, so re-running after a failure is
+    safe. History rows added for revisions at or below the marker (backfills)
+    are only picked up by a rebuild: load_all.py --restart --tables citation_instance_stats.
+    """
+    covered, upper = revision_watermark(session, 'citation_instance_stats')
+    if upper is None or upper <= covered:
+        log(f"citation_instance_stats: up to date (revision_id <= {covered})")
+        return
+
+    count = 0
+    if not covered:
+        log("citation_instance_stats: building from scratch")
+        low, high = session.execute(sa_select(sa_func.min(CitationInstance.id), sa_func.max(CitationInstance.id))).one()
+        for start in range(low or 0, (high or -1) + 1, STATS_CHUNK_SIZE):
+            end = start + STATS_CHUNK_SIZE
+            select_stmt = citation_instance_stats_select(
+                citation_history_source(session),
+                lambda h: (h.citation_instance_id >= start) & (h.citation_instance_id < end),
+            )
+            count += session.execute(CitationInstanceStats.upsert_from_select(select_stmt)).rowcount
+            session.commit()
+    else:
+        log(f"citation_instance_stats: updating for revisions {covered + 1}-{upper}")
+        touched = citation_history_source(session)
+        touched_ids = (
+            sa_select(touched.c.citation_instance_id)
+            .where(touched.c.revision_id > covered, touched.c.revision_id <= upper)
+        )
+        select_stmt = citation_instance_stats_select(
+            citation_history_source(session),
+            lambda h: h.citation_instance_id.in_(touched_ids),
+        )
+        count = session.execute(CitationInstanceStats.upsert_from_select(select_stmt)).rowcount
+
+    LoadProgress.upsert(session, table_name='citation_instance_stats',
+                        row_group=LoadProgress.TABLE_COMPLETE, source=str(upper))
+    log(f"citation_instance_stats: {count} rows written")
+    session.commit()
+
+
+def normalized_citation_pages_select(where):
+    """SELECT the normalized_citation_pages rows of the pages matching `where`,
+    which is applied to citation_instances.page_id."""
+    latest = (
+        sa_select(sa_func.max(Revision.revision_id))
+        .where(Revision.page_id == CitationInstance.page_id)
+        .scalar_subquery()
+    )
+    last_seen = sa_func.max(CitationInstanceStats.last_seen_id)
+    return (
+        sa_select(CitationInstance.normalized_id, CitationInstance.page_id,
+                  sa_func.min(CitationInstanceStats.first_seen_id), last_seen,
+                  sa_func.coalesce(last_seen == sa_func.max(latest), False))
+        .join(CitationInstanceStats, CitationInstanceStats.citation_instance_id == CitationInstance.id)
+        .where(where(CitationInstance.page_id))
+        .group_by(CitationInstance.normalized_id, CitationInstance.page_id)
+    )
+
+
+def load_normalized_citation_pages(session, staging_dir, row_groups=None):
+    """Build or update normalized_citation_pages from citation_instances and
+    citation_instance_stats.
+
+    Like citation_instance_stats, the load_progress marker records the highest
+    revision_id covered. Without one, the table is built in ranges of page_id,
+    one transaction each. Otherwise every row of the pages that have newer
+    revisions is recomputed, since a new revision can also remove a citation
+    from its page's latest revision.
+    """
+    covered, upper = revision_watermark(session, 'normalized_citation_pages')
+    if upper is None or upper <= covered:
+        log(f"normalized_citation_pages: up to date (revision_id <= {covered})")
+        return
+
+    count = 0
+    if not covered:
+        log("normalized_citation_pages: building from scratch")
+        low, high = session.execute(
+            sa_select(sa_func.min(CitationInstance.page_id), sa_func.max(CitationInstance.page_id))
+        ).one()
+        for start in range(low or 0, (high or -1) + 1, PAGES_CHUNK_SIZE):
+            end = start + PAGES_CHUNK_SIZE
+            select_stmt = normalized_citation_pages_select(lambda page_id: (page_id >= start) & (page_id < end))
+            count += session.execute(NormalizedCitationPage.upsert_from_select(select_stmt)).rowcount
+            session.commit()
+    else:
+        log(f"normalized_citation_pages: updating pages with revisions {covered + 1}-{upper}")
+        touched_pages = (
+            sa_select(Revision.page_id)
+            .where(Revision.revision_id > covered, Revision.revision_id <= upper)
+        )
+        select_stmt = normalized_citation_pages_select(lambda page_id: page_id.in_(touched_pages))
+        count = session.execute(NormalizedCitationPage.upsert_from_select(select_stmt)).rowcount
+
+    LoadProgress.upsert(session, table_name='normalized_citation_pages',
+                        row_group=LoadProgress.TABLE_COMPLETE, source=str(upper))
+    log(f"normalized_citation_pages: {count} rows written")
+    session.commit()
+
+
+def document_primary_url_select():
+    """SELECT (document_id, url) of the lowest-id web resource of every linked document."""
+    return (
+        sa_select(WebResource.instance_of_document, WebResource.url)
+        .where(WebResource.instance_of_document.isnot(None))
+        .distinct(WebResource.instance_of_document)
+        .order_by(WebResource.instance_of_document, WebResource.id)
+    )
+
+
+def load_document_primary_url(session, staging_dir, row_groups=None):
+    """Rebuild document_primary_url from web_resources in one pass. Rows whose URL
+    is unchanged are left alone, so readers see no churn on a reload."""
+    count = session.execute(DocumentPrimaryUrl.upsert_from_select(document_primary_url_select())).rowcount
+    log(f"document_primary_url: {count} rows written")
+    session.commit()
+
+
+def template_value_counts_select(min_count):
+    """SELECT the citation count of every template parameter value used by at
+    least `min_count` normalized citations."""
+    value_md5 = sa_func.md5(TemplateData.parameter_value)
+    citations = sa_func.count(TemplateData.normalized_id.distinct())
+    return (
+        sa_select(TemplateData.wiki_template_id, TemplateData.parameter_key_md5, value_md5, citations)
+        .where(TemplateData.parameter_value.isnot(None))
+        .group_by(TemplateData.wiki_template_id, TemplateData.parameter_key_md5, value_md5)
+        .having(citations >= min_count)
+    )
+
+
+def load_template_value_counts(session, staging_dir, row_groups=None):
+    """Rebuild template_value_counts from template_data in one pass and one
+    transaction. The counts are staged first; rows whose value is gone or now
+    used by fewer than TEMPLATE_VALUE_COUNT_MIN citations are deleted, and
+    counts that are unchanged are left alone."""
+    stage = _template_value_counts_stage
+    conn = session.connection()
+    stage.create(conn, checkfirst=True)
+    conn.execute(text(f"TRUNCATE {stage.name}"))
+    conn.execute(insert(stage).from_select(
+        [c.name for c in stage.columns], template_value_counts_select(TEMPLATE_VALUE_COUNT_MIN)))
+
+    counts = TemplateValueCount.__table__
+    staged = (
+        sa_select(stage.c.wiki_template_id)
+        .where(stage.c.wiki_template_id == counts.c.wiki_template_id,
+               stage.c.parameter_key_md5 == counts.c.parameter_key_md5,
+               stage.c.parameter_value_md5 == counts.c.parameter_value_md5)
+        .exists()
+    )
+    deleted = session.execute(sa_delete(counts).where(~staged)).rowcount
+    count = session.execute(TemplateValueCount.upsert_from_select(sa_select(*stage.c))).rowcount
+    log(f"template_value_counts: {count} rows written, {deleted} deleted")
+    session.commit()
+
+
+def template_parameter_sketches(batches, capacity):
+    """Count template parameter values in an iterable of template_data RecordBatches.
+
+    Returns {(domain_label, template_name, parameter_key): SpaceSaving}. Each batch
+    is first grouped by value in Arrow, so the sketches see one weighted update
+    per distinct value in the batch rather than one per row.
+    """
+    sketches = {}
+    group_columns = ['domain_label', 'template_name', 'parameter_key', 'parameter_value']
+    for batch in batches:
+        grouped = (
+            pa.Table.from_batches([batch])
+            .filter(pc.is_valid(batch.column('parameter_value')))
+            .group_by(group_columns)
+            .aggregate([('parameter_key', 'count')])
+        )
+        for label, name, key, value, count in zip(*(grouped.column(c).to_pylist() for c in group_columns),
+                                                  grouped.column('parameter_key_count').to_pylist()):
+            sketch = sketches.get((label, name, key))
+            if sketch is None:
+                sketch = sketches[(label, name, key)] = SpaceSaving(capacity)
+            sketch.add(value, count)
+    return sketches
+
+
+def load_template_parameter_stats(session, staging_dir, row_groups=None):
+    """Recompute template_parameter_stats from the deduped template_data file.
+
+    The Parquet file is read in one pass, so the database only serves the
+    template name lookups and the final writes. Values are counted per template
+    parameter with a SpaceSaving sketch of 10 * TEMPLATE_STATS_TOP_K counters, so
+    memory does not grow with the number of distinct values. The table is replaced
+    in one transaction, and the load_progress marker records the file it was
+    computed from, so an unchanged file is not read again.
+    """
+    filepath = find_deduped_parquet(staging_dir, 'template_data')
+    if not filepath:
+        return
+    source = parquet_fingerprint(filepath)
+    if session.execute(
+        sa_select(LoadProgress.row_group)
+        .where(LoadProgress.table_name == 'template_parameter_stats')
+        .where(LoadProgress.row_group == LoadProgress.TABLE_COMPLETE)
+        .where(LoadProgress.source == source)
+    ).first() is not None:
+        log("template_parameter_stats: template_data is unchanged, skipping")
+        return
+    log(f"template_parameter_stats: counting values in {filepath}")
+
+    batches = read_parquet_batches(
+        filepath, batch_size=TEMPLATE_STATS_BATCH_SIZE,
+        columns=['domain_label', 'template_name', 'parameter_key', 'parameter_value'],
+    )
+    sketches = template_parameter_sketches(batches, 10 * TEMPLATE_STATS_TOP_K)
+
+    labels = {label for label, _, _ in sketches}
+    template_ids = {
+        (label, name): template_id
+        for label, name, template_id in session.execute(
+            sa_select(Domain.value, WikiTemplate.name, WikiTemplate.id)
+            .join(Domain, Domain.id == WikiTemplate.domain)
+            .where(Domain.value.in_(list(labels)))
+        )
+    } if labels else {}
+
+    rows = []
+    for (label, name, key), sketch in sketches.items():
+        template_id = template_ids.get((label, name))
+        if template_id is None:
+            continue
+        key_md5 = hashlib.md5(key.encode('utf-8')).hexdigest()
+        for rank, (value, count, error) in enumerate(sketch.top(TEMPLATE_STATS_TOP_K), 1):
+            rows.append({
+                'wiki_template_id': template_id, 'parameter_key_md5': key_md5, 'rank': rank,
+                'parameter_key': key, 'parameter_value': value,
+                'value_count': count, 'count_error': error, 'key_count': sketch.total,
+            })
+
+    session.execute(sa_delete(TemplateParameterStat))
+    for chunk in chunked_iterable(rows, BATCH_SIZE):
+        session.execute(insert(TemplateParameterStat), chunk)
+    LoadProgress.upsert(session, table_name='template_parameter_stats',
+                        row_group=LoadProgress.TABLE_COMPLETE, source=source)
+    log(f"template_parameter_stats: {len(rows)} values of {len(sketches)} template parameters written")
+    session.commit()
+
+
+def load_ncwr(session, staging_dir, row_groups=None):
+    """Load normalized_citation_web_resources, resolving normalized_sha1 -> normalized_id
+    and url -> web_resource_id with server-side joins."""
     filepath = find_deduped_parquet(staging_dir, 'ncwr')
     if not filepath:
         return
-    log(f"ncwr: loading from {filepath}")
+    log(f"ncwr: loading from {describe_source(filepath, row_groups)}")
+
+    stage = _ncwr_stage
+    select_stmt = (
+        sa_select(NormalizedCitation.id, WebResource.id)
+        .select_from(stage)
+        .join(NormalizedCitation, NormalizedCitation.normalized_sha1 == stage.c.normalized_sha1)
+        # url_hash is the unique key on web_resources; the url comparison guards against collisions
+        .join(WebResource, (WebResource.url_hash == sa_func.md5(stage.c.url))
+              & (WebResource.url == stage.c.url))
+    )
+    stmt = insert(NormalizedCitationWebResource).from_select(
+        ['normalized_id', 'web_resource_id'], select_stmt
+    ).on_conflict_do_nothing()
 
     count = 0
-    for batch in read_parquet_batches(filepath):
-        # Resolve URLs to web_resource_ids
-        urls = list(set(r['url'] for r in batch))
-        url_to_id = {}
-        for chunk in chunked_iterable(urls, 1000):
-            result = session.execute(
-                sa_select(WebResource.url, WebResource.id).where(WebResource.url.in_(chunk))
-            ).all()
-            url_to_id.update({u: i for u, i in result})
-
-        # Resolve normalized_sha1 -> normalized_id
-        sha1s = list(set(r['normalized_sha1'] for r in batch))
-        sha1_to_id = {}
-        for chunk in chunked_iterable(sha1s, 1000):
-            result = session.execute(
-                sa_select(NormalizedCitation.normalized_sha1, NormalizedCitation.id)
-                .where(NormalizedCitation.normalized_sha1.in_(chunk))
-            ).all()
-            sha1_to_id.update({s: i for s, i in result})
-
-        cleaned = []
-        for r in batch:
-            wr_id = url_to_id.get(r['url'])
-            norm_id = sha1_to_id.get(r['normalized_sha1'])
-            if wr_id is not None and norm_id is not None:
-                cleaned.append({
-                    'normalized_id': norm_id,
-                    'web_resource_id': wr_id,
-                })
-        if cleaned:
-            NormalizedCitationWebResource.bulk_upsert(session, cleaned)
-            count += len(cleaned)
+    for batch in checkpointed_batches(session, 'ncwr', filepath, row_groups):
+        copy_batch(session, stage, batch)
+        count += session.execute(stmt).rowcount
     log(f"ncwr: {count} rows loaded")
     session.commit()
 
 
-def load_template_data(session, staging_dir):
+def load_template_data(session, staging_dir, row_groups=None):
+    """Load template parameters, resolving the domain, template and normalized citation
+    with server-side joins."""
     filepath = find_deduped_parquet(staging_dir, 'template_data')
     if not filepath:
         return
-    log(f"template_data: loading from {filepath}")
+    log(f"template_data: loading from {describe_source(filepath, row_groups)}")
+
+    stage = _template_data_stage
+    parameter_key_md5 = sa_func.md5(stage.c.parameter_key)
+    select_stmt = (
+        sa_select(WikiTemplate.id, NormalizedCitation.id, stage.c.offset_start,
+                  stage.c.parameter_key, parameter_key_md5, stage.c.parameter_value)
+        .select_from(stage)
+        .join(Domain, Domain.value == stage.c.domain_label)
+        # Match on md5(name) so the lookup uses the (domain, md5(name)) unique index
+        .join(WikiTemplate, (WikiTemplate.domain == Domain.id)
+              & (sa_func.md5(WikiTemplate.name) == sa_func.md5(stage.c.template_name))
+              & (WikiTemplate.name == stage.c.template_name))
+        .join(NormalizedCitation, NormalizedCitation.normalized_sha1 == stage.c.normalized_sha1)
+        .distinct(WikiTemplate.id, NormalizedCitation.id, stage.c.offset_start, parameter_key_md5)
+    )
+    stmt = insert(TemplateData).from_select(
+        ['wiki_template_id', 'normalized_id', 'offset_start', 'parameter_key',
+         'parameter_key_md5', 'parameter_value'], select_stmt
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['wiki_template_id', 'normalized_id', 'offset_start', 'parameter_key_md5'],
+        set_={'parameter_value': stmt.excluded.parameter_value}
+    )
 
     count = 0
-    for batch in read_parquet_batches(filepath):
-        # Resolve domain labels and template names to ids
-        domain_labels = set(r['domain_label'] for r in batch)
-        domain_to_id = {}
-        if domain_labels:
-            result = session.execute(
-                sa_select(Domain.value, Domain.id).where(Domain.value.in_(list(domain_labels)))
-            ).all()
-            domain_to_id = {v: i for v, i in result}
+    for batch in checkpointed_batches(session, 'template_data', filepath, row_groups):
+        copy_batch(session, stage, batch)
+        count += session.execute(stmt).rowcount
+    log(f"template_data: {count} rows loaded")
+    session.commit()
 
-        # Resolve template ids
-        tpl_keys = set()
-        for r in batch:
-            dom_id = domain_to_id.get(r['domain_label'])
-            if dom_id is not None:
-                tpl_keys.add((dom_id, r['template_name']))
 
-        template_key_to_id = {}
-        if tpl_keys:
-            from sqlalchemy import tuple_
-            result = session.execute(
-                sa_select(WikiTemplate.domain, WikiTemplate.name, WikiTemplate.id)
-                .where(tuple_(WikiTemplate.domain, WikiTemplate.name).in_(list(tpl_keys)))
-            ).all()
-            template_key_to_id = {(d, n): i for d, n, i in result}
+# ---------------------------------------------------------------------------
+# Phase scheduling
+# ---------------------------------------------------------------------------
 
-        # Resolve normalized_sha1 -> normalized_id
-        sha1s = list(set(r['normalized_sha1'] for r in batch))
-        sha1_to_id = {}
-        for chunk in chunked_iterable(sha1s, 1000):
-            result = session.execute(
-                sa_select(NormalizedCitation.normalized_sha1, NormalizedCitation.id)
-                .where(NormalizedCitation.normalized_sha1.in_(chunk))
-            ).all()
-            sha1_to_id.update({s: i for s, i in result})
+# name -> (label, loader, phases it depends on)
+PHASES = OrderedDict([
+    ('containers',          ('Phase 1:  containers',          load_containers,           [])),
+    ('domains',             ('Phase 2:  domains',             load_domains,              ['containers'])),
+    ('documents',           ('Phase 3:  documents',           load_documents,            ['containers', 'domains'])),
+    ('web_resources',       ('Phase 4:  web_resources',       load_web_resources,        ['domains', 'documents'])),
+    ('wiki_templates',      ('Phase 5:  wiki_templates',      load_wiki_templates,       ['domains'])),
+    ('normalized_citations',('Phase 6:  normalized_citations', load_normalized_citations, ['domains', 'documents'])),
+    ('citation_instances',  ('Phase 7:  citation_instances',  load_citation_instances,   ['normalized_citations'])),
+    ('revisions',           ('Phase 8:  revisions',           load_revisions,            [])),
+    ('citation_histories',  ('Phase 9:  citation_histories',  load_citation_histories,   ['citation_instances', 'revisions'])),
+    ('ncwr',                ('Phase 10: ncwr',                load_ncwr,                 ['web_resources', 'normalized_citations'])),
+    ('template_data',       ('Phase 11: template_data',       load_template_data,        ['wiki_templates', 'normalized_citations'])),
+    ('citation_instance_stats', ('Phase 12: citation_instance_stats', load_citation_instance_stats,
+                                 ['citation_histories', 'revisions'])),
+    ('document_primary_url', ('Phase 13: document_primary_url', load_document_primary_url,
+                              ['web_resources'])),
+    ('normalized_citation_pages', ('Phase 14: normalized_citation_pages', load_normalized_citation_pages,
+                                   ['citation_instance_stats'])),
+    ('template_value_counts', ('Phase 15: template_value_counts', load_template_value_counts,
+                               ['template_data'])),
+    ('template_parameter_stats', ('Phase 16: template_parameter_stats', load_template_parameter_stats,
+                                  ['template_data'])),
+])
+
+# Phases whose rows are independent of each other once deduplicated, so their
+# Parquet row groups can be split across connections and loaded concurrently.
+PARTITIONED_PHASES = {
+    'documents', 'web_resources', 'normalized_citations', 'citation_instances',
+    'revisions', 'citation_histories', 'ncwr', 'template_data',
+}
+
+# Steps that run once, on their own connection, after every partition of a phase has committed.
+PHASE_FINALIZERS = {
+    'web_resources': link_web_resources_to_documents,
+    'citation_instances': attach_citation_instance_partitions,
+    'citation_histories': report_detached_partitions,
+}
+
+
+def plan_partitions(name, staging_dir, jobs):
+    """Return the row-group ranges a phase is split into (None means the whole file)."""
+    if jobs <= 1 or name not in PARTITIONED_PHASES:
+        return [None]
+    filepath = find_deduped_parquet(staging_dir, name)
+    if not filepath:
+        return [None]
+    num_row_groups = pq.ParquetFile(filepath).num_row_groups
+    if num_row_groups <= 1:
+        return [None]
+    return split_row_groups(num_row_groups, jobs)
 
-        cleaned = []
-        for r in batch:
-            dom_id = domain_to_id.get(r['domain_label'])
-            if dom_id is None:
-                continue
-            tpl_id = template_key_to_id.get((dom_id, r['template_name']))
-            if tpl_id is None:
-                continue
-            norm_id = sha1_to_id.get(r['normalized_sha1'])
-            if norm_id is None:
-                continue
-            cleaned.append({
-                'wiki_template_id': tpl_id,
-                'normalized_id': norm_id,
-                'offset_start': r['offset_start'],
-                'parameter_key': r['parameter_key'],
-                'parameter_value': r.get('parameter_value'),
-            })
 
-        if cleaned:
-            TemplateData.bulk_upsert(session, cleaned)
-            count += len(cleaned)
-    log(f"template_data: {count} rows loaded")
-    session.commit()
+def run_task(fn, staging_dir, **kwargs):
+    """Run one loader (or finalizer) call in its own session and transaction."""
+    session = Session()
+    try:
+        fn(session, staging_dir, **kwargs)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def run_phases(names, staging_dir, jobs):
+    """Run the given phases on up to `jobs` concurrent connections.
+
+    A phase starts once every phase it depends on (among those selected) has
+    finished, so independent phases overlap. Partitioned phases are split
+    into contiguous row-group ranges, each loaded and committed on its own
+    connection.
+
+    Progress is checkpointed in load_progress: completed row groups are
+    skipped when a load is restarted, and tables whose current Parquet file
+    has been fully loaded are skipped altogether.
+    """
+    selected = set(names)
+    pending = list(names)
+    done = set()
+    outstanding = {}  # phase -> number of unfinished tasks
+    finalized = set()
+    ready = []        # (phase, fn, kwargs) waiting for a free connection
+    running = {}      # future -> phase
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or ready or running:
+            for name in list(pending):
+                label, loader, depends_on = PHASES[name]
+                if all(d in done or d not in selected for d in depends_on):
+                    pending.remove(name)
+                    log(label)
+                    if is_table_loaded(name, staging_dir):
+                        log(f"{name}: already loaded, skipping")
+                        done.add(name)
+                        continue
+                    partitions = plan_partitions(name, staging_dir, jobs)
+                    if len(partitions) > 1:
+                        log(f"{name}: split into {len(partitions)} partitions")
+                    outstanding[name] = len(partitions)
+                    ready.extend((name, loader, {'row_groups': p}) for p in partitions)
+
+            while ready and len(running) < jobs:
+                name, fn, kwargs = ready.pop(0)
+                running[pool.submit(run_task, fn, staging_dir, **kwargs)] = name
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                future.result()  # re-raise loader errors
+                outstanding[name] -= 1
+                if outstanding[name]:
+                    continue
+                finalizer = PHASE_FINALIZERS.get(name)
+                if finalizer is not None and name not in finalized:
+                    finalized.add(name)
+                    outstanding[name] = 1
+                    ready.append((name, finalizer, {}))
+                else:
+                    mark_table_loaded(name, staging_dir)
+                    done.add(name)
 
 
 # ---------------------------------------------------------------------------
@@ -537,54 +1265,46 @@ def main():
                         help='Staging directory (default: STAGING_DIR env or ./staging)')
     parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
                         help=f'Rows per INSERT batch (default: {BATCH_SIZE})')
-
-    all_phases = OrderedDict([
-        ('containers',          ('Phase 1:  containers',          lambda s, d, ctx: load_containers(s, d))),
-        ('domains',             ('Phase 2:  domains',             lambda s, d, ctx: load_domains(s, d))),
-        ('documents',           ('Phase 3:  documents',           lambda s, d, ctx: ctx.update(page_to_doc_id=load_documents(s, d)))),
-        ('web_resources',       ('Phase 4:  web_resources',       lambda s, d, ctx: load_web_resources(s, d, ctx.get('page_to_doc_id', {})))),
-        ('wiki_templates',      ('Phase 5:  wiki_templates',      lambda s, d, ctx: load_wiki_templates(s, d))),
-        ('normalized_citations',('Phase 6:  normalized_citations', lambda s, d, ctx: load_normalized_citations(s, d, ctx.get('page_to_doc_id', {})))),
-        ('citation_instances',  ('Phase 7:  citation_instances',  lambda s, d, ctx: load_citation_instances(s, d))),
-        ('revisions',           ('Phase 8:  revisions',           lambda s, d, ctx: load_revisions(s, d))),
-        ('citation_histories',  ('Phase 9:  citation_histories',  lambda s, d, ctx: load_citation_histories(s, d))),
-        ('ncwr',                ('Phase 10: ncwr',                lambda s, d, ctx: load_ncwr(s, d))),
-        ('template_data',       ('Phase 11: template_data',       lambda s, d, ctx: load_template_data(s, d))),
-    ])
-
+    parser.add_argument('-j', '--jobs', type=int, default=JOBS,
+                        help='Number of concurrent database connections; independent phases and '
+                             f'row-group partitions of large tables load in parallel (default: {JOBS})')
+    parser.add_argument('--restart', action='store_true',
+                        help='Ignore load_progress checkpoints and reload the selected tables from scratch')
     parser.add_argument('--tables', nargs='+', metavar='TABLE',
-                        choices=list(all_phases.keys()),
+                        choices=list(PHASES.keys()),
                         help='Load only the specified table(s). '
-                             f'Choices: {" ".join(all_phases.keys())}')
+                             f'Choices: {" ".join(PHASES.keys())}')
     args = parser.parse_args()
 
     staging_dir = args.staging_dir
     if not os.path.isdir(staging_dir):
         raise SystemExit(f"Staging directory does not exist: {staging_dir}")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
 
     BATCH_SIZE = args.batch_size
 
-    session = Session()
     t0 = time.time()
-
-    phases_to_run = OrderedDict(
-        (k, all_phases[k]) for k in (args.tables if args.tables else all_phases)
-    )
-
-    try:
-        ctx = {}  # shared context (e.g. page_to_doc_id) between phases
-        for name, (label, loader) in phases_to_run.items():
-            log(label)
-            loader(session, staging_dir, ctx)
-
-        elapsed = time.time() - t0
-        log(f"Done. Total elapsed: {elapsed:.1f}s")
-
-    except Exception:
-        session.rollback()
-        raise
-    finally:
-        session.close()
+    names = [k for k in PHASES if not args.tables or k in args.tables]
+    LoadProgress.__table__.create(Engine, checkfirst=True)
+    DataGeneration.__table__.create(Engine, checkfirst=True)
+    CitationInstanceStats.__table__.create(Engine, checkfirst=True)
+    DocumentPrimaryUrl.__table__.create(Engine, checkfirst=True)
+    NormalizedCitationPage.__table__.create(Engine, checkfirst=True)
+    TemplateValueCount.__table__.create(Engine, checkfirst=True)
+    TemplateParameterStat.__table__.create(Engine, checkfirst=True)
+    if args.restart:
+        reset_progress(names)
+    run_phases(names, staging_dir, args.jobs)
+
+    # Tell the web application's caches that the data has changed
+    with Session() as session:
+        generation = DataGeneration.bump(session)
+        session.commit()
+    log(f"Data generation is now {generation}")
+
+    elapsed = time.time() - t0
+    log(f"Done. Total elapsed: {elapsed:.1f}s")
 
 
 if __name__ == '__main__':
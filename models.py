@@ -1,5 +1,5 @@
 import hashlib
-from sqlalchemy import Column, Index, Integer, BigInteger, String, CHAR, ForeignKey, Text, UniqueConstraint, PrimaryKeyConstraint, select, func
+from sqlalchemy import Boolean, Column, Index, Integer, BigInteger, String, CHAR, DateTime, ForeignKey, Text, UniqueConstraint, PrimaryKeyConstraint, select, func, inspect
 from sqlalchemy.types import SmallInteger
 from sqlalchemy.orm import relationship, Session
 from sqlalchemy.ext.declarative import declarative_base
@@ -36,6 +36,26 @@ class Document(Base):
         result = session.execute(stmt).scalar_one()
         return result
 
+    @staticmethod
+    def reserve_ids(session: Session, count: int):
+        # Reserve a block of ids from the documents id sequence in a single round trip, so
+        # bulk loaders can insert many Documents with explicit ids instead of one
+        # INSERT ... RETURNING per row.
+        if count <= 0:
+            return []
+        stmt = (
+            select(func.nextval(func.pg_get_serial_sequence('documents', 'id')))
+            .select_from(func.generate_series(1, count))
+        )
+        return list(session.execute(stmt).scalars())
+
+    @staticmethod
+    def bulk_insert(session: Session, rows):
+        # Rows must carry explicit ids (see reserve_ids). Do not commit here; caller manages transaction.
+        if not rows:
+            return
+        session.execute(insert(Document).values(rows))
+
 # "Web Resources" are individual web pages. Ideally, a Web Resource corresponds to a Document,
 # but in the initial step of building the database, a Web Resource may not necessarily be
 # correlated with a Document. Web archives are Web Resources of other Web Resources.
@@ -58,6 +78,12 @@ class WebResource(Base):
     def compute_url_hash(url: str) -> str:
         return hashlib.md5(url.encode('utf-8')).hexdigest()
 
+    @staticmethod
+    def url_matches(url: str):
+        # Look URLs up through the unique index on url_hash; url itself is not indexed.
+        # The url comparison guards against hash collisions.
+        return (WebResource.url_hash == WebResource.compute_url_hash(url)) & (WebResource.url == url)
+
     @staticmethod
     def upsert(session: Session, **kwargs):
         values = {k: v for k, v in kwargs.items() if k != 'id'}
@@ -140,6 +166,48 @@ class WebResource(Base):
         )
         session.execute(stmt)
 
+# "Wiki Pages" map a wiki article, identified by its Domain and numeric page ID, to the Document
+# that represents it. The mapping is persisted while loading Documents so that later load phases
+# and re-runs can resolve page IDs to Document IDs without rebuilding it in memory, and so that
+# reloading the same pages does not create duplicate Documents.
+class WikiPage(Base):
+    __tablename__ = 'wiki_pages'
+    domain_id = Column(Integer, ForeignKey('domains.id'), nullable=False)
+    page_id = Column(Integer, nullable=False)
+    document_id = Column(Integer, ForeignKey('documents.id'), nullable=False)
+
+    domain = relationship("Domain", foreign_keys=[domain_id])
+    document = relationship("Document", foreign_keys=[document_id])
+
+    __table_args__ = (
+        PrimaryKeyConstraint('domain_id', 'page_id', name='pk_wiki_pages'),
+        # Page ID lookups without a domain, e.g. the /api/v1/batch/articles endpoint
+        Index('idx_wiki_pages_page', 'page_id'),
+    )
+
+    @staticmethod
+    def document_id_of(page_id):
+        # Correlated subquery for the Document of a page ID. Citation instances and revisions
+        # carry the page ID without its wiki, so a page ID found on more than one domain is
+        # ambiguous and resolves to NULL rather than to another wiki's Document.
+        return (
+            select(func.min(WikiPage.document_id))
+            .where(WikiPage.page_id == page_id)
+            .having(func.count() == 1)
+            .scalar_subquery()
+        )
+
+    @staticmethod
+    def bulk_upsert(session: Session, rows):
+        if not rows:
+            return
+        # Sort by conflict key to ensure consistent lock ordering and prevent deadlocks
+        rows = sorted(rows, key=lambda r: (r.get('domain_id', 0), r.get('page_id', 0)))
+        stmt = insert(WikiPage).values(rows).on_conflict_do_nothing(
+            index_elements=['domain_id', 'page_id'],
+        )
+        session.execute(stmt)
+
 # "Domains" are domain names, like example.com, archive.org, or fremont.k12.ca.us. Web Resources
 # have exactly one Domain.
 class Domain(Base):
@@ -394,6 +462,8 @@ class Revision(Base):
 
     __table_args__ = (
         UniqueConstraint('revision_id', name='uix_revision_id'),
+        # Serves per-article revision listings in timestamp order (keyset pagination)
+        Index('idx_revisions_page_ts', 'page_id', 'revision_timestamp', 'revision_id'),
     )
 
     @staticmethod
@@ -525,12 +595,30 @@ class TemplateData(Base):
 
     __table_args__ = (
         PrimaryKeyConstraint('wiki_template_id', 'normalized_id', 'offset_start', 'parameter_key_md5', name='pk_template_param'),
+        # Parameter value lookups (template reports): values can be long, so they are indexed by md5
+        Index('idx_template_data_value', 'wiki_template_id', 'parameter_key_md5', func.md5(parameter_value)),
     )
 
+    @staticmethod
+    def compute_md5(value: str) -> str:
+        return hashlib.md5(value.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def value_matches(wiki_template_id: int, parameter_key: str, parameter_value: str):
+        # Look values up through idx_template_data_value. The key and value comparisons
+        # guard against hash collisions.
+        return (
+            (TemplateData.wiki_template_id == wiki_template_id)
+            & (TemplateData.parameter_key_md5 == TemplateData.compute_md5(parameter_key))
+            & (func.md5(TemplateData.parameter_value) == TemplateData.compute_md5(parameter_value))
+            & (TemplateData.parameter_key == parameter_key)
+            & (TemplateData.parameter_value == parameter_value)
+        )
+
     @staticmethod
     def _compute_key_md5(kwargs):
         if 'parameter_key' in kwargs and kwargs['parameter_key'] is not None:
-            kwargs['parameter_key_md5'] = hashlib.md5(kwargs['parameter_key'].encode()).hexdigest()
+            kwargs['parameter_key_md5'] = TemplateData.compute_md5(kwargs['parameter_key'])
 
     @staticmethod
     def upsert(session: Session, **kwargs):
@@ -572,6 +660,227 @@ class TemplateData(Base):
         session.execute(stmt)
 
 
+# "Citation Instance Stats" summarizes citation_history per CitationInstance: the first and last
+# revisions it appears in (by revision id and, separately, by timestamp) and the number of
+# revisions it appears in. It is built by load_all.py after citation_history is loaded so that
+# requests read one row per citation instead of aggregating its history. There is no foreign key
+# to citation_instances, whose id is not unique on its own when that table is partitioned.
+class CitationInstanceStats(Base):
+    __tablename__ = 'citation_instance_stats'
+    citation_instance_id = Column(BigInteger, primary_key=True)
+    first_seen_id = Column(BigInteger, nullable=False)
+    first_seen_ts = Column(String, nullable=False)
+    last_seen_id = Column(BigInteger, nullable=False)
+    last_seen_ts = Column(String, nullable=False)
+    appearance_count = Column(BigInteger, nullable=False)
+
+    @staticmethod
+    def upsert_from_select(select_stmt):
+        """INSERT ... SELECT of (citation_instance_id, first_seen_id, first_seen_ts, last_seen_id,
+        last_seen_ts, appearance_count) rows, replacing existing stats."""
+        columns = ['citation_instance_id', 'first_seen_id', 'first_seen_ts',
+                   'last_seen_id', 'last_seen_ts', 'appearance_count']
+        stmt = insert(CitationInstanceStats).from_select(columns, select_stmt)
+        return stmt.on_conflict_do_update(
+            index_elements=['citation_instance_id'],
+            set_={c: stmt.excluded[c] for c in columns[1:]},
+        )
+
+
+# "Normalized Citation Pages" lists the wiki pages each Normalized Citation has appeared on, with
+# the first and last revisions of the page it was seen in and whether it is present in the page's
+# latest revision. It is derived by load_all.py from citation_instances and citation_instance_stats
+# so that "which other articles cite this" is an index lookup rather than a DISTINCT over every
+# historical appearance of the citation.
+class NormalizedCitationPage(Base):
+    __tablename__ = 'normalized_citation_pages'
+    normalized_id = Column(Integer, primary_key=True)
+    page_id = Column(Integer, primary_key=True)
+    first_seen_rev = Column(BigInteger, nullable=False)
+    last_seen_rev = Column(BigInteger, nullable=False)
+    currently_present = Column(Boolean, nullable=False)
+
+    @staticmethod
+    def upsert_from_select(select_stmt):
+        """INSERT ... SELECT of (normalized_id, page_id, first_seen_rev, last_seen_rev,
+        currently_present) rows, replacing existing rows."""
+        columns = ['normalized_id', 'page_id', 'first_seen_rev', 'last_seen_rev', 'currently_present']
+        stmt = insert(NormalizedCitationPage).from_select(columns, select_stmt)
+        return stmt.on_conflict_do_update(
+            index_elements=['normalized_id', 'page_id'],
+            set_={c: stmt.excluded[c] for c in columns[2:]},
+        )
+
+
+# "Document Primary URL" holds one URL per Document that has Web Resources: the one with the
+# lowest id, i.e. the first loaded. The explorer links articles through it rather than picking a
+# URL per document from all of web_resources on every request. It is rebuilt by load_all.py after
+# web_resources are loaded and linked to documents.
+class DocumentPrimaryUrl(Base):
+    __tablename__ = 'document_primary_url'
+    document_id = Column(Integer, primary_key=True)
+    url = Column(String, nullable=False)
+
+    @staticmethod
+    def upsert_from_select(select_stmt):
+        """INSERT ... SELECT of (document_id, url) rows, replacing URLs that changed."""
+        stmt = insert(DocumentPrimaryUrl).from_select(['document_id', 'url'], select_stmt)
+        return stmt.on_conflict_do_update(
+            index_elements=['document_id'],
+            set_={'url': stmt.excluded.url},
+            where=DocumentPrimaryUrl.url.is_distinct_from(stmt.excluded.url),
+        )
+
+
+# "Template Value Count" holds the number of normalized citations that use a template parameter
+# value, for the values used by many citations, keyed like idx_template_data_value. Template
+# reports read their totals from it instead of counting every matching template_data row; values
+# not listed are used by few enough citations to count through the index. It is rebuilt by
+# load_all.py after template_data is loaded.
+class TemplateValueCount(Base):
+    __tablename__ = 'template_value_counts'
+    wiki_template_id = Column(Integer, nullable=False)
+    parameter_key_md5 = Column(CHAR(32), nullable=False)
+    parameter_value_md5 = Column(CHAR(32), nullable=False)
+    citation_count = Column(BigInteger, nullable=False)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('wiki_template_id', 'parameter_key_md5', 'parameter_value_md5'),
+    )
+
+    @staticmethod
+    def count_stmt(wiki_template_id: int, parameter_key: str, parameter_value: str):
+        return select(TemplateValueCount.citation_count).where(
+            (TemplateValueCount.wiki_template_id == wiki_template_id)
+            & (TemplateValueCount.parameter_key_md5 == TemplateData.compute_md5(parameter_key))
+            & (TemplateValueCount.parameter_value_md5 == TemplateData.compute_md5(parameter_value))
+        )
+
+    @staticmethod
+    def upsert_from_select(select_stmt):
+        """INSERT ... SELECT of (wiki_template_id, parameter_key_md5, parameter_value_md5,
+        citation_count) rows, replacing counts that changed."""
+        stmt = insert(TemplateValueCount).from_select(
+            ['wiki_template_id', 'parameter_key_md5', 'parameter_value_md5', 'citation_count'], select_stmt)
+        return stmt.on_conflict_do_update(
+            index_elements=['wiki_template_id', 'parameter_key_md5', 'parameter_value_md5'],
+            set_={'citation_count': stmt.excluded.citation_count},
+            where=TemplateValueCount.citation_count.is_distinct_from(stmt.excluded.citation_count),
+        )
+
+
+# "Template Parameter Stat" lists the most common values of each parameter of each template,
+# e.g. the top publishers cited with "Cite news", ranked by the number of template_data rows
+# using them. load_all.py computes them after template_data is loaded, from the deduped Parquet
+# file with a SpaceSaving sketch (heavy_hitters.py), and replaces the whole table in one
+# transaction. value_count may overestimate the true count by up to count_error; key_count is
+# the exact number of rows with a value for the parameter, repeated on every row of the key.
+class TemplateParameterStat(Base):
+    __tablename__ = 'template_parameter_stats'
+    wiki_template_id = Column(Integer, nullable=False)
+    parameter_key_md5 = Column(CHAR(32), nullable=False)
+    rank = Column(Integer, nullable=False)
+    parameter_key = Column(String, nullable=False)
+    parameter_value = Column(Text, nullable=False)
+    value_count = Column(BigInteger, nullable=False)
+    count_error = Column(BigInteger, nullable=False)
+    key_count = Column(BigInteger, nullable=False)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('wiki_template_id', 'parameter_key_md5', 'rank'),
+    )
+
+
+# "LoadProgress" records which row groups of each deduped Parquet file load_all.py has loaded.
+# A marker is written in the same transaction as the rows it covers, so an interrupted load can
+# resume by skipping completed row groups. row_group = -1 marks the whole table (including any
+# post-load steps) as complete. `source` fingerprints the Parquet file, so markers left by an older
+# dedup output are not mistaken for progress on a new one. For citation_instance_stats, which has no
+# Parquet file, the row_group = -1 marker's `source` is the highest revision_id the stats cover;
+# likewise for normalized_citation_pages. Markers are keyed by load_all.py phase, not by table;
+# PHASE_TABLES maps each phase to the tables it writes, so purge.py can forget the phases of a
+# table it empties.
+class LoadProgress(Base):
+    __tablename__ = 'load_progress'
+    TABLE_COMPLETE = -1
+    PHASE_TABLES = {
+        'containers': ['containers'],
+        'domains': ['domains'],
+        'documents': ['documents', 'wiki_pages'],
+        'web_resources': ['web_resources'],
+        'wiki_templates': ['wiki_templates'],
+        'normalized_citations': ['normalized_citations'],
+        'citation_instances': ['citation_instances'],
+        'revisions': ['revisions'],
+        'citation_histories': ['citation_history'],
+        'ncwr': ['normalized_citation_web_resources'],
+        'template_data': ['template_data'],
+        'citation_instance_stats': ['citation_instance_stats'],
+        'document_primary_url': ['document_primary_url'],
+        'normalized_citation_pages': ['normalized_citation_pages'],
+        'template_value_counts': ['template_value_counts'],
+        'template_parameter_stats': ['template_parameter_stats'],
+    }
+    table_name = Column(String, nullable=False)
+    row_group = Column(Integer, nullable=False)
+    source = Column(String, nullable=False)
+    row_count = Column(BigInteger)
+    loaded_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        PrimaryKeyConstraint('table_name', 'row_group', name='pk_load_progress'),
+    )
+
+    @staticmethod
+    def upsert(session: Session, **kwargs):
+        stmt = insert(LoadProgress).values(**kwargs)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['table_name', 'row_group'],
+            set_={
+                'source': stmt.excluded.source,
+                'row_count': stmt.excluded.row_count,
+                'loaded_at': func.now(),
+            }
+        )
+        session.execute(stmt)
+
+    @classmethod
+    def phases_for_table(cls, table_name):
+        """The load_all.py phases that write `table_name`."""
+        return [phase for phase, tables in cls.PHASE_TABLES.items() if table_name in tables]
+
+    @classmethod
+    def forget_table(cls, conn, table_name):
+        """Delete the markers of the phases that write `table_name`, so load_all.py
+        loads it again instead of skipping it as complete."""
+        phases = cls.phases_for_table(table_name)
+        if phases and inspect(conn).has_table(cls.__tablename__):
+            conn.execute(cls.__table__.delete().where(cls.table_name.in_(phases)))
+
+
+# "DataGeneration" is a single-row counter that load_all.py increments whenever it finishes a load.
+# Caches in the web application tag entries with the generation they were read at and discard
+# them once it changes, so they never serve data from before a reload.
+class DataGeneration(Base):
+    __tablename__ = 'data_generation'
+    id = Column(SmallInteger, primary_key=True)  # always 1
+    generation = Column(BigInteger, nullable=False, server_default='0')
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    @staticmethod
+    def current(session: Session) -> int:
+        return session.execute(select(DataGeneration.generation).where(DataGeneration.id == 1)).scalar() or 0
+
+    @staticmethod
+    def bump(session: Session) -> int:
+        stmt = insert(DataGeneration).values(id=1, generation=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['id'],
+            set_={'generation': DataGeneration.generation + 1, 'updated_at': func.now()},
+        ).returning(DataGeneration.generation)
+        return session.execute(stmt).scalar()
+
+
 # ---------------------------------------------------------------------------
 # Backward-compatibility aliases
 # ---------------------------------------------------------------------------
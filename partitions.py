@@ -0,0 +1,159 @@
+"""Declarative partitioning for citation_history and citation_instances.
+
+citation_history is hash-partitioned on citation_instance_id or range-partitioned
+on revision_id; citation_instances is hash-partitioned on page_id. Partitions are
+named <table>_pNNN.
+
+For bulk loading (init_db.py --no-indexes) partitions are created detached. Each
+detached partition carries a CHECK constraint equal to its partition constraint,
+so ATTACH PARTITION does not have to rescan it, and its FOR VALUES clause is kept
+in the table comment. load_all.py writes rows straight into detached partitions;
+init_db.py --add-indexes indexes them in parallel and then attaches them (see
+index_builder.py).
+
+Usage:
+    python3 init_db.py --no-indexes --partitions 32
+    python3 init_db.py --no-indexes --partitions 32 --citation-history-partition-by revision_id
+"""
+
+from sqlalchemy import MetaData, PrimaryKeyConstraint, text
+
+from models import Base
+
+
+# table -> partitioning method -> partition key column
+PARTITION_KEYS = {
+    'citation_history': {'hash': 'citation_instance_id', 'range': 'revision_id'},
+    'citation_instances': {'hash': 'page_id'},
+}
+
+
+def partition_name(table_name, index):
+    return f"{table_name}_p{index:03d}"
+
+
+def partitioned_metadata(methods):
+    """Return a copy of Base.metadata with the tables in `methods` ({table: 'hash'|'range'})
+    declared as partitioned parents.
+
+    Postgres requires the partition key in every unique constraint of a partitioned
+    table, so citation_instances' primary key becomes (id, page_id). Its id is then
+    no longer unique on its own and cannot be the target of a foreign key, so
+    citation_history's foreign key to citation_instances is omitted.
+    """
+    metadata = MetaData()
+    for table in Base.metadata.sorted_tables:
+        table.to_metadata(metadata)
+    for table_name, method in methods.items():
+        table = metadata.tables[table_name]
+        key = table.c[PARTITION_KEYS[table_name][method]]
+        table.dialect_options['postgresql']['partition_by'] = f"{method.upper()} ({key.name})"
+        if key.name not in table.primary_key.columns:
+            columns = list(table.primary_key.columns) + [key]
+            key.primary_key = True
+            table.append_constraint(PrimaryKeyConstraint(*columns))
+    if 'citation_instances' in methods:
+        history = metadata.tables['citation_history']
+        for fk in list(history.foreign_key_constraints):
+            if fk.referred_table.name == 'citation_instances':
+                history.constraints.discard(fk)
+                for element in fk.elements:
+                    history.foreign_keys.discard(element)
+                    element.parent.foreign_keys.discard(element)
+    return metadata
+
+
+def partition_bounds(method, count, interval=None):
+    """Return one FOR VALUES clause per partition.
+
+    Range partitions cover [i * interval, (i + 1) * interval); the first and last
+    are open-ended so every revision_id has a partition.
+    """
+    if method == 'hash':
+        return [f"FOR VALUES WITH (MODULUS {count}, REMAINDER {i})" for i in range(count)]
+    bounds = []
+    for i in range(count):
+        lower = 'MINVALUE' if i == 0 else str(i * interval)
+        upper = 'MAXVALUE' if i == count - 1 else str((i + 1) * interval)
+        bounds.append(f"FOR VALUES FROM ({lower}) TO ({upper})")
+    return bounds
+
+
+def is_partitioned(conn, table_name):
+    return conn.execute(
+        text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:t)"), {'t': table_name}
+    ).scalar() is True
+
+
+def create_partitions(conn, table_name, count, interval=None, detached=False):
+    """Create the partitions of an existing partitioned table, skipping any that exist."""
+    method = conn.execute(text(
+        "SELECT CASE partstrat WHEN 'h' THEN 'hash' WHEN 'r' THEN 'range' END "
+        "FROM pg_partitioned_table WHERE partrelid = to_regclass(:t)"
+    ), {'t': table_name}).scalar()
+    key = PARTITION_KEYS[table_name][method]
+    parent_oid = conn.execute(text("SELECT to_regclass(:t)::oid"), {'t': table_name}).scalar()
+    for i, bound in enumerate(partition_bounds(method, count, interval)):
+        name = partition_name(table_name, i)
+        if conn.execute(text("SELECT to_regclass(:t)"), {'t': name}).scalar() is not None:
+            continue
+        if not detached:
+            conn.execute(text(f"CREATE TABLE {name} PARTITION OF {table_name} {bound}"))
+            continue
+        if method == 'hash':
+            check = f"satisfies_hash_partition({parent_oid}::oid, {count}, {i}, {key})"
+        else:
+            lower = None if i == 0 else i * interval
+            upper = None if i == count - 1 else (i + 1) * interval
+            terms = [f"{key} IS NOT NULL"]
+            if lower is not None:
+                terms.append(f"{key} >= {lower}")
+            if upper is not None:
+                terms.append(f"{key} < {upper}")
+            check = ' AND '.join(terms)
+        conn.execute(text(
+            f"CREATE TABLE {name} (LIKE {table_name} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING INDEXES)"
+        ))
+        conn.execute(text(f"ALTER TABLE {name} ADD CONSTRAINT {name}_bound CHECK ({check})"))
+        conn.execute(text(f"COMMENT ON TABLE {name} IS '{bound}'"))
+
+
+def list_partitions(conn, table_name):
+    """Return [(partition, attached)] for all attached and detached partitions of a table."""
+    rows = conn.execute(text(
+        "SELECT c.relname, c.relispartition FROM pg_class c "
+        "WHERE c.relkind = 'r' AND c.relname LIKE :pattern "
+        "AND (c.relispartition OR EXISTS ("
+        "  SELECT 1 FROM pg_constraint con WHERE con.conrelid = c.oid AND con.conname = c.relname || '_bound'"
+        ")) ORDER BY c.relname"
+    ), {'pattern': table_name.replace('_', r'\_') + r'\_p%'}).all()
+    return [(name, attached) for name, attached in rows]
+
+
+def detached_partitions(conn, table_name):
+    """Return [(partition, predicate)] for the detached partitions of a table, where
+    predicate is the SQL condition a row must satisfy to belong to the partition."""
+    return [
+        (name, conn.execute(text(
+            "SELECT pg_get_expr(conbin, conrelid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(:t) AND conname = :c"
+        ), {'t': name, 'c': f"{name}_bound"}).scalar())
+        for name, attached in list_partitions(conn, table_name) if not attached
+    ]
+
+
+def attach_partitions(conn, table_name):
+    """Attach every detached partition of a table and drop its bound CHECK constraint.
+
+    Matching indexes already built on the partition are attached to the parent's
+    indexes instead of being rebuilt. Returns the number of partitions attached.
+    """
+    count = 0
+    for name, _ in detached_partitions(conn, table_name):
+        bound = conn.execute(text("SELECT obj_description(to_regclass(:t), 'pg_class')"), {'t': name}).scalar()
+        conn.execute(text(f"ALTER TABLE {table_name} ATTACH PARTITION {name} {bound}"))
+        conn.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT {name}_bound"))
+        conn.execute(text(f"COMMENT ON TABLE {name} IS NULL"))
+        count += 1
+    return count
+
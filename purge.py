@@ -1,8 +1,20 @@
 import argparse
 import os
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from models import Base
+from sqlalchemy import create_engine, text
+from models import Base, LoadProgress
+from partitions import PARTITION_KEYS, detached_partitions
+
+
+def _purge_detached_partitions(engine, table_names, truncate):
+    """Detached partitions are separate tables, so dropping or emptying the parent
+    does not reach them."""
+    with engine.begin() as conn:
+        for table_name in table_names:
+            if table_name not in PARTITION_KEYS:
+                continue
+            for name, _ in detached_partitions(conn, table_name):
+                conn.execute(text(f"TRUNCATE {name}" if truncate else f"DROP TABLE {name}"))
 
 
 def main() -> None:
@@ -44,12 +56,16 @@ def main() -> None:
         if table is None:
             available = sorted(Base.metadata.tables.keys())
             parser.error(f"Unknown table '{args.table}'. Available tables: {', '.join(available)}")
-        if args.truncate:
-            with Engine.begin() as conn:
+        _purge_detached_partitions(Engine, [args.table], args.truncate)
+        with Engine.begin() as conn:
+            if args.truncate:
                 conn.execute(table.delete())
-        else:
-            table.drop(bind=Engine, checkfirst=True)
+            else:
+                table.drop(bind=conn, checkfirst=True)
+            # Otherwise load_all.py would skip the now empty table as already loaded
+            LoadProgress.forget_table(conn, args.table)
     else:
+        _purge_detached_partitions(Engine, Base.metadata.tables.keys(), args.truncate)
         if args.truncate:
             with Engine.begin() as conn:
                 for table in reversed(Base.metadata.sorted_tables):
@@ -1,8 +1,45 @@
 import sys
 from pathlib import Path
 
+import pytest
+
 
 # Ensure the project root is importable when tests are run from the repo root
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
+
+
+@pytest.fixture
+def api_client(tmp_path, monkeypatch):
+    """Return a function that writes the given deduped Parquet tables, builds a
+    DuckDB store from them (duckdb_store.py) and returns a Flask test client
+    serving api_v1 and the explorer on it, e.g.
+    api_client(revisions={'revision_id': [...], ...})."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from flask import Flask
+
+    import api_v1
+    import cache
+    import duckdb_store
+    import explorer
+
+    monkeypatch.setattr(duckdb_store, 'DUCKDB_PATH', '')
+    # Stores built within the same second share a data generation; start from empty caches
+    monkeypatch.setattr(cache, 'generations', cache.GenerationTracker(cache.GENERATION_CHECK_SECONDS))
+    monkeypatch.setattr(cache, '_memory', cache.TTLCache(cache.MAX_ENTRIES, cache.TTL_SECONDS))
+    monkeypatch.setattr(cache, '_shared', None)
+
+    def make(**tables):
+        for name, columns in tables.items():
+            pq.write_table(pa.table(columns), str(tmp_path / f'{name}.parquet'))
+        engine = duckdb_store.create_store_engine(str(tmp_path))
+        monkeypatch.setattr(api_v1, '_get_engine', lambda: engine)
+        monkeypatch.setattr(explorer, '_get_engine', lambda: engine)
+        app = Flask(__name__, root_path=str(PROJECT_ROOT))
+        app.register_blueprint(api_v1.api_v1)
+        app.register_blueprint(explorer.explorer)
+        return app.test_client()
+
+    return make
@@ -0,0 +1,121 @@
+import asyncio
+import importlib
+
+import pytest
+from sqlalchemy import text
+
+
+@pytest.fixture
+def api_async(monkeypatch):
+    # api_async builds its engine at import time; it does not connect until used.
+    for var, value in (('DB_HOST', 'localhost'), ('DB_PORT', '5432'), ('DB_NAME', 'test'),
+                       ('DB_USER', 'test'), ('DB_PASS', 'test')):
+        monkeypatch.setenv(var, value)
+    return importlib.import_module('api_async')
+
+
+@pytest.fixture
+def clients(api_client, api_async, monkeypatch, tmp_path):
+    """(Flask client, Starlette client, fetch log, engine) on one small DuckDB store. The async
+    app's _fetch runs each statement on the store and records it with the number of
+    fetches in flight when it started."""
+    from starlette.testclient import TestClient
+
+    import api_v1
+    from benchmarks.api_latency import write_dataset
+
+    write_dataset(str(tmp_path), pages=12, revisions=6, long_pages=1, long_revisions=40, refs=4,
+                  hot_citations=2, hot_share=0.5)
+    flask_client = api_client()
+    engine = api_v1._get_engine()
+    fetches = []
+    in_flight = [0]
+
+    async def fetch(stmt):
+        in_flight[0] += 1
+        fetches.append((stmt, in_flight[0]))
+        await asyncio.sleep(0)  # let the other statements of a gather start
+        try:
+            with engine.connect() as conn:
+                return conn.execute(stmt).all()
+        finally:
+            in_flight[0] -= 1
+
+    monkeypatch.setattr(api_async, '_fetch', fetch)
+    return flask_client, TestClient(api_async.app), fetches, engine
+
+
+def _sample(engine):
+    with engine.connect() as conn:
+        def one(sql):
+            return conn.execute(text(sql)).first()
+        return {
+            'page': one("SELECT page_id, max(revision_id) FROM revisions GROUP BY page_id ORDER BY page_id LIMIT 1"),
+            'article_url': one("SELECT url FROM web_resources WHERE numeric_page_id IS NOT NULL ORDER BY id")[0],
+            'url': one("SELECT url FROM web_resources WHERE numeric_page_id IS NULL ORDER BY id")[0],
+            'sha1': one("SELECT normalized_sha1 FROM normalized_citations ORDER BY id")[0],
+            'template_value': one("SELECT wiki_template_id, parameter_key, parameter_value "
+                                  "FROM template_parameter_stats ORDER BY value_count DESC, wiki_template_id"),
+        }
+
+
+def _requests(s):
+    page_id, revision_id = s['page']
+    template_id, key, value = s['template_value']
+    report = f"/template/{template_id}/report?parameter_key={key}&parameter_value={value}"
+    return [
+        ('GET', "/openapi.json", None),
+        ('GET', f"/article?url={s['article_url']}", None),
+        ('GET', "/article?url=https://nowhere.example/", None),
+        ('GET', "/article", None),
+        ('GET', f"/article/{page_id}/revisions?limit=3", None),
+        ('GET', f"/article/{page_id}/revisions?cursor=not-a-cursor", None),
+        ('GET', f"/article/{page_id}/citations", None),
+        ('GET', f"/article/{page_id}/citations?raw=true&limit=2", None),
+        ('GET', f"/article/{page_id}/citations?revision_id={revision_id - 1}", None),
+        ('GET', f"/article/{page_id}/citations?revision_id=1", None),
+        ('GET', "/article/999999/citations", None),
+        ('GET', f"/citation/{s['sha1']}", None),
+        ('GET', f"/citation/{s['sha1']}/history?page_id={page_id}", None),
+        ('GET', f"/citation/{'0' * 40}", None),
+        ('GET', f"/citation/{'0' * 40}/history", None),
+        ('GET', report + "&limit=1", None),
+        ('GET', f"/template/{template_id}/report?parameter_key={key}", None),
+        ('GET', f"/template/999999/report?parameter_key={key}&parameter_value={value}", None),
+        ('GET', f"/template/{template_id}/stats?limit=2", None),
+        ('GET', "/template/999999/stats", None),
+        ('GET', f"/web_resource?url={s['url']}", None),
+        ('GET', "/web_resource?url=https://nowhere.example/", None),
+        ('POST', "/batch/citations", {"normalized_sha1": [s['sha1'], "0" * 40]}),
+        ('POST', "/batch/web_resources", {"urls": [s['url'], "https://nowhere.example/"]}),
+        ('POST', "/batch/articles", {"page_ids": [page_id, 999999]}),
+        ('POST', "/batch/articles", {"page_ids": "1"}),
+    ]
+
+
+def test_async_routes_answer_like_api_v1(clients):
+    flask_client, async_client, fetches, engine = clients
+    statuses = set()
+    for method, path, body in _requests(_sample(engine)):
+        expected = flask_client.open("/api/v1" + path, method=method, json=body)
+        response = async_client.request(method, "/api/v1" + path, json=body)
+        assert response.status_code == expected.status_code, path
+        assert response.json() == expected.get_json(), path
+        statuses.add(response.status_code)
+    assert statuses == {200, 400, 404}
+
+
+def test_independent_statements_run_concurrently(clients):
+    from api_v1 import _links_stmt, _other_articles_stmt, _templates_stmt
+
+    flask_client, async_client, fetches, engine = clients
+    page_id, revision_id = _sample(engine)['page']
+    response = async_client.get(f"/api/v1/article/{page_id}/citations?revision_id={revision_id - 1}")
+    assert response.status_code == 200 and response.json()["citations"]
+    # Three rounds: the latest revision and the timestamp of the requested one; the
+    # page and the next revision; that revision's citations and the related data
+    assert [n for _, n in fetches] == [1, 2, 1, 2, 1, 2, 3, 4]
+
+    # The related data comes from the statements shared with api_v1 (ids are bound parameters)
+    sql = {str(stmt) for stmt, _ in fetches[4:]}
+    assert {str(_other_articles_stmt([0], page_id)), str(_links_stmt([0])), str(_templates_stmt([0]))} <= sql
@@ -0,0 +1,29 @@
+import pyarrow.parquet as pq
+
+from benchmarks.api_latency import regressions, summarize, write_dataset
+
+
+def test_write_dataset_shape(tmp_path):
+    counts = write_dataset(str(tmp_path), pages=20, revisions=5, long_pages=2, long_revisions=50, refs=4,
+                           hot_citations=2, hot_share=1.0)
+    revisions = pq.read_table(str(tmp_path / 'revisions.parquet')).to_pydict()
+    assert revisions['page_id'].count(1) == revisions['page_id'].count(2) == 50
+    assert len(set(revisions['revision_id'])) == counts['revisions']
+
+    instances = pq.read_table(str(tmp_path / 'citation_instances.parquet')).to_pydict()
+    keys = list(zip(instances['page_id'], instances['raw_sha1']))
+    assert len(set(keys)) == len(keys)
+    # with hot_share=1.0 the hot citations are on every page
+    pages_per_citation = {}
+    for page_id, sha in zip(instances['page_id'], instances['normalized_sha1']):
+        pages_per_citation.setdefault(sha, set()).add(page_id)
+    assert sorted(len(p) for p in pages_per_citation.values())[-2:] == [20, 20]
+
+
+def test_regressions_flag_more_queries_and_slower_p95():
+    before = {'endpoints': summarize([('a', 200, 10.0, 3)] * 30 + [('b', 200, 10.0, 2)] * 5)}
+    now = summarize([('a', 200, 10.0, 5)] * 30 + [('b', 500, 50.0, 2)] * 5)
+    assert now['b']['errors'] == 5
+    assert regressions(now, before, 0.5) == ["a: queries per request 3.0 -> 5.0"]
+    slower = summarize([('a', 200, 20.0, 3)] * 30)
+    assert regressions(slower, before, 0.5) == ["a: p95 10.0 ms -> 20.0 ms"]
@@ -0,0 +1,128 @@
+import pytest
+
+from api_v1 import (
+    _check_batch_keys, _decode_cursor, _encode_cursor, _pagination_args, _template_report_count_stmt,
+    _template_report_stmt,
+)
+
+
+def test_cursor_round_trip():
+    token = _encode_cursor("2020-01-01 00:00:00", 123)
+    assert "=" not in token
+    assert _decode_cursor(token, (str, int)) == ("2020-01-01 00:00:00", 123)
+
+
+@pytest.mark.parametrize("token, types", [
+    ("not base64!", (str, int)),
+    (_encode_cursor(1), (str, int)),
+    (_encode_cursor("a", "b"), (str, int)),
+    (_encode_cursor(True), (int,)),
+])
+def test_malformed_cursors_are_rejected(token, types):
+    with pytest.raises(ValueError):
+        _decode_cursor(token, types)
+
+
+def test_pagination_args_from_a_mapping():
+    after = _encode_cursor("2020-01-01 00:00:00", 5)
+    assert _pagination_args((str, int), {"limit": "5000", "offset": "x"}) == (1000, 0, None)
+    assert _pagination_args((str, int), {"cursor": after}) == (100, 0, ("2020-01-01 00:00:00", 5))
+
+
+def test_check_batch_keys():
+    assert _check_batch_keys({"page_ids": [3, 1, 3]}, "page_ids", int) == ([3, 1], None)
+    for body in (None, [], {"page_ids": "1"}, {"page_ids": [True]}):
+        keys, error = _check_batch_keys(body, "page_ids", int)
+        assert keys is None and "page_ids" in error
+
+
+def test_template_report_matches_by_hash_and_prefers_precomputed_count():
+    from sqlalchemy import create_engine, text
+
+    from models import TemplateData
+
+    md5 = TemplateData.compute_md5
+    with create_engine("duckdb:///:memory:").connect() as conn:
+        conn.execute(text("CREATE TABLE normalized_citations (id INTEGER, normalized_sha1 VARCHAR, "
+                          "reference_normalized VARCHAR, appears_on_article INTEGER)"))
+        conn.execute(text("INSERT INTO normalized_citations VALUES (1, 'a', 'one', 10), (2, 'b', 'two', 20), "
+                          "(3, 'c', 'three', 30), (4, 'd', 'four', 40)"))
+        conn.execute(text("CREATE TABLE template_data (wiki_template_id INTEGER, normalized_id INTEGER, "
+                          "offset_start INTEGER, parameter_key VARCHAR, parameter_key_md5 VARCHAR, "
+                          "parameter_value VARCHAR)"))
+        conn.execute(text("INSERT INTO template_data VALUES "
+                          "(7, 1, 0, 'doi', :doi, '10.1/x'), (7, 1, 9, 'doi', :doi, '10.1/x'), "
+                          "(7, 2, 0, 'doi', :doi, '10.1/x'), "
+                          # a key whose stored hash collides with doi's: rechecked and left out
+                          "(7, 3, 0, 'DOI', :doi, '10.1/x'), "
+                          # the right key under another hash is not found: lookups go by the hash
+                          "(7, 4, 0, 'doi', :other, '10.1/x')"),
+                     {"doi": md5("doi"), "other": md5("isbn")})
+        conn.execute(text("CREATE TABLE template_value_counts (wiki_template_id INTEGER, "
+                          "parameter_key_md5 VARCHAR, parameter_value_md5 VARCHAR, citation_count BIGINT)"))
+
+        stmt = _template_report_stmt(7, "doi", "10.1/x")
+        assert [r.normalized_sha1 for r in conn.execute(stmt)] == ["a", "b"]
+        count = _template_report_count_stmt(7, "doi", "10.1/x", stmt)
+        assert conn.execute(count).scalar() == 2
+        conn.execute(text("INSERT INTO template_value_counts VALUES (7, :k, :v, 1000)"),
+                     {"k": md5("doi"), "v": md5("10.1/x")})
+        assert conn.execute(count).scalar() == 1000
+        assert conn.execute(_template_report_count_stmt(7, "doi", "10.2/y", _template_report_stmt(
+            7, "doi", "10.2/y"))).scalar() == 0
+
+
+def test_page_ids_on_two_domains_resolve_to_no_document(api_client):
+    sha1 = "a" * 40
+    client = api_client(
+        containers={"label": ["en.wikipedia.org", "de.wikipedia.org"]},
+        domains={"value": ["en.wikipedia.org", "de.wikipedia.org"],
+                 "for_container_label": ["en.wikipedia.org", "de.wikipedia.org"]},
+        # page 10 exists on both wikis, page 20 on one
+        documents={"language_code": ["en", "de", "en"],
+                   "has_container_label": ["en.wikipedia.org", "de.wikipedia.org", "en.wikipedia.org"],
+                   "page_id": [10, 10, 20]},
+        normalized_citations={"normalized_sha1": [sha1], "reference_normalized": ["{{cite web}}"],
+                              "appears_on_page_id": [20], "appears_on_domain": ["en.wikipedia.org"]},
+        citation_instances={"page_id": [10, 20], "raw_sha1": ["b" * 40, "c" * 40],
+                            "normalized_sha1": [sha1, sha1]},
+        revisions={"revision_id": [101, 201], "page_id": [10, 20],
+                   "revision_timestamp": ["2020-01-01T00:00:00Z", "2020-01-02T00:00:00Z"]},
+        citation_histories={"page_id": [10, 20], "raw_sha1": ["b" * 40, "c" * 40], "revision_id": [101, 201]},
+    )
+    articles = client.get(f"/api/v1/citation/{sha1}").get_json()["appears_on_articles"]
+    assert [(a["page_id"], a["document_id"]) for a in articles] == [(10, None), (20, 3)]
+
+    results = client.post("/api/v1/batch/articles", json={"page_ids": [10, 20]}).get_json()["results"]
+    assert results["10"]["document_id"] is None and results["10"]["revision_count"] == 1
+    assert results["20"]["document_id"] == 3
+
+
+def test_revision_pages_follow_the_cursor_across_timestamp_ties(api_client):
+    # (revision_id, timestamp): ids out of timestamp order, runs of equal timestamps
+    revisions = [(105, "2020-01-01"), (101, "2020-01-01"), (103, "2020-01-01"), (102, "2020-01-02"),
+                 (107, "2020-01-03"), (104, "2020-01-03"), (106, "2020-01-04")]
+    client = api_client(revisions={
+        "revision_id": [r for r, _ in revisions], "page_id": [5] * len(revisions),
+        "revision_timestamp": [f"{ts}T00:00:00Z" for _, ts in revisions],
+    })
+
+    seen, totals, cursor = [], [], None
+    while True:
+        query = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/api/v1/article/5/revisions", query_string=query).get_json()
+        assert len(body["revisions"]) <= 2
+        seen += [r["revision_id"] for r in body["revisions"]]
+        totals.append(body["total"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [101, 103, 105, 102, 104, 107, 106]
+    # the total is only counted for the first page
+    assert totals == [7, None, None, None]
+    # a last page that is exactly full has no next page either
+    body = client.get("/api/v1/article/5/revisions", query_string={"limit": 7}).get_json()
+    assert len(body["revisions"]) == 7 and body["next_cursor"] is None
+
+    response = client.get("/api/v1/article/5/revisions", query_string={"cursor": "not-a-cursor"})
+    assert response.status_code == 400 and response.get_json()["error"] == "Invalid cursor"
@@ -0,0 +1,94 @@
+import pytest
+
+import cache
+
+
+def test_ttl_cache_evicts_least_recently_used_and_expired(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    c = cache.TTLCache(max_entries=2, ttl=10)
+    c.set('a', 1)
+    c.set('b', 2)
+    assert c.get('a') == 1
+    c.set('c', 3)  # evicts 'b', the least recently used
+    assert c.get('b') is cache.MISSING
+    assert c.get('a') == 1
+    now[0] = 11
+    assert c.get('a') is cache.MISSING
+
+
+def test_cached_reloads_after_generation_change(monkeypatch, tmp_path):
+    generation = [1]
+
+    def current(engine):
+        changed = current.last is not None and current.last != generation[0]
+        current.last = generation[0]
+        return generation[0], changed
+    current.last = None
+
+    monkeypatch.setattr(cache.generations, 'current', current)
+    monkeypatch.setattr(cache, '_memory', cache.TTLCache(10, 60))
+    monkeypatch.setattr(cache, '_shared', cache.SQLiteCache(str(tmp_path / 'c.sqlite'), 60))
+    loads = []
+
+    def load():
+        loads.append(generation[0])
+        return [generation[0], None]
+
+    assert cache.cached(None, 'url', 'x', load) == [1, None]
+    assert cache.cached(None, 'url', 'x', load) == [1, None]
+    cache._memory.clear()  # another worker process: served from SQLite
+    assert cache.cached(None, 'url', 'x', load) == [1, None]
+    assert loads == [1]
+
+    generation[0] = 2
+    assert cache.cached(None, 'url', 'x', load) == [2, None]
+    assert loads == [1, 2]
+
+
+def test_partials_have_their_own_tiers_and_follow_generation(monkeypatch):
+    generation = [1]
+
+    def current(engine):
+        changed = current.last is not None and current.last != generation[0]
+        current.last = generation[0]
+        return generation[0], changed
+    current.last = None
+
+    monkeypatch.setattr(cache.generations, 'current', current)
+    monkeypatch.setattr(cache, '_memory', cache.TTLCache(10, 60))
+    monkeypatch.setattr(cache, '_shared', None)
+    monkeypatch.setattr(cache, '_partials_memory', cache.TTLCache(10, 60))
+    monkeypatch.setattr(cache, '_partials_shared', None)
+
+    assert cache.cached_partial(None, 'partials_citations', '1:10', lambda: ['<p>a</p>', 200]) == ['<p>a</p>', 200]
+    assert len(cache._partials_memory) == 1 and len(cache._memory) == 0
+    assert cache.cached_partial(None, 'partials_citations', '1:10', lambda: ['<p>b</p>', 200]) == ['<p>a</p>', 200]
+
+    generation[0] = 2
+    cache.cached(None, 'url', 'x', lambda: None)  # any lookup notices the new generation
+    assert len(cache._partials_memory) == 0
+    assert cache.cached_partial(None, 'partials_citations', '1:10', lambda: ['<p>b</p>', 200]) == ['<p>b</p>', 200]
+
+
+def test_generation_tracker_keeps_last_generation_on_transient_errors(monkeypatch):
+    from sqlalchemy.exc import ProgrammingError, TimeoutError as PoolTimeoutError
+
+    outcome = [3]
+
+    def current(session):
+        if isinstance(outcome[0], Exception):
+            raise outcome[0]
+        return outcome[0]
+
+    monkeypatch.setattr(cache.DataGeneration, 'current', staticmethod(current))
+    tracker = cache.GenerationTracker(interval=0)
+    outcome[0] = PoolTimeoutError()
+    with pytest.raises(PoolTimeoutError):
+        tracker.current(None)  # nothing known yet: the caller gets a 503
+    outcome[0] = 3
+    assert tracker.current(None) == (3, False)
+    outcome[0] = PoolTimeoutError()
+    assert tracker.current(None) == (3, False)
+    outcome[0] = ProgrammingError('SELECT', {}, Exception('relation "data_generation" does not exist'))
+    assert tracker.current(None) == (0, True)
@@ -0,0 +1,35 @@
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import dedup_parquet
+
+
+def _stage_revisions(staging_dir):
+    shard = staging_dir / 'shard1'
+    shard.mkdir()
+    pq.write_table(pa.table({
+        'revision_id': [30, 11, 20, 10, 11],
+        'page_id': [3, 1, 2, 1, 1],
+        'parent_revision_id': [None, 10, None, None, 10],
+        'revision_timestamp': ['c', 'b', 'a', 'a', 'b'],
+    }), str(shard / 'w00-revisions-00.parquet'))
+
+
+def test_sort_writes_rows_in_key_order_and_redoes_unsorted_tables(tmp_path):
+    _stage_revisions(tmp_path)
+    deduped = tmp_path / 'deduped'
+    deduped.mkdir()
+    con = duckdb.connect()
+
+    dedup_parquet.dedup_revisions(con, str(tmp_path), str(deduped))
+    dedup_parquet._mark_done(str(deduped), 'revisions')
+    assert dedup_parquet._is_done(str(deduped), 'revisions')
+    assert not dedup_parquet._is_done(str(deduped), 'revisions', sort=True)
+
+    dedup_parquet.dedup_revisions(con, str(tmp_path), str(deduped), sort=True)
+    dedup_parquet._mark_done(str(deduped), 'revisions', sort=True)
+    assert dedup_parquet._is_done(str(deduped), 'revisions', sort=True)
+    table = pq.read_table(str(deduped / 'revisions.parquet'))
+    assert list(zip(table['page_id'].to_pylist(), table['revision_id'].to_pylist())) == [
+        (1, 10), (1, 11), (2, 20), (3, 30)]
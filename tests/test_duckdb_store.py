@@ -0,0 +1,44 @@
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import duckdb_store
+
+
+def _write(dataset_dir, name, **columns):
+    pq.write_table(pa.table(columns), str(dataset_dir / f'{name}.parquet'))
+
+
+def test_build_mirrors_load_tables_and_rebuilds_when_parquet_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(duckdb_store, 'DUCKDB_PATH', '')
+    _write(tmp_path, 'containers', label=['en.wikipedia.org'])
+    _write(tmp_path, 'domains', value=['en.wikipedia.org'], for_container_label=['en.wikipedia.org'])
+    _write(tmp_path, 'documents', language_code=['en', 'en'],
+           has_container_label=['en.wikipedia.org', 'en.wikipedia.org'], page_id=[20, 10])
+    _write(tmp_path, 'revisions', revision_id=[102, 101, 201], page_id=[10, 10, 20],
+           parent_revision_id=[101, None, None],
+           revision_timestamp=['2020-01-02T00:00:00Z', '2020-01-01T00:00:00Z', '2020-01-03T00:00:00Z'])
+
+    path = duckdb_store.ensure_store(str(tmp_path))
+    assert path == str(tmp_path / 'api.duckdb')
+    with duckdb.connect(path, read_only=True) as con:
+        # documents are numbered in file order, wiki_pages map pages back to them
+        assert con.execute("SELECT page_id, document_id FROM wiki_pages ORDER BY page_id").fetchall() == [
+            (10, 2), (20, 1)]
+        # written sorted by (page_id, revision_id)
+        assert [r[0] for r in con.execute("SELECT revision_id FROM revisions").fetchall()] == [101, 102, 201]
+        # absent Parquet files give empty tables with the same columns
+        assert con.execute("SELECT count(*) FROM citation_history").fetchone() == (0,)
+        generation = con.execute("SELECT generation FROM data_generation").fetchone()[0]
+
+    fingerprint = duckdb_store.store_fingerprint(path)
+    assert fingerprint == duckdb_store.dataset_fingerprint(str(tmp_path))
+    duckdb_store.ensure_store(str(tmp_path))
+    assert duckdb_store.store_fingerprint(path) == fingerprint
+
+    _write(tmp_path, 'containers', label=['en.wikipedia.org', 'de.wikipedia.org'])
+    duckdb_store.ensure_store(str(tmp_path))
+    assert duckdb_store.store_fingerprint(path) != fingerprint
+    with duckdb.connect(path, read_only=True) as con:
+        assert con.execute("SELECT count(*) FROM containers").fetchone() == (2,)
+        assert con.execute("SELECT generation FROM data_generation").fetchone()[0] >= generation
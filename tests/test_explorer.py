@@ -0,0 +1,39 @@
+def test_citation_report_links_each_revision_to_its_pages_document(api_client):
+    sha1 = "a" * 40
+    client = api_client(
+        containers={"label": ["en.wikipedia.org"]},
+        domains={"value": ["en.wikipedia.org"], "for_container_label": ["en.wikipedia.org"]},
+        # documents are numbered in file order: page 2 is document 1, page 1 is document 2
+        documents={"language_code": ["en", "en"], "has_container_label": ["en.wikipedia.org"] * 2,
+                   "page_id": [2, 1]},
+        web_resources={"url": ["https://en.wikipedia.org/wiki/Two", "https://en.wikipedia.org/wiki/One"],
+                       "domain_label": ["en.wikipedia.org"] * 2, "numeric_page_id": [2, 1]},
+        normalized_citations={"normalized_sha1": [sha1], "reference_normalized": ["{{cite web}}"],
+                              "appears_on_page_id": [1], "appears_on_domain": ["en.wikipedia.org"]},
+        citation_instances={"page_id": [1], "raw_sha1": ["b" * 40], "normalized_sha1": [sha1]},
+        revisions={"revision_id": [101], "page_id": [1], "revision_timestamp": ["2020-01-01T00:00:00Z"]},
+        citation_histories={"page_id": [1], "raw_sha1": ["b" * 40], "revision_id": [101]},
+    )
+    html = client.get(f"/explorer/citation/{sha1}/report").get_data(as_text=True)
+    assert "wiki/One" in html
+    assert "wiki/Two" not in html
+
+
+def test_prewarm_jobs_are_dropped_when_the_queue_is_full(monkeypatch):
+    import queue
+
+    import explorer
+
+    monkeypatch.setattr(explorer, 'PARTIALS_PREWARM', 2)
+    monkeypatch.setattr(explorer, '_prewarm_queue', queue.Queue(maxsize=1))
+    monkeypatch.setattr(explorer, '_prewarm_pending', set())
+    monkeypatch.setattr(explorer, '_prewarm_worker', object())  # nothing takes jobs off the queue
+    explorer._schedule_prewarm(None, 1, 101)
+    explorer._schedule_prewarm(None, 1, 101)
+    explorer._schedule_prewarm(None, 1, 102)
+    assert explorer._prewarm_queue.qsize() == 1
+    assert explorer._prewarm_pending == {(1, 101)}
+    # once the worker catches up, the dropped revision can be scheduled again
+    explorer._prewarm_queue.get_nowait()
+    explorer._schedule_prewarm(None, 1, 102)
+    assert explorer._prewarm_queue.get_nowait() == (None, 1, 102)
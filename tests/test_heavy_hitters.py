@@ -0,0 +1,37 @@
+import random
+from collections import Counter
+
+import pytest
+
+from heavy_hitters import SpaceSaving
+
+
+def test_exact_while_under_capacity():
+    sketch = SpaceSaving(10)
+    for item, weight in [("a", 3), ("b", 1), ("a", 2), ("c", 4)]:
+        sketch.add(item, weight)
+    assert sketch.top(2) == [("a", 5, 0), ("c", 4, 0)]
+    assert sketch.total == 10
+
+
+def test_memory_is_bounded_and_heavy_hitters_are_found():
+    rng = random.Random(1)
+    stream = [f"doi-{rng.randrange(100_000)}" for _ in range(20_000)]
+    stream += ["publisher-a"] * 3000 + ["publisher-b"] * 2000
+    rng.shuffle(stream)
+    truth = Counter(stream)
+
+    sketch = SpaceSaving(50)
+    for item in stream:
+        sketch.add(item)
+
+    assert len(sketch) == 50
+    top = sketch.top(2)
+    assert [item for item, _, _ in top] == ["publisher-a", "publisher-b"]
+    for item, count, error in top:
+        assert count - error <= truth[item] <= count
+
+
+def test_capacity_must_be_positive():
+    with pytest.raises(ValueError):
+        SpaceSaving(0)
@@ -0,0 +1,65 @@
+from flask import Blueprint, Flask
+
+import http_cache
+
+
+def make_app(monkeypatch, generation):
+    monkeypatch.setattr(http_cache.generations, 'current', lambda engine: (generation[0], False))
+    calls = []
+    bp = Blueprint('bp', __name__)
+
+    @bp.route('/thing')
+    def thing():
+        calls.append(1)
+        return {'ok': True}
+
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    http_cache.init_http_caching(app, None, [bp])
+    return app.test_client(), calls
+
+
+def test_etag_depends_on_endpoint_args_generation_and_version():
+    base = http_cache.compute_etag('api_v1.x', '/x', [('a', '1'), ('b', '2')], 1)
+    assert base == http_cache.compute_etag('api_v1.x', '/x', [('b', '2'), ('a', '1')], 1)
+    assert base != http_cache.compute_etag('api_v1.x', '/x', [('a', '1')], 1)
+    assert base != http_cache.compute_etag('api_v1.x', '/x', [('a', '1'), ('b', '2')], 2)
+    # a deploy invalidates the ETags of the previous version
+    assert base != http_cache.compute_etag('api_v1.x', '/x', [('a', '1'), ('b', '2')], 1, version='2:abc')
+
+
+def test_app_version_prefers_app_version_setting(monkeypatch):
+    runs = []
+    monkeypatch.setattr(http_cache.subprocess, 'run', lambda *a, **kw: runs.append(a) or _Completed('abc\n'))
+    http_cache._git_commit.cache_clear()
+    monkeypatch.setenv('APP_VERSION', 'v1.2.3')
+    assert http_cache.app_version() == f"{http_cache.RESPONSE_VERSION}:v1.2.3"
+    assert runs == []
+    # git is only asked when APP_VERSION is unset, and only once
+    monkeypatch.delenv('APP_VERSION')
+    assert http_cache.app_version() == f"{http_cache.RESPONSE_VERSION}:abc"
+    assert http_cache.app_version() == f"{http_cache.RESPONSE_VERSION}:abc"
+    assert len(runs) == 1
+    http_cache._git_commit.cache_clear()
+
+
+class _Completed:
+    def __init__(self, stdout):
+        self.stdout = stdout
+
+
+def test_not_modified_skips_the_view(monkeypatch):
+    generation = [1]
+    client, calls = make_app(monkeypatch, generation)
+
+    first = client.get('/thing')
+    assert first.status_code == 200 and first.headers['Cache-Control'].startswith('public')
+    etag = first.headers['ETag']
+
+    again = client.get('/thing', headers={'If-None-Match': etag})
+    assert again.status_code == 304 and again.headers['ETag'] == etag
+    assert len(calls) == 1
+
+    generation[0] = 2
+    assert client.get('/thing', headers={'If-None-Match': etag}).status_code == 200
+    assert len(calls) == 2
@@ -0,0 +1,263 @@
+import importlib
+import threading
+from collections import OrderedDict
+
+import pytest
+
+
+@pytest.fixture
+def load_all(monkeypatch):
+    # load_all builds its engine at import time; it does not connect until used.
+    for var, value in (('DB_HOST', 'localhost'), ('DB_PORT', '5432'), ('DB_NAME', 'test'),
+                       ('DB_USER', 'test'), ('DB_PASS', 'test')):
+        monkeypatch.setenv(var, value)
+    return importlib.import_module('load_all')
+
+
+def test_split_row_groups_contiguous_and_complete(load_all):
+    ranges = load_all.split_row_groups(10, 4)
+    assert ranges == [[0, 1, 2], [3, 4, 5], [6, 7], [8, 9]]
+    assert load_all.split_row_groups(2, 8) == [[0], [1]]
+    assert load_all.split_row_groups(5, 1) == [[0, 1, 2, 3, 4]]
+
+
+def test_run_phases_respects_dependencies(load_all, monkeypatch, tmp_path):
+    events = []
+    lock = threading.Lock()
+
+    def loader(name):
+        def fn(session, staging_dir, row_groups=None):
+            with lock:
+                events.append(name)
+        return fn
+
+    phases = OrderedDict([
+        ('a', ('a', loader('a'), [])),
+        ('b', ('b', loader('b'), ['a'])),
+        ('c', ('c', loader('c'), [])),
+        ('d', ('d', loader('d'), ['b', 'c'])),
+    ])
+    monkeypatch.setattr(load_all, 'PHASES', phases)
+    monkeypatch.setattr(load_all, 'PHASE_FINALIZERS', {'b': loader('b-finalize')})
+
+    load_all.run_phases(list(phases), str(tmp_path), jobs=3)
+
+    assert sorted(events) == ['a', 'b', 'b-finalize', 'c', 'd']
+    assert events.index('a') < events.index('b') < events.index('b-finalize') < events.index('d')
+    assert events.index('c') < events.index('d')
+
+
+def test_purging_a_table_forgets_the_markers_of_its_phases(load_all):
+    from sqlalchemy import create_engine, insert, select
+
+    from models import Base, LoadProgress
+
+    assert set(LoadProgress.PHASE_TABLES) == set(load_all.PHASES)
+    assert set(t for tables in LoadProgress.PHASE_TABLES.values() for t in tables) <= set(Base.metadata.tables)
+
+    engine = create_engine("sqlite://")
+    LoadProgress.__table__.create(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(LoadProgress), [
+            {'table_name': phase, 'row_group': LoadProgress.TABLE_COMPLETE, 'source': 'x'}
+            for phase in ('citation_histories', 'revisions')
+        ])
+        LoadProgress.forget_table(conn, 'citation_history')
+        assert conn.execute(select(LoadProgress.table_name)).scalars().all() == ['revisions']
+
+
+def test_parquet_fingerprint_changes_when_file_is_rewritten(load_all, tmp_path):
+    import os
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = str(tmp_path / 'revisions.parquet')
+    pq.write_table(pa.table({'revision_id': [1, 2]}), path)
+    before = load_all.parquet_fingerprint(path)
+    pq.write_table(pa.table({'revision_id': [3, 4]}), path)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+    assert load_all.parquet_fingerprint(path) != before
+
+
+def test_partition_selects_join_once_per_batch(load_all, monkeypatch):
+    from sqlalchemy.dialects import postgresql
+    from models import CitationHistory
+
+    monkeypatch.setattr(load_all, 'is_partitioned', lambda conn, name: True)
+    monkeypatch.setattr(load_all, 'detached_partitions', lambda conn, name: [
+        ('citation_history_p000', 'citation_instance_id < 10'),
+        ('citation_history_p001', 'citation_instance_id >= 10'),
+    ])
+
+    class FakeSession:
+        def connection(self):
+            return None
+
+    stage = load_all._citation_histories_stage
+    select_stmt = load_all.sa_select(stage.c.page_id.label('citation_instance_id'), stage.c.revision_id)
+    resolve, targets = load_all.partition_selects(FakeSession(), CitationHistory.__table__, select_stmt,
+                                                  load_all._citation_histories_resolved)
+    assert [t.name for t, _ in targets] == ['citation_history_p000', 'citation_history_p001']
+    for _, select in targets:
+        sql = str(select.compile(dialect=postgresql.dialect()))
+        # Partitions read the rows resolved once per batch, not the staging join
+        assert 'FROM _stage_citation_histories_resolved' in sql
+        assert '_stage_citation_histories ' not in sql
+
+
+def _run(con, stmt):
+    """Execute a statement compiled for Postgres in DuckDB, which accepts the
+    DISTINCT ON and ON CONFLICT ... DO UPDATE forms load_all.py uses. Returns
+    the SQL and the number of rows written."""
+    from sqlalchemy.dialects import postgresql
+    sql = str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}))
+    return sql, con.execute(sql).fetchone()[0]
+
+
+def _revisions_and_history(con, history):
+    con.execute("CREATE TABLE revisions (revision_id BIGINT PRIMARY KEY, page_id INTEGER, "
+                "parent_revision_id BIGINT, revision_timestamp TIMESTAMP)")
+    con.execute("INSERT INTO revisions VALUES (101, 10, NULL, '2020-01-01'), (102, 10, 101, '2020-01-02'), "
+                "(103, 10, 102, '2020-01-03'), (201, 20, NULL, '2020-02-01')")
+    con.execute("CREATE TABLE citation_history (citation_instance_id BIGINT, revision_id BIGINT)")
+    if history:
+        con.executemany("INSERT INTO citation_history VALUES (?, ?)", history)
+
+
+def test_citation_instance_stats_select_recomputes_rows(load_all):
+    import duckdb
+    from models import CitationHistory, CitationInstanceStats
+
+    con = duckdb.connect()
+    _revisions_and_history(con, [(1, 101), (1, 103), (2, 102), (11, 101)])
+    con.execute("CREATE TABLE citation_instance_stats (citation_instance_id BIGINT PRIMARY KEY, "
+                "first_seen_id BIGINT, first_seen_ts TIMESTAMP, last_seen_id BIGINT, last_seen_ts TIMESTAMP, "
+                "appearance_count BIGINT)")
+    history = CitationHistory.__table__.alias('history')
+
+    def build():
+        select_stmt = load_all.citation_instance_stats_select(history, lambda h: h.citation_instance_id < 10)
+        return _run(con, CitationInstanceStats.upsert_from_select(select_stmt))[0]
+
+    def stats():
+        return con.execute("SELECT citation_instance_id, first_seen_id, last_seen_id, appearance_count "
+                           "FROM citation_instance_stats ORDER BY 1").fetchall()
+
+    sql = build()
+    assert 'ON CONFLICT (citation_instance_id) DO UPDATE' in sql
+    # instance 11 is outside the range
+    assert stats() == [(1, 101, 103, 2), (2, 102, 102, 1)]
+    # Rows are replaced, not incremented, so re-running a range is idempotent
+    build()
+    assert stats() == [(1, 101, 103, 2), (2, 102, 102, 1)]
+    con.execute("INSERT INTO citation_history VALUES (2, 103)")
+    build()
+    assert stats() == [(1, 101, 103, 2), (2, 102, 103, 2)]
+
+
+def test_document_primary_url_keeps_lowest_id_url(load_all):
+    import duckdb
+    from models import DocumentPrimaryUrl
+
+    con = duckdb.connect()
+    con.execute("CREATE TABLE web_resources (id INTEGER, url VARCHAR, instance_of_document INTEGER)")
+    con.execute("INSERT INTO web_resources VALUES (3, 'https://b.example/1', 1), (1, 'https://a.example/1', 1), "
+                "(2, 'https://a.example/2', 2), (4, 'https://c.example/', NULL)")
+    con.execute("CREATE TABLE document_primary_url (document_id INTEGER PRIMARY KEY, url VARCHAR NOT NULL)")
+    stmt = DocumentPrimaryUrl.upsert_from_select(load_all.document_primary_url_select())
+
+    def rows():
+        return con.execute("SELECT document_id, url FROM document_primary_url ORDER BY 1").fetchall()
+
+    assert _run(con, stmt)[1] == 2
+    assert rows() == [(1, 'https://a.example/1'), (2, 'https://a.example/2')]
+    # Unchanged URLs are not rewritten on a reload
+    assert _run(con, stmt)[1] == 0
+    con.execute("DELETE FROM web_resources WHERE id = 1")
+    assert _run(con, stmt)[1] == 1
+    assert rows() == [(1, 'https://b.example/1'), (2, 'https://a.example/2')]
+
+
+def test_normalized_citation_pages_select_groups_per_page(load_all):
+    import duckdb
+    from models import NormalizedCitationPage
+
+    con = duckdb.connect()
+    _revisions_and_history(con, [])
+    con.execute("CREATE TABLE citation_instances (id BIGINT, normalized_id INTEGER, page_id INTEGER)")
+    con.execute("INSERT INTO citation_instances VALUES (1, 5, 10), (2, 5, 10), (3, 6, 10), (4, 5, 20)")
+    con.execute("CREATE TABLE citation_instance_stats (citation_instance_id BIGINT, first_seen_id BIGINT, "
+                "last_seen_id BIGINT)")
+    con.execute("INSERT INTO citation_instance_stats VALUES (1, 101, 103), (2, 102, 102), (3, 101, 102), "
+                "(4, 201, 201)")
+    con.execute("CREATE TABLE normalized_citation_pages (normalized_id INTEGER, page_id INTEGER, "
+                "first_seen_rev BIGINT, last_seen_rev BIGINT, currently_present BOOLEAN, "
+                "PRIMARY KEY (normalized_id, page_id))")
+
+    def build(where):
+        return _run(con, NormalizedCitationPage.upsert_from_select(load_all.normalized_citation_pages_select(where)))
+
+    def rows():
+        return con.execute("SELECT * FROM normalized_citation_pages ORDER BY page_id, normalized_id").fetchall()
+
+    sql, _ = build(lambda page_id: page_id < 15)
+    assert 'ON CONFLICT (normalized_id, page_id) DO UPDATE' in sql
+    # Instances of the same citation on a page are merged; 6 is gone from the latest revision 103
+    assert rows() == [(5, 10, 101, 103, True), (6, 10, 101, 102, False)]
+    build(lambda page_id: page_id >= 15)
+    assert rows()[-1] == (5, 20, 201, 201, True)
+    # A new revision that drops a citation replaces the page's row
+    con.execute("UPDATE citation_instance_stats SET last_seen_id = 102 WHERE citation_instance_id = 1")
+    build(lambda page_id: page_id == 10)
+    assert rows() == [(5, 10, 101, 102, False), (6, 10, 101, 102, False), (5, 20, 201, 201, True)]
+
+
+def test_template_parameter_sketches_count_values_per_parameter(load_all):
+    import pyarrow as pa
+
+    batch = pa.RecordBatch.from_pydict({
+        'domain_label': ['en.wikipedia.org'] * 5,
+        'template_name': ['Cite web', 'Cite web', 'Cite web', 'Cite web', 'Cite news'],
+        'parameter_key': ['publisher', 'publisher', 'publisher', 'url', 'publisher'],
+        'parameter_value': ['BBC', 'BBC', None, 'https://a', 'BBC'],
+    })
+    sketches = load_all.template_parameter_sketches([batch, batch], capacity=5)
+    assert sketches[('en.wikipedia.org', 'Cite web', 'publisher')].top(5) == [('BBC', 4, 0)]
+    assert sketches[('en.wikipedia.org', 'Cite news', 'publisher')].total == 2
+    assert len(sketches) == 3
+
+
+def test_template_value_counts_rebuild_deletes_values_below_threshold(load_all, monkeypatch):
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.orm import Session
+
+    monkeypatch.setattr(load_all, 'TEMPLATE_VALUE_COUNT_MIN', 2)
+    session = Session(create_engine("duckdb:///:memory:"))
+    session.execute(text("CREATE TABLE template_data (wiki_template_id INTEGER, normalized_id INTEGER, "
+                         "offset_start INTEGER, parameter_key VARCHAR, parameter_key_md5 CHAR(32), "
+                         "parameter_value VARCHAR)"))
+    session.execute(text("CREATE TABLE template_value_counts (wiki_template_id INTEGER, parameter_key_md5 CHAR(32), "
+                         "parameter_value_md5 CHAR(32), citation_count BIGINT, "
+                         "PRIMARY KEY (wiki_template_id, parameter_key_md5, parameter_value_md5))"))
+    # DuckDB has no ON COMMIT DELETE ROWS; the phase truncates the stage before filling it
+    session.execute(text("CREATE TEMPORARY TABLE _stage_template_value_counts (wiki_template_id INTEGER, "
+                         "parameter_key_md5 CHAR(32), parameter_value_md5 CHAR(32), citation_count BIGINT)"))
+    session.execute(text("INSERT INTO template_data VALUES (1, 10, 0, 'lang', md5('lang'), 'en'), "
+                         "(1, 11, 0, 'lang', md5('lang'), 'en'), (1, 12, 0, 'lang', md5('lang'), 'fr'), "
+                         "(1, 13, 0, 'lang', md5('lang'), 'fr'), (1, 14, 0, 'lang', md5('lang'), 'de')"))
+    session.commit()
+
+    def counts():
+        return session.execute(text("SELECT parameter_value_md5 = md5('en'), citation_count "
+                                    "FROM template_value_counts ORDER BY 1 DESC")).all()
+
+    load_all.load_template_value_counts(session, None)
+    assert counts() == [(True, 2), (False, 2)]
+    # 'fr' falls below the threshold and 'en' gains a citation; 'de' never reached it
+    session.execute(text("DELETE FROM template_data WHERE normalized_id = 13"))
+    session.execute(text("INSERT INTO template_data VALUES (1, 15, 0, 'lang', md5('lang'), 'en')"))
+    session.commit()
+    load_all.load_template_value_counts(session, None)
+    assert counts() == [(True, 3)]
@@ -0,0 +1,43 @@
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from index_builder import index_ddl
+from models import Base
+from partitions import partition_bounds, partitioned_metadata
+
+
+def test_partition_bounds_cover_all_values():
+    assert partition_bounds('hash', 2) == [
+        'FOR VALUES WITH (MODULUS 2, REMAINDER 0)',
+        'FOR VALUES WITH (MODULUS 2, REMAINDER 1)',
+    ]
+    assert partition_bounds('range', 3, interval=100) == [
+        'FOR VALUES FROM (MINVALUE) TO (100)',
+        'FOR VALUES FROM (100) TO (200)',
+        'FOR VALUES FROM (200) TO (MAXVALUE)',
+    ]
+
+
+def test_partitioned_metadata_leaves_models_untouched():
+    metadata = partitioned_metadata({'citation_history': 'hash', 'citation_instances': 'hash'})
+    dialect = postgresql.dialect()
+
+    instances = str(CreateTable(metadata.tables['citation_instances']).compile(dialect=dialect))
+    assert 'PRIMARY KEY (id, page_id)' in instances
+    assert 'PARTITION BY HASH (page_id)' in instances
+
+    history = str(CreateTable(metadata.tables['citation_history']).compile(dialect=dialect))
+    assert 'PARTITION BY HASH (citation_instance_id)' in history
+    assert 'REFERENCES citation_instances' not in history
+    assert 'REFERENCES revisions' in history
+
+    original = str(CreateTable(Base.metadata.tables['citation_history']).compile(dialect=dialect))
+    assert 'REFERENCES citation_instances' in original
+    assert 'PARTITION BY' not in original
+
+
+def test_index_ddl_retargets_partition():
+    idx = next(i for i in Base.metadata.tables['citation_history'].indexes if i.name == 'idx_ch_revision')
+    ddl = index_ddl(idx, postgresql.dialect(), table_name='citation_history_p003',
+                    index_name='idx_ch_revision_p003', concurrently=True)
+    assert ddl == 'CREATE INDEX CONCURRENTLY idx_ch_revision_p003 ON citation_history_p003 (revision_id)'
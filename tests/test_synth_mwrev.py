@@ -0,0 +1,28 @@
+import pytest
+
+from benchmarks.synth_mwrev import parse_template_mix, write_bundles
+
+
+def test_parse_template_mix():
+    assert parse_template_mix('Cite web=5, none') == [('cite web', 5.0), ('none', 1.0)]
+    with pytest.raises(ValueError):
+        parse_template_mix('cite web=0')
+
+
+def test_bundles_are_deterministic_and_parse_as_revision_histories(tmp_path):
+    options = dict(pages=6, files=2, revisions=4, refs=5, churn=0.3, seed=7)
+    summary = write_bundles(str(tmp_path / 'a'), **options)
+    again = write_bundles(str(tmp_path / 'b'), **options)
+    assert [open(p, 'rb').read() for p in summary['files']] == [open(p, 'rb').read() for p in again['files']]
+
+    build_db = pytest.importorskip('build_db')
+    revisions = [r for path in summary['files'] for r in build_db.get_revisions_from_mwrev_zst(path)]
+    assert len(revisions) == summary['revisions']
+    assert sorted({r['page_id'] for r in revisions}) == list(range(1, 7))
+    previous = {}
+    for r in revisions:
+        assert r['namespace_id'] == 0
+        assert r['parent_revision_id'] == previous.get(r['page_id'])
+        previous[r['page_id']] = r['revision_id']
+    assert '<ref name=' in revisions[0]['revision_text']
+    assert build_db.extract_references(revisions[0]['revision_text'], include_offsets=True)
@@ -0,0 +1,25 @@
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+
+from web_engine import _PLAIN_QUERIES, configure_engine, execute_prepared, pool_stats
+
+
+def test_plain_queries_use_named_parameters():
+    assert str(_PLAIN_QUERIES['next_revision']).endswith(
+        "WHERE page_id = :p1 AND revision_id > :p2 ORDER BY revision_id LIMIT 1")
+
+
+def test_unprepared_queries_and_pool_stats():
+    engine = configure_engine(create_engine("sqlite://", poolclass=QueuePool), prepare=False)
+    with Session(engine) as session:
+        session.execute(text("CREATE TABLE revisions (revision_id INTEGER, page_id INTEGER, "
+                             "revision_timestamp TEXT, parent_revision_id INTEGER)"))
+        session.execute(text("INSERT INTO revisions VALUES (1, 7, 'a', NULL), (2, 7, 'b', 1)"))
+        assert execute_prepared(session, 'latest_revision', 7).scalar() == 2
+        assert execute_prepared(session, 'next_revision', 7, 1).first() == (2, 'b')
+        assert pool_stats(engine)['checked_out'] == 1
+    stats = pool_stats(engine)
+    assert stats['checked_out'] == 0
+    assert stats['connects'] == 1
+    assert stats['checkouts'] == 1
@@ -0,0 +1,190 @@
+"""Database engine for the web application: pool settings, prepared statements
+and pool metrics.
+
+Pool size, overflow and checkout timeout come from DB_POOL_SIZE,
+DB_POOL_MAX_OVERFLOW and DB_POOL_TIMEOUT. DB_POOL_PRE_PING (on by default)
+tests every connection with a round trip when it is checked out. With it off,
+a dead connection is only noticed when a query on it fails: SQLAlchemy then
+invalidates that connection and every other connection opened before it, so
+after a database restart one request fails (answered with 503 and Retry-After)
+and the pool reconnects, instead of every request paying for a ping.
+
+The fixed queries the API and explorer run on every article and citation view
+(HOT_QUERIES) are prepared on each new connection with PREPARE and run with
+EXECUTE, so Postgres parses and plans them once per connection rather than on
+every call. DB_PREPARED_STATEMENTS=false turns this off, e.g. behind a pooler
+in transaction mode that does not keep session state. The async API (asyncpg)
+prepares and caches its statements itself; the setting sizes that cache to 0.
+
+pool_stats() reports the pool's state and counters for the /metrics endpoint.
+
+API_BACKEND=duckdb serves the web application from a read-only DuckDB store
+built from the deduped Parquet files instead (see duckdb_store.py); the DB_*
+variables are then not needed.
+"""
+
+import os
+import re
+import threading
+
+from sqlalchemy import create_engine, event, text
+
+
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', '10'))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() != 'false'
+PREPARED_STATEMENTS = os.getenv('DB_PREPARED_STATEMENTS', 'true').lower() != 'false'
+BACKEND = os.getenv('API_BACKEND', 'postgres').lower()
+
+REQUIRED_DB_VARS = ['DB_HOST', 'DB_PORT', 'DB_NAME', 'DB_USER', 'DB_PASS']
+
+# name -> SQL with positional parameters, prepared on every connection
+HOT_QUERIES = {
+    'resolve_url': (
+        "SELECT numeric_page_id, instance_of_document FROM web_resources "
+        "WHERE url_hash = $1 AND url = $2 LIMIT 1"
+    ),
+    'latest_revision': "SELECT max(revision_id) FROM revisions WHERE page_id = $1",
+    'page_revisions': (
+        "SELECT revision_id, revision_timestamp, parent_revision_id FROM revisions "
+        "WHERE page_id = $1 ORDER BY revision_timestamp"
+    ),
+    'revision_timestamp': "SELECT revision_timestamp FROM revisions WHERE revision_id = $1",
+    'next_revision': (
+        "SELECT revision_id, revision_timestamp FROM revisions "
+        "WHERE page_id = $1 AND revision_id > $2 ORDER BY revision_id LIMIT 1"
+    ),
+    'present_citation_instances': "SELECT citation_instance_id FROM citation_history WHERE revision_id = $1",
+    'citation_by_sha1': (
+        "SELECT id, normalized_sha1, reference_normalized FROM normalized_citations "
+        "WHERE normalized_sha1 = $1 LIMIT 1"
+    ),
+}
+
+# The same queries with named parameters, for connections they are not prepared on
+_PLAIN_QUERIES = {name: text(re.sub(r'\$(\d+)', r':p\1', sql)) for name, sql in HOT_QUERIES.items()}
+
+
+def database_url(driver='postgresql'):
+    """Build the database URL from DB_* variables, failing clearly if any is missing."""
+    missing = [v for v in REQUIRED_DB_VARS if not os.getenv(v)]
+    if missing:
+        raise RuntimeError(
+            f"Missing required environment variable(s): {', '.join(missing)}. "
+            f"Check your .env file (see example.env)."
+        )
+    return (
+        f"{driver}://{os.getenv('DB_USER')}:{os.getenv('DB_PASS')}@"
+        f"{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
+    )
+
+
+def engine_options():
+    """Keyword arguments for create_engine / create_async_engine."""
+    return {
+        'pool_size': POOL_SIZE,
+        'max_overflow': POOL_MAX_OVERFLOW,
+        'pool_timeout': POOL_TIMEOUT,
+        'pool_recycle': POOL_RECYCLE,
+        'pool_pre_ping': POOL_PRE_PING,
+        # Avoid dumping huge bound-parameter payloads in exception text when a statement fails.
+        'hide_parameters': True,
+    }
+
+
+class PoolCounters:
+    """Counts of pool events since the process started."""
+
+    def __init__(self):
+        self.connects = 0
+        self.checkouts = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def add(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+
+def configure_engine(engine, prepare=PREPARED_STATEMENTS):
+    """Attach the pool counters to a (sync) engine and, if `prepare`, prepare
+    HOT_QUERIES on each new connection."""
+    counters = engine.pool_counters = PoolCounters()
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_conn, record):
+        counters.add('connects')
+        if not prepare:
+            return
+        prepared = record.info['prepared'] = set()
+        cur = dbapi_conn.cursor()
+        try:
+            for name, sql in HOT_QUERIES.items():
+                try:
+                    cur.execute(f"PREPARE {name} AS {sql}")
+                    prepared.add(name)
+                except Exception:
+                    # e.g. the table does not exist yet; run the query unprepared
+                    dbapi_conn.rollback()
+                    continue
+                dbapi_conn.commit()
+        finally:
+            cur.close()
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_conn, record, proxy):
+        counters.add('checkouts')
+
+    @event.listens_for(engine, 'invalidate')
+    def on_invalidate(dbapi_conn, record, exception):
+        counters.add('invalidations')
+
+    return engine
+
+
+def execute_prepared(session, name, *params):
+    """Run one of HOT_QUERIES in `session` and return the result.
+
+    Uses the prepared statement if the session's connection has it, otherwise
+    the same SQL unprepared.
+    """
+    conn = session.connection()
+    values = {f'p{i}': p for i, p in enumerate(params, 1)}
+    if name in conn.info.get('prepared', ()):
+        args = ', '.join(f':p{i}' for i in range(1, len(params) + 1))
+        return conn.execute(text(f"EXECUTE {name}({args})"), values)
+    return conn.execute(_PLAIN_QUERIES[name], values)
+
+
+def create_web_engine():
+    """The web application's engine for API_BACKEND: Postgres, configured as
+    above, or the DuckDB store."""
+    if BACKEND == 'duckdb':
+        from duckdb_store import create_store_engine
+        return configure_engine(create_store_engine(), prepare=False)
+    if BACKEND != 'postgres':
+        raise RuntimeError(f"Unknown API_BACKEND {BACKEND!r}; use postgres or duckdb")
+    return configure_engine(create_engine(database_url(), **engine_options()))
+
+
+def pool_stats(engine):
+    """The pool's settings, current state and event counters, for /metrics."""
+    pool = engine.pool
+    counters = getattr(engine, 'pool_counters', None) or PoolCounters()
+    return {
+        'size': pool.size(),
+        'max_overflow': POOL_MAX_OVERFLOW,
+        'timeout': POOL_TIMEOUT,
+        'pre_ping': POOL_PRE_PING,
+        'prepared_statements': PREPARED_STATEMENTS,
+        'checked_in': pool.checkedin(),
+        'checked_out': pool.checkedout(),
+        'overflow': pool.overflow(),
+        'connects': counters.connects,
+        'checkouts': counters.checkouts,
+        'invalidations': counters.invalidations,
+        'timeouts': counters.timeouts,
+    }